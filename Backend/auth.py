@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import jwt
+
+# Shared JWT handling for every entry point (vpc_bridge_lambda, upload_file_lambda, login_user_lambda).
+#
+# Key rotation: JWT_SECRETS is a comma-separated list of accepted secrets, newest first.
+# New tokens are signed with the first one; tokens signed with any of them verify.
+# JWT_SECRET alone still works for single-key deployments.
+#
+# Verified tokens are cached so repeat requests skip the HS256 decode. An entry never
+# outlives the token's own exp, and AUTH_CACHE_TTL bounds how long a token signed with a
+# secret that has since been rotated out can keep working in a warm process.
+
+ALGORITHM = "HS256"
+CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "300"))
+
+def load_secrets():
+    secrets = [s.strip() for s in os.environ.get("JWT_SECRETS", "").split(",") if s.strip()]
+    return secrets or [os.environ["JWT_SECRET"]]
+
+SECRETS = load_secrets()
+
+_cache = OrderedDict()  # token -> (payload, cached_until epoch seconds)
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+def issue_token(payload):
+    return jwt.encode(payload, SECRETS[0], algorithm=ALGORITHM)
+
+def _decode(token):
+    for secret in SECRETS[:-1]:
+        try:
+            return jwt.decode(token, secret, algorithms=[ALGORITHM])
+        except jwt.InvalidSignatureError:
+            continue
+    return jwt.decode(token, SECRETS[-1], algorithms=[ALGORITHM])
+
+def _cache_get(token, now):
+    with _lock:
+        entry = _cache.get(token)
+        if entry and entry[1] > now:
+            _cache.move_to_end(token)
+            stats["hits"] += 1
+            return entry[0]
+        if entry:
+            del _cache[token]
+        stats["misses"] += 1
+    return None
+
+def _cache_put(token, payload, now):
+    if CACHE_SIZE <= 0:
+        return
+    cached_until = now + CACHE_TTL
+    if "exp" in payload:
+        cached_until = min(cached_until, float(payload["exp"]))
+    if cached_until <= now:
+        return
+    with _lock:
+        _cache[token] = (payload, cached_until)
+        _cache.move_to_end(token)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+# Verify a bare token; raises ValueError with the message the handlers return on 401
+def verify_token(token):
+    now = time.time()
+    payload = _cache_get(token, now)
+    if payload is None:
+        try:
+            payload = _decode(token)
+        except jwt.ExpiredSignatureError:
+            raise ValueError("Token expired")
+        except jwt.InvalidTokenError:
+            raise ValueError("Invalid token")
+        _cache_put(token, payload, now)
+    return dict(payload)
+
+# Verify JWT from Authorization header
+def verify_jwt(headers):
+    auth_header = next((v for k, v in headers.items() if k.lower() == "authorization"), None)
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise ValueError("Missing or invalid Authorization header")
+
+    return verify_token(auth_header.split(" ", 1)[1])
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        stats["hits"] = stats["misses"] = 0
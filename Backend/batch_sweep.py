@@ -0,0 +1,47 @@
+import json
+import time
+import db
+
+# Loop shared by the scheduled sweepers (share_sweeper_lambda, blob_sweeper_lambda).
+#
+# sweep_batch(cur, batch_size) removes up to batch_size rows and returns how many it removed.
+# Each batch runs in its own transaction and commits on its own, so locks are released between
+# batches and a failure only loses the batch in progress. The loop stops at the first short
+# batch or after max_batches; event may override either limit.
+
+def run(name, noun, event, sweep_batch, batch_size, max_batches):
+    event = event or {}
+    batch_size = int(event.get("batch_size") or batch_size)
+    max_batches = int(event.get("max_batches") or max_batches)
+
+    start = time.time()
+    deleted = 0
+    batches = 0
+    complete = False
+    try:
+        while batches < max_batches:
+            with db.connection() as conn:
+                with conn.cursor() as cur:
+                    removed = sweep_batch(cur, batch_size)
+            batches += 1
+            deleted += removed
+            if removed < batch_size:
+                complete = True
+                break
+
+        print(f"{name}: Deleted {deleted} {noun} in {batches} batch(es), {time.time() - start:.2f}s")
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "deleted": deleted,
+                "batches": batches,
+                # False when max_batches ran out first; the next run picks up the rest
+                "complete": complete
+            })
+        }
+
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e), "deleted": deleted})
+        }
@@ -0,0 +1,23 @@
+import os
+import batch_sweep
+import blobs
+from folder_delete_lambda import delete_s3_objects
+
+# Scheduled cleanup of unreferenced blobs (e.g. an EventBridge rule every hour).
+# Deletes normally remove a blob together with its last reference; this picks up the ones
+# they had to leave behind: content claimed by an upload within blobs.CLAIM_GRACE_SECONDS,
+# and content whose last file was overwritten. Each batch deletes its objects from S3 before
+# committing, so a failed S3 call leaves the rows for the next run.
+
+BATCH_SIZE = int(os.environ.get("BLOB_SWEEP_BATCH_SIZE", "1000"))
+MAX_BATCHES = int(os.environ.get("BLOB_SWEEP_MAX_BATCHES", "100"))
+
+def delete_unreferenced_batch(cur, batch_size):
+    keys = blobs.delete_unreferenced(cur, batch_size)
+    if keys:
+        delete_s3_objects(keys)
+    return len(keys)
+
+def lambda_handler(event, context):
+    return batch_sweep.run("blob_sweeper_lambda", "unreferenced blob(s)", event, delete_unreferenced_batch,
+                           BATCH_SIZE, MAX_BATCHES)
@@ -0,0 +1,131 @@
+import os
+import re
+import uuid
+import hashlib
+from collections import Counter
+
+# Content-addressed storage of file bytes.
+#
+# Each distinct content of an account is stored once, at blobs/{user_id}/{sha256} (or, for
+# multipart uploads, a unique key next to it), and every files row that holds it points there
+# through files.blob_key. blobs.ref_count counts those
+# rows; it is changed in the same transaction as the files rows themselves (log_upload_lambda
+# on insert/overwrite, file_delete_lambda and folder_delete_lambda on delete).
+#
+# An upload claims the blob before its files row is written (multipart uploads only once
+# log_upload_lambda has verified the staged bytes), so a blob can briefly be in use while its
+# ref_count is still 0. Claims stamp claimed_at, and a blob is only
+# removed once it is unreferenced and its last claim is older than CLAIM_GRACE_SECONDS; the
+# ones left behind by that rule are collected by blob_sweeper_lambda. Blobs are never shared
+# between accounts, so a dedup hit cannot reveal what another user has stored.
+
+BLOB_PREFIX = os.environ.get("BLOB_PREFIX", "blobs/")
+# Multipart uploads of content land here first and only reach BLOB_PREFIX once log_upload_lambda
+# has checked their SHA-256; an S3 lifecycle rule on this prefix should clean up abandoned uploads.
+STAGING_PREFIX = os.environ.get("BLOB_STAGING_PREFIX", "staging/")
+CLAIM_GRACE_SECONDS = int(os.environ.get("BLOB_CLAIM_GRACE_SECONDS", "3600"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+def is_digest(value):
+    return isinstance(value, str) and bool(_DIGEST.match(value))
+
+def digest_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+# SHA-256 of a file object read in HASH_CHUNK_SIZE pieces
+def digest_stream(stream):
+    h = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+def blob_key(user_id, digest):
+    return f"{BLOB_PREFIX}{user_id}/{digest}"
+
+# A key no other write can target, for content copied into place before its row is claimed
+def unique_blob_key(user_id, digest):
+    return f"{blob_key(user_id, digest)}.{uuid.uuid4().hex}"
+
+# Where a multipart upload of digest to the file s3_key writes its parts
+def staging_key(user_id, digest, s3_key):
+    return f"{STAGING_PREFIX}{user_id}/{digest}/{s3_key}"
+
+# Register (or re-claim) a blob stored with codec in stored_bytes. Returns
+# (s3_key, created, codec, stored_bytes), the last two from the existing row when not created;
+# when created the caller must write the object before committing. The row stays locked until
+# then, so a concurrent delete of the same content either finishes first (and this call creates
+# a fresh row) or sees the new claim. A caller that already wrote the object passes its s3_key
+# instead; if the claim does not create the row that object is the caller's to delete.
+def claim(cur, user_id, digest, size_bytes, codec=None, stored_bytes=None, s3_key=None):
+    cur.execute("""
+        INSERT INTO blobs (user_id, sha256, s3_key, size_bytes, codec, stored_bytes)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id, sha256) DO UPDATE SET claimed_at = NOW()
+        RETURNING s3_key, (xmax = 0), codec, stored_bytes
+    """, (user_id, digest, s3_key or blob_key(user_id, digest), size_bytes, codec,
+          size_bytes if stored_bytes is None else stored_bytes))
+    return cur.fetchone()
+
+# Claim an existing blob only. Returns (s3_key, size_bytes, codec, stored_bytes), or None if
+# the account has no such content.
+def touch(cur, user_id, digest):
+    cur.execute("""
+        UPDATE blobs SET claimed_at = NOW()
+        WHERE user_id = %s AND sha256 = %s
+        RETURNING s3_key, size_bytes, codec, stored_bytes
+    """, (user_id, digest))
+    return cur.fetchone()
+
+# Apply ref_count changes given as {(user_id, sha256): delta}. Rows are locked in key order
+# first so concurrent writers touching overlapping blobs cannot deadlock.
+def adjust(cur, deltas):
+    deltas = {key: n for key, n in deltas.items() if n}
+    if not deltas:
+        return
+    keys = sorted(deltas)
+    user_ids = [str(user_id) for user_id, _ in keys]
+    digests = [digest for _, digest in keys]
+    cur.execute("""
+        SELECT 1 FROM blobs
+        WHERE (user_id, sha256) IN (SELECT * FROM unnest(%s::uuid[], %s::text[]))
+        ORDER BY user_id, sha256
+        FOR UPDATE
+    """, (user_ids, digests))
+    cur.execute("""
+        UPDATE blobs b SET ref_count = b.ref_count + d.n
+        FROM unnest(%s::uuid[], %s::text[], %s::int[]) AS d(user_id, sha256, n)
+        WHERE b.user_id = d.user_id AND b.sha256 = d.sha256
+    """, (user_ids, digests, [deltas[key] for key in keys]))
+
+# Drop one reference per (user_id, sha256) in refs and remove the blobs that end up unreferenced
+# and unclaimed. Returns their S3 keys; the caller deletes the objects before committing.
+def release(cur, refs):
+    counts = Counter((str(user_id), digest) for user_id, digest in refs)
+    if not counts:
+        return []
+    adjust(cur, {key: -n for key, n in counts.items()})
+    cur.execute("""
+        DELETE FROM blobs b
+        USING unnest(%s::uuid[], %s::text[]) AS d(user_id, sha256)
+        WHERE b.user_id = d.user_id AND b.sha256 = d.sha256
+          AND b.ref_count <= 0 AND b.claimed_at < NOW() - make_interval(secs => %s)
+        RETURNING b.s3_key
+    """, ([user_id for user_id, _ in counts], [digest for _, digest in counts], CLAIM_GRACE_SECONDS))
+    return [row[0] for row in cur.fetchall()]
+
+# Remove up to limit unreferenced blobs whose grace period is over; rows another sweep holds are skipped
+def delete_unreferenced(cur, limit):
+    cur.execute("""
+        DELETE FROM blobs
+        WHERE (user_id, sha256) IN (
+            SELECT user_id, sha256 FROM blobs
+            WHERE ref_count <= 0 AND claimed_at < NOW() - make_interval(secs => %s)
+            ORDER BY claimed_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING s3_key
+    """, (CLAIM_GRACE_SECONDS, limit))
+    return [row[0] for row in cur.fetchall()]
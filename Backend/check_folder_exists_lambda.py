@@ -1,7 +1,6 @@
 import json
-import os
-import psycopg2
 import uuid
+import folder_resolver
 
 def lambda_handler(event, context):
     try:
@@ -18,27 +17,13 @@ def lambda_handler(event, context):
         # Convert user_id safely
         user_id = str(uuid.UUID(user_id))
 
-        # Connect to DB
-        conn = psycopg2.connect(
-            host=os.environ["DB_HOST"],
-            dbname=os.environ["DB_NAME"],
-            user=os.environ["DB_USER"],
-            password=os.environ["DB_PASSWORD"],
-            port=5432
-        )
-        cur = conn.cursor()
-
         # Look up folder
-        cur.execute(
-            "SELECT folder_id FROM folders WHERE user_id = %s AND path = %s",
-            (user_id, path)
-        )
-        row = cur.fetchone()
+        folder_id = folder_resolver.resolve_folder_id(user_id, path)
 
-        if row:
+        if folder_id:
             return {
                 "statusCode": 200,
-                "body": json.dumps({"exists": True, "folder_id": str(row[0])})
+                "body": json.dumps({"exists": True, "folder_id": folder_id})
             }
         else:
             return {
@@ -51,6 +36,3 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "body": json.dumps({"error": "Exception", "details": str(e)})
         }
-    finally:
-        if 'cur' in locals(): cur.close()
-        if 'conn' in locals(): conn.close()
@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import psycopg2
+
+# Shared PostgreSQL access for the Backend lambdas.
+# Connections live in a module-level pool so warm invocations reuse them instead
+# of paying the TCP + TLS + auth handshake on every request.
+
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+# Connections idle for longer than this are pinged before being handed out
+# (a frozen Lambda container can come back with a dead socket)
+HEALTHCHECK_IDLE_SECONDS = float(os.environ.get("DB_HEALTHCHECK_IDLE_SECONDS", "30"))
+
+_idle = []  # (conn, last_used) pairs, most recently used last
+_lock = threading.Lock()
+
+def db_config():
+    return {
+        'dbname': os.environ["DB_NAME"],
+        'user': os.environ["DB_USER"],
+        'password': os.environ["DB_PASSWORD"],
+        'host': os.environ["DB_HOST"],
+        'port': int(os.environ.get("DB_PORT", "5432")),
+    }
+
+def connect():
+    return psycopg2.connect(connect_timeout=CONNECT_TIMEOUT, **db_config())
+
+def _is_healthy(conn, last_used):
+    if conn.closed:
+        return False
+    if time.monotonic() - last_used < HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error as e:
+        print(f"db: discarding stale connection: {type(e).__name__} - {str(e).strip()}")
+        return False
+
+def _discard(conn):
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+def _acquire():
+    while True:
+        with _lock:
+            if not _idle:
+                break
+            conn, last_used = _idle.pop()
+        if _is_healthy(conn, last_used):
+            return conn
+        _discard(conn)
+    return connect()
+
+def _release(conn):
+    if conn.closed:
+        return
+    with _lock:
+        if len(_idle) < POOL_SIZE:
+            _idle.append((conn, time.monotonic()))
+            return
+    _discard(conn)
+
+# Borrow a pooled connection for the duration of a with-block.
+# Commits on success, rolls back on error; broken connections are dropped from the pool.
+# autocommit=True suits single-statement reads: no BEGIN/COMMIT, so one query is one round trip.
+@contextmanager
+def connection(autocommit=False):
+    conn = _acquire()
+    try:
+        conn.autocommit = autocommit
+        yield conn
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _discard(conn)
+        raise
+    finally:
+        _release(conn)
+
+def close_all():
+    with _lock:
+        conns = [conn for conn, _ in _idle]
+        _idle.clear()
+    for conn in conns:
+        _discard(conn)
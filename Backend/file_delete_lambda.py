@@ -1,16 +1,10 @@
 import json
 import os
-import psycopg2
 import boto3
 import traceback
-
-DB_CONFIG = {
-    'dbname': os.environ["DB_NAME"],
-    'user': os.environ["DB_USER"],
-    'password': os.environ["DB_PASSWORD"],
-    'host': os.environ["DB_HOST"],
-    'port': 5432,
-}
+import blobs
+import db
+import listing_cache
 
 s3 = boto3.client("s3")
 BUCKET_NAME = os.environ["S3_BUCKET"]
@@ -27,27 +21,35 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": "Missing file_id or user_id"})
             }
 
-        conn = psycopg2.connect(connect_timeout=5, **DB_CONFIG)
-        conn.autocommit = True
-        cur = conn.cursor()
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                # Verify the file exists and get its S3 key and blob
+                cur.execute("""
+                    SELECT s3_key, filename, content_sha256 FROM files
+                    WHERE file_id = %s AND user_id = %s
+                    FOR UPDATE
+                """, (file_id, user_id))
+                result = cur.fetchone()
 
-        # Verify the file exists and get S3 key
-        cur.execute("SELECT s3_key, filename FROM files WHERE file_id = %s AND user_id = %s", (file_id, user_id))
-        result = cur.fetchone()
+                if not result:
+                    return {
+                        "statusCode": 404,
+                        "body": json.dumps({"error": "File not found"})
+                    }
 
-        if not result:
-            return {
-                "statusCode": 404,
-                "body": json.dumps({"error": "File not found"})
-            }
+                s3_key, filename, digest = result
 
-        s3_key, filename = result
+                print(f"Deleting file record from DB: {file_id}")
+                cur.execute("DELETE FROM file_shares WHERE file_id = %s", (file_id,))
+                cur.execute("DELETE FROM files WHERE file_id = %s", (file_id,))
+                listing_cache.bump_version(user_id, cur)
 
-        print(f"Deleting file from S3: {s3_key}")
-        s3.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
-
-        print(f"Deleting file record from DB: {file_id}")
-        cur.execute("DELETE FROM files WHERE file_id = %s", (file_id,))
+                # Deduplicated content is only deleted with its last reference; the object goes
+                # before the commit, so a failure leaves the file row in place
+                keys = blobs.release(cur, [(user_id, digest)]) if digest else [s3_key]
+                for key in keys:
+                    print(f"Deleting file from S3: {key}")
+                    s3.delete_object(Bucket=BUCKET_NAME, Key=key)
 
         return {
             "statusCode": 200,
@@ -61,7 +63,3 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
-
-    finally:
-        if 'cur' in locals(): cur.close()
-        if 'conn' in locals(): conn.close()
@@ -1,12 +1,136 @@
 import json
 import os
+import time
+import uuid
 import boto3
-import psycopg2
+from urllib.parse import quote
+import db
 from datetime import datetime, timezone
+from link_cache import LinkCache
 
 s3 = boto3.client('s3')
+PRESIGN_EXPIRES_SECONDS = 300  # 5 minutes
+MAX_BATCH_FILES = int(os.environ.get("DOWNLOAD_BATCH_MAX_FILES", "200"))
+
+# Presigned URLs handed out by this process, keyed ("owner", user_id, file_id) or ("token", token)
+# plus the object key and filename the lookup returned. The lookup always runs: a re-upload keeps
+# the file_id but moves the row to a new blob key, and a rename changes the Content-Disposition,
+# so either one misses instead of serving the old object. A hit skips the presign and hands the
+# browser the same URL again; a deleted file's cached URL just 404s at S3.
+urls = LinkCache()
+
+def url_cache_key(prefix, s3_key, filename):
+    return (*prefix, s3_key, filename)
+
+# Deduplicated files live at a content key, so the name a browser saves them under comes from
+# the Content-Disposition override rather than from the key
+def presign_download(s3_key, filename=None):
+    params = {'Bucket': os.environ["S3_BUCKET"], 'Key': s3_key}
+    if filename:
+        params['ResponseContentDisposition'] = f"inline; filename*=UTF-8''{quote(filename)}"
+    return s3.generate_presigned_url(
+        'get_object',
+        Params=params,
+        ExpiresIn=PRESIGN_EXPIRES_SECONDS
+    )
+
+def download_response(url):
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"download_url": url})
+    }
+
+# Owner download: one ownership-checked lookup, then a local presign. No share row is written.
+def download_owned_file(user_id, file_id):
+    try:
+        file_id = str(uuid.UUID(str(file_id)))
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid file_id"})}
+
+    try:
+        with db.connection(autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT COALESCE(blob_key, s3_key), filename FROM files
+                    WHERE file_id = %s AND user_id = %s
+                """, (file_id, user_id))
+                row = cur.fetchone()
+
+        if not row:
+            return {
+                "statusCode": 403,
+                "body": json.dumps({"error": "Unauthorized file access"})
+            }
+
+        cache_key = url_cache_key(("owner", str(user_id), file_id), row[0], row[1])
+        url = urls.get(cache_key)
+        if not url:
+            issued_at = time.time()
+            url = presign_download(row[0], row[1])
+            urls.put(cache_key, url, issued_at + PRESIGN_EXPIRES_SECONDS, issued_at)
+        return download_response(url)
+
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
+
+# Owner multi-file download: one ownership query for every file_id, then local presigns
+# (generate_presigned_url only signs; it makes no S3 call). Results follow the request order;
+# ids the caller does not own come back with an error instead of a URL.
+def download_owned_files(user_id, file_ids):
+    if not isinstance(file_ids, list) or not file_ids:
+        return {"statusCode": 400, "body": json.dumps({"error": "file_ids must be a non-empty list"})}
+    if len(file_ids) > MAX_BATCH_FILES:
+        return {"statusCode": 400, "body": json.dumps({"error": f"At most {MAX_BATCH_FILES} files per request"})}
+    try:
+        file_ids = [str(uuid.UUID(str(file_id))) for file_id in file_ids]
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid file_id"})}
+
+    try:
+        with db.connection(autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT file_id, filename, COALESCE(blob_key, s3_key), size_bytes FROM files
+                    WHERE user_id = %s AND file_id = ANY(%s::uuid[])
+                """, (user_id, list(set(file_ids))))
+                owned = {str(row[0]): row[1:] for row in cur.fetchall()}
+
+        files = []
+        for file_id in file_ids:
+            if file_id not in owned:
+                files.append({"file_id": file_id, "error": "Unauthorized file access"})
+                continue
+            filename, s3_key, size_bytes = owned[file_id]
+            cache_key = url_cache_key(("owner", str(user_id), file_id), s3_key, filename)
+            url = urls.get(cache_key)
+            if not url:
+                issued_at = time.time()
+                url = presign_download(s3_key, filename)
+                urls.put(cache_key, url, issued_at + PRESIGN_EXPIRES_SECONDS, issued_at)
+            files.append({"file_id": file_id, "filename": filename, "size_bytes": size_bytes, "download_url": url})
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({"files": files, "expires_in": PRESIGN_EXPIRES_SECONDS})
+        }
+
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
 
 def lambda_handler(event, context):
+    if event.get("user_id") and "file_ids" in event:
+        return download_owned_files(event["user_id"], event["file_ids"])
+
+    # Direct invocations from vpc_bridge_lambda carry the caller's user_id instead of a share token
+    if event.get("user_id") and event.get("file_id"):
+        return download_owned_file(event["user_id"], event["file_id"])
+
     token = event.get("queryStringParameters", {}).get("token")
     
     if not token:
@@ -15,48 +139,27 @@ def lambda_handler(event, context):
             "body": json.dumps({"error": "Missing download token"})
         }
     
-    # DB config
-    db_host = os.environ["DB_HOST"]
-    db_name = os.environ["DB_NAME"]
-    db_user = os.environ["DB_USER"]
-    db_password = os.environ["DB_PASSWORD"]
-    s3_bucket = os.environ["S3_BUCKET"]
-
     try:
-        conn = psycopg2.connect(
-            host=db_host,
-            dbname=db_name,
-            user=db_user,
-            password=db_password
-        )
-        cur = conn.cursor()
-        
-        # Clean up old tokens
-        cur.execute("""
-            DELETE FROM file_shares
-            WHERE expires_at IS NOT NULL AND expires_at < NOW()
-            RETURNING file_id
-        """)
-        deleted = cur.rowcount
-        if deleted:
-            print(f"file_download_lambda: Cleaned up {deleted} expired shares")
-
-        # Look up token
-        cur.execute("""
-            SELECT fs.file_id, f.s3_key, fs.expires_at
-            FROM file_shares fs
-            JOIN files f ON fs.file_id = f.file_id
-            WHERE fs.token = %s
-        """, (token,))
-        
-        row = cur.fetchone()
+        # Expired rows are removed by share_sweeper_lambda; an expired token is rejected below
+        with db.connection(autocommit=True) as conn:
+            with conn.cursor() as cur:
+                # Look up token
+                cur.execute("""
+                    SELECT fs.file_id, COALESCE(f.blob_key, f.s3_key), f.filename, fs.expires_at
+                    FROM file_shares fs
+                    JOIN files f ON fs.file_id = f.file_id
+                    WHERE fs.token = %s
+                """, (token,))
+
+                row = cur.fetchone()
+
         if not row:
             return {
                 "statusCode": 404,
                 "body": json.dumps({"error": "Invalid or expired token"})
             }
-        
-        file_id, s3_key, expires_at = row
+
+        file_id, s3_key, filename, expires_at = row
         
         # Check expiration
         if expires_at:
@@ -68,26 +171,21 @@ def lambda_handler(event, context):
                     "body": json.dumps({"error": "Token has expired"})
                 }
 
-        # Generate presigned URL
-        presigned_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': s3_bucket, 'Key': s3_key},
-            ExpiresIn=300  # 5 minutes
-        )
+        # Generate presigned URL; reuse it no longer than the share itself stays valid
+        cache_key = url_cache_key(("token", token), s3_key, filename)
+        presigned_url = urls.get(cache_key)
+        if not presigned_url:
+            issued_at = time.time()
+            presigned_url = presign_download(s3_key, filename)
+            url_expires = issued_at + PRESIGN_EXPIRES_SECONDS
+            if expires_at:
+                url_expires = min(url_expires, expires_at.timestamp())
+            urls.put(cache_key, presigned_url, url_expires, issued_at)
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps({"download_url": presigned_url})
-        }
+        return download_response(presigned_url)
 
     except Exception as e:
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
-
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
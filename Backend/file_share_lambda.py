@@ -1,12 +1,28 @@
 import json
 import uuid
 import os
-import psycopg2
+import secrets
+import db
 from datetime import datetime, timedelta, timezone
 import boto3
+import link_cache
+from link_cache import LinkCache
 
 ses = boto3.client('ses')
 
+# UI share tokens handed out by this process, keyed (user_id, file_id). Emailed shares always
+# get their own token, since each one is sent to a specific recipient.
+shares = LinkCache()
+
+def share_response(token):
+    return {
+        "statusCode": 200,
+        "body": json.dumps({
+            "token": token,
+            "download_url": f"https://api.sparkdrive.com/file/download?token={token}"
+        })
+    }
+
 def lambda_handler(event, context):
     try:
         body = json.loads(event.get("body", "{}"))
@@ -29,48 +45,60 @@ def lambda_handler(event, context):
         else:
             expires_in_minutes = int(os.environ.get("UI_TOKEN_TTL", "5"))
 
-        token = str(uuid.uuid4())[:8]  # short token for testing
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=expires_in_minutes)
-        download_url = f"https://api.sparkdrive.com/file/download?token={token}"
-
-        # DB config
-        db_host = os.environ["DB_HOST"]
-        db_name = os.environ["DB_NAME"]
-        db_user = os.environ["DB_USER"]
-        db_password = os.environ["DB_PASSWORD"]
-
-        conn = psycopg2.connect(
-            host=db_host,
-            dbname=db_name,
-            user=db_user,
-            password=db_password
-        )
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT 1 FROM files
-            WHERE file_id = %s AND user_id = %s
-        """, (file_id, user_id))
-
-        if cur.fetchone() is None:
-            return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized file access"})}
-
-        # Insert into file_shares
-        cur.execute("""
-            INSERT INTO file_shares (
-                share_id, file_id, token, email, expires_at, created_at, modified_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, NOW(), NOW()
-            )
-        """, (
-            str(uuid.uuid4()),
-            file_id,
-            token,
-            email,
-            expires_at
-        ))
+        cache_key = (str(user_id), str(file_id))
+        if not email:
+            token = shares.get(cache_key)
+            if token:
+                return share_response(token)
+
+        lifetime = timedelta(minutes=expires_in_minutes)
+        # A reused share must still have (1 - LINK_REUSE_FRACTION) of a fresh share's lifetime left
+        min_remaining = lifetime * (1 - link_cache.REUSE_FRACTION)
+
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                # Ownership check and the newest reusable UI share in one round trip
+                cur.execute("""
+                    SELECT s.token, s.expires_at
+                    FROM files f
+                    LEFT JOIN LATERAL (
+                        SELECT token, expires_at FROM file_shares
+                        WHERE file_id = f.file_id AND email IS NULL AND expires_at > NOW() + %s
+                        ORDER BY expires_at DESC
+                        LIMIT 1
+                    ) s ON TRUE
+                    WHERE f.file_id = %s AND f.user_id = %s
+                """, (min_remaining, file_id, user_id))
+
+                row = cur.fetchone()
+                if row is None:
+                    return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized file access"})}
+
+                if not email and row[0]:
+                    token, expires_at = row
+                else:
+                    token = secrets.token_urlsafe(9)
+                    expires_at = datetime.now(timezone.utc) + lifetime
+
+                    # Insert into file_shares
+                    cur.execute("""
+                        INSERT INTO file_shares (
+                            share_id, file_id, token, email, expires_at, created_at, modified_at
+                        ) VALUES (
+                            %s, %s, %s, %s, %s, NOW(), NOW()
+                        )
+                    """, (
+                        str(uuid.uuid4()),
+                        file_id,
+                        token,
+                        email,
+                        expires_at
+                    ))
+
+        if not email:
+            shares.put(cache_key, token, expires_at.timestamp(), (expires_at - lifetime).timestamp())
 
-        conn.commit()
+        download_url = f"https://api.sparkdrive.com/file/download?token={token}"
 
         # Optional email
         if email:
@@ -87,22 +115,10 @@ def lambda_handler(event, context):
                 }
             )
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps({
-                "token": token,
-                "download_url": download_url
-            })
-        }
+        return share_response(token)
 
     except Exception as e:
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
-
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
@@ -0,0 +1,274 @@
+import json
+import os
+import time
+import uuid
+import zipfile
+import boto3
+from botocore.exceptions import ClientError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import db
+import storage_codec
+
+s3 = boto3.client('s3')
+
+# Folder download as a ZIP of the whole subtree.
+#
+# The archive is streamed: objects are read from S3 a chunk at a time and the ZIP is written
+# straight into a multipart upload of a temporary object, so memory stays at roughly
+# ARCHIVE_PART_SIZE + ARCHIVE_READ_CONCURRENCY * ARCHIVE_PREFETCH_BYTES whatever the folder size.
+# The caller gets a presigned URL for the finished archive. Temporary archives live under
+# ARCHIVE_PREFIX; an S3 lifecycle rule on that prefix should expire them after a day.
+#
+# A large folder takes longer than API Gateway's 29 s, so vpc_bridge_lambda starts the build
+# as an asynchronous (Event) invoke carrying an archive_id and returns 202 straight away. The
+# build records its outcome next to the archive ({archive_id}.json), and the client polls with
+# {"status": true, "archive_id": ...} until it gets the URL or the build's error.
+
+ARCHIVE_PREFIX = os.environ.get("ARCHIVE_PREFIX", "archives/")
+MAX_FILES = int(os.environ.get("ARCHIVE_MAX_FILES", "10000"))
+MAX_BYTES = int(os.environ.get("ARCHIVE_MAX_BYTES", str(4 * 1024 ** 3)))
+PART_SIZE = int(os.environ.get("ARCHIVE_PART_SIZE", str(8 * 1024 * 1024)))  # S3 minimum is 5 MiB
+READ_CONCURRENCY = int(os.environ.get("ARCHIVE_READ_CONCURRENCY", "4"))
+PREFETCH_BYTES = 1024 * 1024  # objects up to this size are read whole by the prefetch workers
+CHUNK_SIZE = 256 * 1024
+COMPRESSION = zipfile.ZIP_STORED if os.environ.get("ARCHIVE_COMPRESSION") == "stored" else zipfile.ZIP_DEFLATED
+PRESIGN_EXPIRES_SECONDS = 900
+
+class ArchiveTooLarge(Exception):
+    pass
+
+# Write-only file object backed by an S3 multipart upload; zipfile treats it as unseekable
+# and writes data descriptors instead of going back to patch local headers.
+class S3MultipartWriter:
+    def __init__(self, bucket, key, part_size=PART_SIZE):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.size = 0
+        self.upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType="application/zip")["UploadId"]
+
+    def write(self, data):
+        self.buffer += data
+        self.size += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _upload_part(self, data):
+        number = len(self.parts) + 1
+        response = s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=data)
+        self.parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+    def complete(self):
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                     MultipartUpload={"Parts": self.parts})
+
+    def abort(self):
+        s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+# Every folder in the subtree and every file in them, ordered so the archive reads like a tree.
+# Returns None if the folder does not exist.
+def list_subtree(user_id, path):
+    with db.connection(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH RECURSIVE subtree AS (
+                    SELECT folder_id, path FROM folders WHERE user_id = %s AND path = %s
+                    UNION ALL
+                    SELECT f.folder_id, f.path FROM folders f JOIN subtree s ON f.parent_id = s.folder_id AND f.user_id = %s
+                )
+                SELECT folder_id, path FROM subtree ORDER BY path
+            """, (user_id, path, user_id))
+            folders = cur.fetchall()
+            if not folders:
+                return None
+
+            # Totals over the whole subtree, rows capped at MAX_FILES + 1
+            cur.execute("""
+                SELECT fo.path, fi.filename, COALESCE(fi.blob_key, fi.s3_key), fi.size_bytes, fi.codec,
+                       COUNT(*) OVER (), COALESCE(SUM(fi.size_bytes) OVER (), 0)
+                FROM files fi JOIN folders fo ON fo.folder_id = fi.folder_id
+                WHERE fi.user_id = %s AND fi.folder_id = ANY(%s::uuid[])
+                ORDER BY fo.path, fi.filename
+                LIMIT %s
+            """, (user_id, [row[0] for row in folders], MAX_FILES + 1))
+            files = cur.fetchall()
+
+    file_count = files[0][5] if files else 0
+    total_bytes = int(files[0][6]) if files else 0
+    return [row[1] for row in folders], [row[:5] for row in files], file_count, total_bytes
+
+def archive_name(root, folder_path):
+    base = root.rstrip("/").rsplit("/", 1)[-1] or "SparkDrive"
+    relative = folder_path[len(root):].strip("/") if root != "/" else folder_path.strip("/")
+    return f"{base}/{relative}/" if relative else f"{base}/"
+
+# Small objects are read whole in the worker; larger ones come back as an open stream.
+# Compressed objects are decoded, so the archive always holds the original bytes.
+def open_object(bucket, s3_key, codec=None, size_bytes=None):
+    obj = s3.get_object(Bucket=bucket, Key=s3_key)
+    if not codec:
+        if obj["ContentLength"] <= PREFETCH_BYTES:
+            return obj["ContentLength"], obj["Body"].read()
+        return obj["ContentLength"], obj["Body"]
+    if obj["ContentLength"] <= PREFETCH_BYTES:
+        data = storage_codec.decompress(codec, obj["Body"].read())
+        return len(data), data
+    return size_bytes, storage_codec.open_decoded(codec, obj["Body"])
+
+# Stream the ZIP into writer. Up to READ_CONCURRENCY objects are opened ahead of the one being
+# written, which hides S3 latency without buffering more than the prefetch window.
+def write_archive(writer, bucket, root, folder_paths, files, max_bytes=MAX_BYTES):
+    written = 0
+    with zipfile.ZipFile(writer, "w", compression=COMPRESSION, allowZip64=True) as zf:
+        for folder_path in folder_paths:
+            zf.writestr(archive_name(root, folder_path), b"")
+
+        with ThreadPoolExecutor(max_workers=READ_CONCURRENCY) as pool:
+            pending = deque()
+            queue = iter(files)
+
+            def fill():
+                while len(pending) < READ_CONCURRENCY:
+                    entry = next(queue, None)
+                    if entry is None:
+                        return
+                    pending.append((entry, pool.submit(open_object, bucket, entry[2], entry[4], entry[3])))
+
+            fill()
+            while pending:
+                (folder_path, filename, s3_key, size_bytes, codec), future = pending.popleft()
+                length, body = future.result()
+                written += length
+                if written > max_bytes:
+                    raise ArchiveTooLarge(f"Folder is larger than {max_bytes} bytes")
+                fill()
+
+                name = archive_name(root, folder_path) + filename
+                with zf.open(name, "w", force_zip64=length >= zipfile.ZIP64_LIMIT) as entry:
+                    if isinstance(body, bytes):
+                        entry.write(body)
+                    else:
+                        for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+                            entry.write(chunk)
+    return written
+
+def archive_key(user_id, archive_id):
+    return f"{ARCHIVE_PREFIX}{user_id}/{archive_id}.zip"
+
+def result_key(user_id, archive_id):
+    return f"{ARCHIVE_PREFIX}{user_id}/{archive_id}.json"
+
+def presign_archive(bucket, key, filename):
+    return s3.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key,
+                "ResponseContentDisposition": f'attachment; filename="{filename}"'},
+        ExpiresIn=PRESIGN_EXPIRES_SECONDS
+    )
+
+def build_archive(bucket, user_id, path, archive_id):
+    start = time.time()
+    try:
+        subtree = list_subtree(user_id, path)
+        if subtree is None:
+            return {"statusCode": 404, "body": json.dumps({"error": "Folder not found"})}
+
+        folder_paths, files, file_count, total_bytes = subtree
+        if file_count > MAX_FILES or total_bytes > MAX_BYTES:
+            return {
+                "statusCode": 413,
+                "body": json.dumps({
+                    "error": f"Folder too large to archive (limit {MAX_FILES} files, {MAX_BYTES} bytes)",
+                    "files": file_count,
+                    "bytes": total_bytes
+                })
+            }
+
+        key = archive_key(user_id, archive_id)
+        writer = S3MultipartWriter(bucket, key)
+        try:
+            written = write_archive(writer, bucket, path, folder_paths, files)
+            writer.complete()
+        except BaseException:
+            writer.abort()
+            raise
+
+        print(f"folder_archive_lambda: {path} -> {key}, {len(files)} file(s), {written} bytes in, "
+              f"{writer.size} bytes out, {time.time() - start:.2f}s")
+
+        filename = archive_name(path, path).rstrip("/").replace('"', "") + ".zip"
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "download_url": presign_archive(bucket, key, filename),
+                "filename": filename,
+                "files": len(files),
+                "archive_bytes": writer.size
+            })
+        }
+
+    except ArchiveTooLarge as e:
+        return {"statusCode": 413, "body": json.dumps({"error": str(e)})}
+    except Exception as e:
+        return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+
+# Record a build's outcome for archive_status; the URL is left out and presigned on each poll
+def save_result(bucket, user_id, archive_id, result):
+    body = json.loads(result["body"])
+    body.pop("download_url", None)
+    s3.put_object(Bucket=bucket, Key=result_key(user_id, archive_id), ContentType="application/json",
+                  Body=json.dumps({"statusCode": result["statusCode"], "body": body}).encode())
+
+def archive_status(bucket, user_id, archive_id):
+    try:
+        saved = json.loads(s3.get_object(Bucket=bucket, Key=result_key(user_id, archive_id))["Body"].read())
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            raise
+        return {"statusCode": 202, "body": json.dumps({"archive_id": archive_id, "status": "pending"})}
+
+    body = saved["body"]
+    if saved["statusCode"] == 200:
+        body["download_url"] = presign_archive(bucket, archive_key(user_id, archive_id), body["filename"])
+    return {"statusCode": saved["statusCode"], "body": json.dumps(body)}
+
+# {"user_id", "path", "archive_id"}: build the archive and record the outcome (Event invoke).
+# {"user_id", "archive_id", "status": true}: 202 while it builds, then the build's response.
+# Without an archive_id the build runs and its response is returned directly.
+def lambda_handler(event, context):
+    user_id = event.get("user_id")
+    path = event.get("path")
+    archive_id = event.get("archive_id")
+    bucket = os.environ["S3_BUCKET"]
+
+    if archive_id is not None:
+        try:
+            archive_id = str(uuid.UUID(str(archive_id)))
+        except ValueError:
+            return {"statusCode": 400, "body": json.dumps({"error": "folder_archive_lambda: Invalid archive_id"})}
+    if event.get("status"):
+        if not user_id or not archive_id:
+            return {"statusCode": 400, "body": json.dumps({"error": "folder_archive_lambda: Missing user_id or archive_id"})}
+        try:
+            return archive_status(bucket, user_id, archive_id)
+        except Exception as e:
+            return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+
+    if not user_id or not path or not path.startswith("/"):
+        return {"statusCode": 400, "body": json.dumps({"error": "folder_archive_lambda: Missing user_id or path"})}
+
+    result = build_archive(bucket, user_id, path, archive_id or str(uuid.uuid4()))
+    if archive_id:
+        save_result(bucket, user_id, archive_id, result)
+    return result
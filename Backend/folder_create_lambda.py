@@ -1,52 +1,54 @@
 import json
 import uuid
-import os
-import psycopg2
+import db
+import listing_cache
 from datetime import datetime
 
+# "/a/b/c" -> ["/", "/a", "/a/b"]
+def ancestor_paths(path):
+    parts = path.strip("/").split("/")[:-1]
+    return ["/"] + ["/" + "/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
 def lambda_handler(event, context):
     # Parse input
     try:
         body = json.loads(event['body'])
         path = body.get("path")
-        if not path or not path.startswith("/"):
+        if not path or not path.startswith("/") or "//" in path:
             return {"statusCode": 400, "body": json.dumps({"error": "Invalid folder path"})}
+        if path != "/":
+            path = path.rstrip("/")
         user_id = body.get("user_id")
         if not user_id:
             return {"statusCode": 400, "body": json.dumps({"error": "Missing user_id"})}
     except Exception as e:
         return {"statusCode": 400, "body": json.dumps({"error": "Malformed request", "details": str(e)})}
 
-    # Connect to RDS
     try:
-        conn = psycopg2.connect(
-            host=os.environ["DB_HOST"],
-            dbname=os.environ["DB_NAME"],
-            user=os.environ["DB_USER"],
-            password=os.environ["DB_PASSWORD"],
-            port=5432
-        )
-        cur = conn.cursor()
-        
-        # Check if folder exists
-        cur.execute("SELECT 1 FROM folders WHERE user_id = %s AND path = %s", (user_id, path))
-        if cur.fetchone():
-            return {"statusCode": 200, "body": json.dumps({"message": "Folder already exists"})}
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                # Look up the folder and all of its ancestors in one query
+                lineage = ancestor_paths(path) + [path]
+                cur.execute("SELECT path, folder_id FROM folders WHERE user_id = %s AND path = ANY(%s)", (user_id, lineage))
+                existing = dict(cur.fetchall())
+                if path in existing:
+                    return {"statusCode": 200, "body": json.dumps({"message": "Folder already exists"})}
+
+                # Create the folder, and any missing ancestors, top-down so each row has its parent_id
+                now = datetime.utcnow()
+                parent_id = None
+                for folder_path in lineage:
+                    folder_id = existing.get(folder_path)
+                    if not folder_id:
+                        folder_id = str(uuid.uuid4())
+                        cur.execute("""
+                            INSERT INTO folders (folder_id, user_id, path, parent_id, created_at, modified_at)
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                        """, (folder_id, user_id, folder_path, parent_id, now, now))
+                    parent_id = folder_id
+                listing_cache.bump_version(user_id, cur)
 
-        # Create folder
-        folder_id = str(uuid.uuid4())
-        now = datetime.utcnow()
-        cur.execute("""
-            INSERT INTO folders (folder_id, user_id, path, created_at, modified_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (folder_id, user_id, path, now, now))
-        
-        conn.commit()
         return {"statusCode": 201, "body": json.dumps({"message": "Folder created", "folder_id": folder_id})}
 
     except Exception as e:
         return {"statusCode": 500, "body": json.dumps({"error": "Database error", "details": str(e)})}
-    
-    finally:
-        if 'cur' in locals(): cur.close()
-        if 'conn' in locals(): conn.close()
@@ -1,65 +1,81 @@
 import json
 import os
-import psycopg2
-from datetime import datetime
 import traceback
 import boto3
+from concurrent.futures import ThreadPoolExecutor
+import blobs
+import db
+import listing_cache
+import folder_resolver
 
-DB_CONFIG = {
-    'dbname': os.environ["DB_NAME"],
-    'user': os.environ["DB_USER"],
-    'password': os.environ["DB_PASSWORD"],
-    'host': os.environ["DB_HOST"],
-    'port': 5432,
-}
+s3 = boto3.client('s3')
 
-def delete_files_in_folder(folder_id: str, user_id: str):
-    BUCKET_NAME = os.environ["S3_BUCKET"]
-    s3 = boto3.client('s3')
-    key = ""
-    query = ""
-    print(f"delete_files_in_folder: Deleting all files in {folder_id}")
-
-    try:
-        conn = psycopg2.connect(connect_timeout=5, **DB_CONFIG )
-        conn.autocommit = True
-        with conn.cursor() as cur:
-            query = "SELECT filename, s3_key FROM files WHERE folder_id = %s AND user_id = %s"
-            cur.execute(query, (folder_id, user_id))
-            files = cur.fetchall()
-
-        print(f"delete_files_in_folder:\t{len(files)} files found to delete")
-
-        for file in files:
-            filename = file[0]
-            key = file[1]
-
-            # First delete from S3
-            print(f"delete_files_in_folder:\tBucket={BUCKET_NAME}, File {filename}, Key={key} will be deleted from  S3")
-            s3.delete_object(Bucket=BUCKET_NAME, Key=key)
-            print(f"delete_files_in_folder:\tBucket={BUCKET_NAME}, File {filename}, Key={key} deleted from  S3")
-
-            # Then delete from DB
-            with conn.cursor() as cur:
-                query = "DELETE FROM files WHERE s3_key = %s"
-                cur.execute(query, (key,))
-                conn.commit()
-            print(f"delete_files_in_folder:\tFile {filename}, Key={key} deleted from the db")
-    except Exception as e:
-        print(f"[delete_files_in_folder] Error with folder_id={folder_id}, user_id={user_id}")
-        print(f"Last S3 key: {key}")
-        print(f"Last query: {query}")
-        print(f"Exception: {e}")
-        raise
-
-    print(f"delete_files_in_folder: Deleted {len(files)} file(s) from S3 and database.")
-    if cur: cur.close()
-    if conn: conn.close()
-    
-
-def lambda_handler(event, context, depth=0):
-    MAX_RECURSION_DEPTH = int(os.environ["MAX_DELETE_RECURSION_DEPTH"])
+# delete_objects accepts at most 1000 keys per request
+S3_DELETE_BATCH_SIZE = 1000
+S3_DELETE_CONCURRENCY = int(os.environ.get("S3_DELETE_CONCURRENCY", "8"))
 
+def delete_s3_objects(keys):
+    BUCKET_NAME = os.environ["S3_BUCKET"]
+    batches = [keys[i:i + S3_DELETE_BATCH_SIZE] for i in range(0, len(keys), S3_DELETE_BATCH_SIZE)]
+
+    def delete_batch(batch):
+        response = s3.delete_objects(
+            Bucket=BUCKET_NAME,
+            Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+        )
+        return response.get("Errors", [])
+
+    with ThreadPoolExecutor(max_workers=S3_DELETE_CONCURRENCY) as pool:
+        errors = [error for batch_errors in pool.map(delete_batch, batches) for error in batch_errors]
+
+    print(f"delete_s3_objects: {len(keys)} key(s) in {len(batches)} delete_objects call(s), {len(errors)} error(s)")
+    if errors:
+        sample = ", ".join(f"{e.get('Key')}: {e.get('Code')}" for e in errors[:5])
+        raise RuntimeError(f"Failed to delete {len(errors)} object(s) from S3 ({sample})")
+
+# Delete a folder and its whole subtree in one transaction:
+# resolve every folder in one recursive query over parent_id, remove their file rows (collecting the S3 keys) and folder
+# rows with set-based statements, then delete the objects in batches before committing.
+# Deduplicated content is released instead, and its object deleted only with the last reference.
+# This is retryable, not atomic: if a batch fails the transaction rolls back, but objects removed by
+# the batches that succeeded stay gone, so the restored rows can point at missing objects until the
+# delete is run again (deleting a missing key succeeds). The row locks are held while S3 runs.
+def delete_subtree(conn, user_id, path):
+    with conn.cursor() as cur:
+        cur.execute("""
+            WITH RECURSIVE subtree AS (
+                SELECT folder_id FROM folders WHERE user_id = %s AND path = %s
+                UNION ALL
+                SELECT f.folder_id FROM folders f JOIN subtree s ON f.parent_id = s.folder_id AND f.user_id = %s
+            )
+            SELECT folder_id FROM subtree
+        """, (user_id, path, user_id))
+        folder_ids = [row[0] for row in cur.fetchall()]
+        if not folder_ids:
+            return None
+
+        cur.execute("""
+            DELETE FROM file_shares
+            WHERE file_id IN (SELECT file_id FROM files WHERE user_id = %s AND folder_id = ANY(%s::uuid[]))
+        """, (user_id, folder_ids))
+        cur.execute("""
+            DELETE FROM files
+            WHERE user_id = %s AND folder_id = ANY(%s::uuid[])
+            RETURNING s3_key, content_sha256
+        """, (user_id, folder_ids))
+        deleted = cur.fetchall()
+        cur.execute("DELETE FROM folders WHERE user_id = %s AND folder_id = ANY(%s::uuid[])", (user_id, folder_ids))
+        listing_cache.bump_version(user_id, cur)
+
+        keys = [s3_key for s3_key, digest in deleted if not digest]
+        keys += blobs.release(cur, [(user_id, digest) for _, digest in deleted if digest])
+
+    print(f"delete_subtree: {path} has {len(folder_ids)} folder(s) and {len(deleted)} file(s), {len(keys)} object(s) to delete")
+    if keys:
+        delete_s3_objects(keys)
+    return len(folder_ids), len(deleted)
+
+def lambda_handler(event, context):
     # Parse input
     try:
         body = json.loads(event['body'])
@@ -73,86 +89,35 @@ def lambda_handler(event, context, depth=0):
     except Exception as e:
         return {"statusCode": 400, "body": json.dumps({"error": "Malformed request", "details": str(e)})}
 
-    print(f"Recursion check: lambda_handler has been called {depth} times. Max allowed recursion = {MAX_RECURSION_DEPTH}")
-    if depth > MAX_RECURSION_DEPTH:
-        return {
-            "statusCode": 429,
-            "body": json.dumps({
-                "status": "error",
-                "message": f"Folder delete aborted after {MAX_RECURSION_DEPTH} levels of recursion.",
-                "retry_after": "manual review"
-            })
-        }
-
-    conn = None
-    cur = None
-
     try:
-        conn = psycopg2.connect(connect_timeout=5, **DB_CONFIG )
-        conn.autocommit = True
-        folder_id = ""
-        with conn.cursor() as cur:
-            print(f"Verifying that folder {path} exists for user {user_id}")
-            cur.execute("SELECT folder_id FROM folders WHERE user_id = %s AND path = %s", (user_id, path))
-            result = cur.fetchone()
-            if not result:
-                return {
-                    "statusCode": 404,
-                    "body": json.dumps({
-                        "message": f"Folder {path} does not exist for user {user_id} at depth={MAX_RECURSION_DEPTH}",
-                        "status": "error"
-                    })
-                }
-
-            folder_id = result[0]
-
-        print(f"Folder {path} exists. Checking for subfolders...")
-        like_path = path.rstrip("/") + "/%"
-
-        with conn.cursor() as cur:
-            cur.execute("SELECT path FROM folders WHERE user_id = %s AND path LIKE %s AND path != %s", (user_id, like_path, path))
-            subfolders = cur.fetchall()
-
-        if not subfolders:
-            print(f"No subfolders found")
-        else:
-            for (subpath,) in subfolders:
-                print(f"\tSubfolder {subpath} found")
-                event = {
-                    "body": json.dumps({
-                        "path": subpath,
-                        "user_id": user_id
-                    })
-                }
-                print(f"Recursively calling lambda_handler(event={event}, None, depth={depth + 1})")
-                response = lambda_handler(event, None, depth + 1)
-                if response.get("statusCode", 0) >= 400:
-                    # Only log if we're at the top
-                    if depth == 0:
-                        print(f"Error during recursive delete of {subpath}: {response}")
-                    return response
-
-        # Remove the files in the folder
-        delete_files_in_folder(folder_id, user_id)
-
-        # Delete the folder
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM folders WHERE user_id = %s AND path = %s", (user_id, path))
-            conn.commit()
-
+        with db.connection() as conn:
+            deleted = delete_subtree(conn, user_id, path)
+        folder_resolver.invalidate(user_id, path)
+
+        if not deleted:
+            return {
+                "statusCode": 404,
+                "body": json.dumps({
+                    "message": f"Folder {path} does not exist for user {user_id}",
+                    "status": "error"
+                })
+            }
+
+        folder_count, file_count = deleted
         return {
             "statusCode": 200,
             "body": json.dumps({
                 "message": f"Folder {path} deleted for user {user_id}",
                 "status": "success",
-                "path": path
+                "path": path,
+                "folders_deleted": folder_count,
+                "files_deleted": file_count
             })
         }
 
     except Exception as e:
-        if depth == 0:
-            print(f"Unhandled exception at top-level: {e}")
-            traceback.print_exc()
+        print(f"Unhandled exception at top-level: {e}")
+        traceback.print_exc()
         return {
             "statusCode": 500,
             "body": json.dumps({
@@ -161,7 +126,3 @@ def lambda_handler(event, context, depth=0):
                 "status": "error"
             })
         }
-
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
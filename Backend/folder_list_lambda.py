@@ -1,36 +1,33 @@
 import json
-import psycopg2
-import os
-
-def get_direct_subfolders(folders, current_path):
-    current_path = current_path.rstrip("/")
-    prefix = current_path + "/" if current_path != "" else "/"
-
-    seen = set()
-    results = []
-
-    for folder in folders:
-        full_path = folder["path"].rstrip("/")
-
-        if full_path == current_path:
-            continue  # skip self
-
-        if not full_path.startswith(prefix):
-            continue
-
-        suffix = full_path[len(prefix):]
-        parts = suffix.split("/")
-
-        if len(parts) >= 1:
-            name = parts[0]
-            if name not in seen:
-                seen.add(name)
-                results.append({
-                    "name": name,
-                    "path": prefix + name
-                })
-
-    return results
+import base64
+import hashlib
+from datetime import datetime
+import db
+import listing_cache
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+# Opaque page cursor: the (uploaded_at, file_id) of the last file on the previous page
+def encode_cursor(uploaded_at, file_id):
+    raw = json.dumps({"u": uploaded_at.isoformat(), "f": str(file_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(raw["u"]), raw["f"]
+
+# Strong validator for one listing page. The user's listing version changes on every mutation
+# of their tree, so an unchanged tag means the page would be rebuilt byte for byte.
+def listing_etag(user_id, version, path, limit, cursor):
+    digest = hashlib.sha256(f"{user_id}\0{path}\0{limit}\0{cursor or ''}".encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
 
 def lambda_handler(event, context):
     # Extract query parameters
@@ -39,7 +36,8 @@ def lambda_handler(event, context):
 
     user_id = event.get("user_id")
     folder_path = event.get("path")
-
+    cursor = event.get("cursor")
+    if_none_match = event.get("if_none_match")
 
     if not user_id or not folder_path:
         return {
@@ -47,62 +45,92 @@ def lambda_handler(event, context):
             "body": json.dumps({"error": "folder_list_lambda: Missing user_id or path"})
         }
 
-    # Database credentials from environment variables
-    db_host = os.environ["DB_HOST"]
-    db_name = os.environ["DB_NAME"]
-    db_user = os.environ["DB_USER"]
-    db_password = os.environ["DB_PASSWORD"]
+    try:
+        limit = min(int(event.get("limit") or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        after = decode_cursor(cursor) if cursor else None
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    except Exception as e:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": f"folder_list_lambda: Invalid limit or cursor ({str(e)})"})
+        }
 
     try:
-        conn = psycopg2.connect(
-            host=db_host,
-            dbname=db_name,
-            user=db_user,
-            password=db_password
-        )
-        cur = conn.cursor()
-
-        # Get folder_id from path and user
-        cur.execute("""
-            SELECT folder_id FROM folders
-            WHERE user_id = %s AND path = %s
-        """, (user_id, folder_path))
-
-        row = cur.fetchone()
-        if not row:
+        # Only first pages are cached; later pages are read once per "load more"
+        cache_key = (str(user_id), folder_path, limit)
+        cached = None
+        if after:
+            version = listing_cache.cache.version(str(user_id))
+        else:
+            version, cached = listing_cache.cache.get(cache_key)
+
+        # The client already has this exact page: no folder or file query, no body
+        etag = listing_etag(user_id, version, folder_path, limit, cursor)
+        if etag_matches(if_none_match, etag):
             return {
-                "statusCode": 404,
-                "body": json.dumps({"error": "Folder not found"})
+                "statusCode": 304,
+                "headers": {"ETag": etag},
+                "body": ""
             }
-
-        folder_id = row[0]
-
-        # 🔽 Get child folders
-        prefix = folder_path.rstrip("/") + "/%"
-        depth = folder_path.count("/") + 1
-
-        cur.execute("""
-            SELECT path
-            FROM folders
-            WHERE user_id = %s
-              AND path LIKE %s
-        """, (user_id, prefix))
-
-        folders = []
-        for r in cur.fetchall():
-            child_path = r[0]
-            name = child_path.rsplit("/", 1)[-1]
-            folders.append({"name": name, "path": child_path})
-
-        folders = get_direct_subfolders(folders, folder_path)
-
-        # 📄 Get files in the folder
-        cur.execute("""
-            SELECT file_id, filename, size_bytes, uploaded_at
-            FROM files
-            WHERE user_id = %s AND folder_id = %s
-            ORDER BY uploaded_at DESC
-        """, (user_id, folder_id))
+        if cached:
+            return cached
+
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                # Get folder_id from path and user
+                cur.execute("""
+                    SELECT folder_id FROM folders
+                    WHERE user_id = %s AND path = %s
+                """, (user_id, folder_path))
+
+                row = cur.fetchone()
+                if not row:
+                    return {
+                        "statusCode": 404,
+                        "body": json.dumps({"error": "Folder not found"})
+                    }
+
+                folder_id = row[0]
+
+                # 🔽 Get child folders (first page only)
+                folders = []
+                if not after:
+                    cur.execute("""
+                        SELECT path
+                        FROM folders
+                        WHERE user_id = %s AND parent_id = %s
+                    """, (user_id, folder_id))
+
+                    folders = [
+                        {"name": child_path.rsplit("/", 1)[-1], "path": child_path}
+                        for (child_path,) in cur.fetchall()
+                    ]
+
+                # 📄 Get one page of files in the folder, newest first (keyset on uploaded_at, file_id).
+                # One extra row tells us whether there is a next page.
+                if after:
+                    cur.execute("""
+                        SELECT file_id, filename, size_bytes, uploaded_at
+                        FROM files
+                        WHERE user_id = %s AND folder_id = %s
+                          AND (uploaded_at, file_id) < (%s, %s::uuid)
+                        ORDER BY uploaded_at DESC, file_id DESC
+                        LIMIT %s
+                    """, (user_id, folder_id, after[0], after[1], limit + 1))
+                else:
+                    cur.execute("""
+                        SELECT file_id, filename, size_bytes, uploaded_at
+                        FROM files
+                        WHERE user_id = %s AND folder_id = %s
+                        ORDER BY uploaded_at DESC, file_id DESC
+                        LIMIT %s
+                    """, (user_id, folder_id, limit + 1))
+
+                rows = cur.fetchall()
+
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1][3], page[-1][0]) if len(rows) > limit else None
 
         files = [
             {
@@ -111,25 +139,24 @@ def lambda_handler(event, context):
                 "size_bytes": row[2],
                 "uploaded_at": row[3].strftime("%m/%d/%Y %H:%M:%S")
             }
-            for row in cur.fetchall()
+            for row in page
         ]
 
-        return {
+        response = {
             "statusCode": 200,
+            "headers": {"ETag": etag},
             "body": json.dumps({
                 "folders": folders,
-                "files": files
+                "files": files,
+                "next_cursor": next_cursor
             })
         }
+        if not after:
+            listing_cache.cache.put(cache_key, version, response)
+        return response
 
     except Exception as e:
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
-
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import db
+
+# In-process (user_id, path) -> folder_id resolution for path-based actions such as uploads.
+# Replaces the synchronous check_folder_exists_lambda invoke: hits cost nothing, misses are one
+# indexed query on a pooled connection.
+#
+# Only existing folders are cached, and a hit is not checked against the database.
+# folder_delete_lambda invalidates the deleted subtree in its own process; FOLDER_CACHE_TTL
+# bounds how long another warm process can keep resolving a folder that was deleted (or
+# recreated under a new id) elsewhere. An upload into such a folder is not recorded: the files
+# row's foreign key to folders rejects it in log_upload_lambda.
+
+CACHE_SIZE = int(os.environ.get("FOLDER_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.environ.get("FOLDER_CACHE_TTL", "300"))
+
+_cache = OrderedDict()  # (user_id, path) -> (folder_id, cached_at)
+_lock = threading.Lock()
+
+def _lookup(user_id, path):
+    with db.connection(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT folder_id FROM folders WHERE user_id = %s AND path = %s", (user_id, path))
+            row = cur.fetchone()
+    return str(row[0]) if row else None
+
+# Returns the folder_id, or None if the user has no folder at that path
+def resolve_folder_id(user_id, path):
+    key = (str(user_id), path)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry and now - entry[1] < CACHE_TTL:
+            _cache.move_to_end(key)
+            return entry[0]
+
+    folder_id = _lookup(key[0], path)
+    if folder_id and CACHE_SIZE > 0:
+        with _lock:
+            _cache[key] = (folder_id, now)
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return folder_id
+
+# Forget a folder and everything below it
+def invalidate(user_id, path):
+    user_id = str(user_id)
+    prefix = path.rstrip("/") + "/"
+    with _lock:
+        for key in [k for k in _cache if k[0] == user_id and (k[1] == path or k[1].startswith(prefix))]:
+            del _cache[key]
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,54 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Reuse of short-lived links: presigned S3 URLs in file_download_lambda and UI share tokens in
+# file_share_lambda. Handing out the same link again keeps repeat clicks from writing a new
+# share row or minting a new URL (which also lets the browser cache the download).
+#
+# An entry is reused for the first LINK_REUSE_FRACTION of its lifetime, so a reused link
+# always has a useful amount of time left when the client gets it.
+
+CACHE_SIZE = int(os.environ.get("LINK_CACHE_SIZE", "1024"))
+REUSE_FRACTION = float(os.environ.get("LINK_REUSE_FRACTION", "0.8"))
+
+def reuse_until(issued_at, expires_at):
+    return issued_at + (expires_at - issued_at) * REUSE_FRACTION
+
+class LinkCache:
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (value, reuse_until epoch seconds)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self.entries[key]
+            self.misses += 1
+        return None
+
+    # expires_at is when the link itself stops working (epoch seconds)
+    def put(self, key, value, expires_at, issued_at=None):
+        if self.max_entries <= 0:
+            return
+        until = reuse_until(time.time() if issued_at is None else issued_at, expires_at)
+        with self.lock:
+            self.entries[key] = (value, until)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import db
+
+# Per-user listing cache for folder_list_lambda (and the bridge when it dispatches in-process).
+#
+# Entries live in an in-process LRU keyed by (user_id, path, limit) and are tagged with the
+# user's change version at the time they were built. Every mutation of a user's tree (upload,
+# file delete, folder create, folder delete) bumps that version in the shared version store,
+# so an entry is only served while its version still matches: a user never sees a listing
+# that predates their own change.
+
+CACHE_SIZE = int(os.environ.get("LISTING_CACHE_SIZE", "256"))
+# "postgres" shares versions between every Lambda; "memory" is a local stand-in that only
+# works when readers and writers run in the same process (tests, local dispatch experiments).
+CACHE_STORE = os.environ.get("LISTING_CACHE_STORE", "postgres")
+
+class PostgresVersionStore:
+    def get(self, user_id):
+        with db.connection(autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT version FROM listing_versions WHERE user_id = %s", (user_id,))
+                row = cur.fetchone()
+        return row[0] if row else 0
+
+    # Runs on the caller's cursor so the bump commits (or rolls back) with the mutation itself
+    def bump(self, user_id, cur):
+        cur.execute("""
+            INSERT INTO listing_versions (user_id, version) VALUES (%s, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = listing_versions.version + 1
+        """, (user_id,))
+
+class MemoryVersionStore:
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            return self.versions.get(user_id, 0)
+
+    def bump(self, user_id, cur=None):
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+
+class ListingCache:
+    def __init__(self, store, max_entries):
+        self.store = store
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (version, built_at, response)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0      # entries rejected because the user's version moved on
+        self.evictions = 0
+
+    # Returns (version, response); response is None on a miss. Pass the version back to put()
+    # so an entry built while a mutation raced in is tagged with the older version.
+    def get(self, key):
+        user_id = key[0]
+        version = self.store.get(user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                print(f"[CACHE] hit {key[1]} v{version} age={time.monotonic() - entry[1]:.1f}s {self.describe()}")
+                return version, entry[2]
+            if entry:
+                del self.entries[key]
+                self.stale += 1
+            self.misses += 1
+        print(f"[CACHE] miss {key[1]} v{version} {self.describe()}")
+        return version, None
+
+    def put(self, key, version, response):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (version, time.monotonic(), response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self, user_id, cur=None):
+        self.store.bump(user_id, cur)
+
+    def version(self, user_id):
+        return self.store.get(user_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def describe(self):
+        s = self.stats()
+        return f"(hit_ratio={s['hit_ratio']:.2f} hits={s['hits']} misses={s['misses']} stale={s['stale']} entries={s['entries']})"
+
+cache = ListingCache(MemoryVersionStore() if CACHE_STORE == "memory" else PostgresVersionStore(), CACHE_SIZE)
+
+# Called by every handler that changes what a user's listings would show
+def bump_version(user_id, cur=None):
+    cache.bump(str(user_id), cur)
@@ -1,8 +1,18 @@
-import json
 import os
-import psycopg2
+import json
 import uuid
 import base64
+from collections import Counter
+import boto3
+import psycopg2
+from psycopg2.extras import execute_values
+import blobs
+import db
+import listing_cache
+
+s3 = boto3.client('s3')
+
+BUCKET_NAME = os.environ['S3_BUCKET']
 
 # Helper to validate parameters
 def validate_required_fields(payload, required, context_label):
@@ -12,14 +22,15 @@ def validate_required_fields(payload, required, context_label):
 
 def lambda_handler(event, context):
     print("🔥 [BOOT] Lambda triggered.")
-    
-    try:
-        print("📦 [EVENT] Full event payload:")
-        print(json.dumps(event, indent=2))
-    except Exception as e:
-        print(f"💥 [ERROR] Failed to stringify full event: {str(e)}")
+    records = event.get("Records", [])
+    print(f"📦 [EVENT] {len(records)} record(s) in batch")
 
-    for record in event.get("Records", []):
+    rows = {}       # s3_key -> (message_id, row); a later upload of the same key wins
+    failed_ids = []
+    staged = {}     # message_id -> staging key of a verified multipart upload
+
+    for record in records:
+        message_id = record.get("messageId")
         try:
             print("📨 [RECORD] Raw record body:")
             print(record['body'])
@@ -38,63 +49,160 @@ def lambda_handler(event, context):
                 ["user_id", "folder", "filename", "s3_key", "file_size"],
                 "log_upload_lambda"
             )
-            insert_metadata_to_rds(message)
+            if message.get("staging_key"):
+                if not claim_staged_upload(message):
+                    continue
+                staged[message_id] = message["staging_key"]
+            row = build_file_row(message)
+            previous = rows.get(row[4])
+            if previous:
+                print(f"[DEBUG] {row[4]} uploaded again later in the batch (message {previous[0]} superseded)")
+            rows[row[4]] = (message_id, row)
+
+        except Exception as e:
+            print(f"🚫 [ERROR] Failed to process record {message_id}: {type(e).__name__} - {str(e)}")
+            failed_ids.append(message_id)
 
+    if rows:
+        try:
+            rejected = insert_metadata_batch([row for _, row in rows.values()])
+            print(f"✅ [DB] Upserted {len(rows) - len(rejected)} file record(s) into RDS.")
+            failed_ids.extend(rows[row[4]][0] for row in rejected)
         except Exception as e:
-            print(f"🚫 [ERROR] Failed to process record: {type(e).__name__} - {str(e)}")
+            print(f"💥 [DB ERROR] {type(e).__name__}: {str(e)}")
+            failed_ids.extend(message_id for message_id, _ in rows.values())
+
+    # Staged parts are only needed until their file is recorded; failed messages keep theirs for the retry
+    for message_id, key in staged.items():
+        if message_id not in failed_ids:
+            s3.delete_object(Bucket=BUCKET_NAME, Key=key)
 
+    # Partial batch response: SQS redelivers only these messages (needs ReportBatchItemFailures)
     return {
-        "statusCode": 200,
-        "body": json.dumps({"message": "Upload event(s) processed."})
+        "batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_ids]
     }
 
-def insert_metadata_to_rds(event_data):
-    conn = None
-    if 'filename' not in event_data or 's3_key' not in event_data or 'user_id' not in event_data or 'file_size' not in event_data:
-        raise ValueError(f"Invalid event data: expected filename, s3_key, user_id and file_size, got {event_data}")
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['DB_HOST'],
-            port=os.environ['DB_PORT'],
-            dbname=os.environ['DB_NAME'],
-            user=os.environ['DB_USER'],
-            password=os.environ['DB_PASSWORD'],
-            connect_timeout=3
-        )
-        cursor = conn.cursor()
-
-        file_id = str(uuid.uuid4())
-        user_id = event_data.get('user_id')
-        user_uuid = str(uuid.UUID(user_id.strip()))
-        print(f"[DEBUG] Raw user_id: {repr(user_id)}")
-        print(f"[DEBUG] converted user_uuid: {repr(user_uuid)}")
-        folder_id = str(uuid.UUID(event_data['folder']))  # now passed as a UUID string        
-        size_bytes = int(event_data.get('file_size'))
-        filename = event_data.get('filename')
-        s3_key = event_data.get('s3_key')
-        content_b64 = event_data.get('content', '')
-
-        if not filename or not s3_key or not user_id:
-            raise ValueError("Missing required metadata: filename, s3_key or user_id")
-    except Exception as e:
-        print(f"💥 [ERROR] {type(e).__name__}: {str(e)}")
-        return
+# Turn a multipart upload staged under message["staging_key"] into a blob of the account and
+# record it in the message. S3's own SHA-256 of a multipart object is a checksum of the part
+# checksums, so the staged object is read back and hashed; on a mismatch it is deleted and
+# False is returned. New content is copied to a unique key before it is claimed, so no row lock
+# or connection is held across the copy, and a copy that loses the claim to a concurrent upload
+# of the same content is deleted again.
+def claim_staged_upload(message):
+    user_id, digest, staging_key = message["user_id"], message.get("content_sha256"), message["staging_key"]
+    if not blobs.is_digest(digest):
+        raise ValueError("Invalid content_sha256 for a staged upload")
+    file_size = int(message["file_size"])
 
-    try:
-        query = """
-            INSERT INTO files (file_id, user_id, folder_id, filename, s3_key, size_bytes)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        values = (file_id, user_uuid, folder_id, filename, s3_key, size_bytes)
-        cursor.execute(query, values)
-        conn.commit()
-        print(f"✅ [DB] Inserted file metadata (file_id={file_id}) into RDS.")
-
-    except Exception as e:
-        print(f"💥 [DB ERROR] {type(e).__name__}: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+    with db.connection(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            existing = blobs.touch(cur, user_id, digest)
+    if existing and existing[1] == file_size:
+        object_key, size_bytes, codec, stored_size = existing
+        message.update(blob_key=object_key, codec=codec, stored_size=stored_size)
+        return True
+
+    staged = s3.get_object(Bucket=BUCKET_NAME, Key=staging_key)
+    if staged["ContentLength"] != file_size or blobs.digest_stream(staged["Body"]) != digest:
+        print(f"🚫 [VERIFY] {staging_key} does not match its sha256; dropping the upload")
+        s3.delete_object(Bucket=BUCKET_NAME, Key=staging_key)
+        return False
+
+    copy_key = blobs.unique_blob_key(user_id, digest)
+    s3.copy({"Bucket": BUCKET_NAME, "Key": staging_key}, BUCKET_NAME, copy_key)
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            object_key, created, codec, stored_size = blobs.claim(cur, user_id, digest, file_size, s3_key=copy_key)
+    if not created:
+        s3.delete_object(Bucket=BUCKET_NAME, Key=copy_key)
+    message.update(blob_key=object_key, codec=codec, stored_size=stored_size)
+    return True
+
+def build_file_row(event_data):
+    user_id = event_data.get('user_id')
+    user_uuid = str(uuid.UUID(user_id.strip()))
+    folder_id = str(uuid.UUID(event_data['folder']))  # now passed as a UUID string
+    size_bytes = int(event_data.get('file_size'))
+    filename = event_data.get('filename')
+    s3_key = event_data.get('s3_key')
+
+    if not filename or not s3_key or not user_id:
+        raise ValueError("Missing required metadata: filename, s3_key or user_id")
+
+    # Content-addressed uploads name the blob holding the bytes; older events have neither field
+    digest = event_data.get('content_sha256')
+    blob_key = event_data.get('blob_key')
+    if digest and (not blobs.is_digest(digest) or not blob_key):
+        raise ValueError("Invalid content_sha256 or missing blob_key")
+
+    # Compressed objects (storage_codec) carry their codec and size in S3
+    codec = event_data.get('codec') or None
+    stored_bytes = int(event_data.get('stored_size') or size_bytes)
+
+    return (str(uuid.uuid4()), user_uuid, folder_id, filename, s3_key, size_bytes, digest or None, blob_key or None,
+            codec, stored_bytes)
+
+# Write the whole batch in one transaction with a single multi-row upsert. If the database rejects
+# a row (a constraint or a bad value) the batch statement is rolled back to a savepoint and the
+# rows are retried one by one under their own savepoints, so the rest still commit. Returns the
+# rows that were rejected; any other error fails the whole batch.
+def insert_metadata_batch(rows):
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SAVEPOINT batch")
+            try:
+                upsert_rows(cursor, rows)
+                return []
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                print(f"⚠️ [DB] Batch upsert rejected ({type(e).__name__}: {e}); retrying row by row")
+                cursor.execute("ROLLBACK TO SAVEPOINT batch")
+
+            rejected = []
+            for row in rows:
+                cursor.execute("SAVEPOINT file_row")
+                try:
+                    upsert_rows(cursor, [row])
+                    cursor.execute("RELEASE SAVEPOINT file_row")
+                except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                    print(f"🚫 [DB] Rejected {row[4]}: {type(e).__name__}: {e}")
+                    cursor.execute("ROLLBACK TO SAVEPOINT file_row")
+                    rejected.append(row)
+            return rejected
+
+# Re-uploads of an existing key keep their file_id (and any shares) and refresh the metadata.
+# Each uploader's listing version is bumped in the same transaction, and so are the blob reference
+# counts: +1 for every row now holding a blob, -1 for every blob an overwritten row held. A
+# redelivered event therefore nets out to no change. Blobs left unreferenced by an overwrite are
+# removed by blob_sweeper_lambda.
+def upsert_rows(cursor, rows):
+    query = """
+        INSERT INTO files (file_id, user_id, folder_id, filename, s3_key, size_bytes, content_sha256, blob_key,
+                           codec, stored_bytes)
+        VALUES %s
+        ON CONFLICT (s3_key) DO UPDATE SET
+            user_id = EXCLUDED.user_id,
+            folder_id = EXCLUDED.folder_id,
+            filename = EXCLUDED.filename,
+            size_bytes = EXCLUDED.size_bytes,
+            content_sha256 = EXCLUDED.content_sha256,
+            blob_key = EXCLUDED.blob_key,
+            codec = EXCLUDED.codec,
+            stored_bytes = EXCLUDED.stored_bytes,
+            uploaded_at = NOW()
+    """
+    cursor.execute("""
+        SELECT user_id, content_sha256 FROM files
+        WHERE s3_key = ANY(%s) AND content_sha256 IS NOT NULL
+        ORDER BY s3_key
+        FOR UPDATE
+    """, ([row[4] for row in rows],))
+    refs = Counter((row[1], row[6]) for row in rows if row[6])
+    refs.subtract((str(user_id), digest) for user_id, digest in cursor.fetchall())
+
+    execute_values(cursor, query, rows, page_size=len(rows))
+    blobs.adjust(cursor, refs)
+    for user_id in sorted({row[1] for row in rows}):
+        listing_cache.bump_version(user_id, cursor)
 
 def base64_decode_length_safe(content):
     """Used to estimate file size from base64 content"""
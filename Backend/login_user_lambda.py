@@ -1,19 +1,7 @@
 import json
-import os
-import bcrypt
-import jwt
-import psycopg2
-import datetime
-
-JWT_SECRET = os.environ["JWT_SECRET"]
-JWT_EXP_HOURS = 12
-DB_CONFIG = {
-    'dbname': os.environ["DB_NAME"],
-    'user': os.environ["DB_USER"],
-    'password': os.environ["DB_PASSWORD"],
-    'host': os.environ["DB_HOST"],
-    'port': 5432,
-}
+import db
+import passwords
+import refresh_tokens
 
 def handler(event, context):
     try:
@@ -24,7 +12,7 @@ def handler(event, context):
         if not email or not password:
             return respond(400, "Email and password are required.")
 
-        with psycopg2.connect(**DB_CONFIG) as conn:
+        with db.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT user_id, password_hash, display_name FROM users WHERE email = %s", (email,))
                 row = cur.fetchone()
@@ -33,22 +21,23 @@ def handler(event, context):
 
             user_id, password_hash, display_name = row
 
-        
-        if not bcrypt.checkpw(password.encode(), password_hash):
+        ok, new_hash = passwords.verify_and_update(password, password_hash)
+        if not ok:
             return respond(401, "Incorrect password.")
 
-        payload = {
-            "user_id": user_id,
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=JWT_EXP_HOURS)
-        }
-
-        token = jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+        # Short-lived access token; the refresh token renews it without another password check
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                if new_hash:
+                    # Hashed under an older policy: store the upgraded hash now we have the password
+                    cur.execute("UPDATE users SET password_hash = %s WHERE user_id = %s", (new_hash, user_id))
+                tokens = refresh_tokens.token_pair(cur, user_id)
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({
-                "token": token,
+                **tokens,
                 "user": {
                     "user_id": user_id,
                     "email": email,
@@ -0,0 +1,148 @@
+import db
+
+# Schema migrations, applied in order and recorded in schema_migrations so reruns are no-ops.
+# Each entry is (name, sql); the sql runs in a single transaction.
+MIGRATIONS = [
+    ("files_s3_key_unique", """
+        -- Re-uploads to the same key used to add a second row; keep the newest one
+        WITH ranked AS (
+            SELECT file_id, ROW_NUMBER() OVER (PARTITION BY s3_key ORDER BY uploaded_at DESC, file_id DESC) AS rn
+            FROM files
+        ), stale AS (
+            SELECT file_id FROM ranked WHERE rn > 1
+        ), stale_shares AS (
+            DELETE FROM file_shares WHERE file_id IN (SELECT file_id FROM stale)
+        )
+        DELETE FROM files WHERE file_id IN (SELECT file_id FROM stale);
+        CREATE UNIQUE INDEX IF NOT EXISTS files_s3_key_uidx ON files (s3_key);
+    """),
+    ("subtree_delete_indexes", """
+        -- Prefix scans for a folder's subtree, and set-based file lookups by folder
+        CREATE INDEX IF NOT EXISTS folders_user_path_prefix_idx ON folders (user_id, path text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS files_user_folder_idx ON files (user_id, folder_id);
+    """),
+    ("folders_parent_id", """
+        -- Direct children come from an indexed parent reference instead of a LIKE scan,
+        -- so the path prefix index has no queries left
+        ALTER TABLE folders ADD COLUMN IF NOT EXISTS parent_id UUID REFERENCES folders (folder_id);
+        CREATE INDEX IF NOT EXISTS folders_user_parent_idx ON folders (user_id, parent_id);
+        DROP INDEX IF EXISTS folders_user_path_prefix_idx;
+
+        -- Create any missing ancestors so every folder other than '/' has a parent row
+        WITH RECURSIVE ancestors (user_id, path) AS (
+            SELECT user_id, path FROM folders WHERE path <> '/'
+            UNION
+            SELECT user_id, CASE WHEN path ~ '^/[^/]*$' THEN '/' ELSE regexp_replace(path, '/[^/]*$', '') END
+            FROM ancestors WHERE path <> '/'
+        )
+        INSERT INTO folders (user_id, path)
+        SELECT DISTINCT a.user_id, a.path FROM ancestors a
+        WHERE NOT EXISTS (SELECT 1 FROM folders f WHERE f.user_id = a.user_id AND f.path = a.path);
+
+        UPDATE folders child SET parent_id = parent.folder_id
+        FROM folders parent
+        WHERE child.path <> '/'
+          AND parent.user_id = child.user_id
+          AND parent.path = CASE WHEN child.path ~ '^/[^/]*$' THEN '/' ELSE regexp_replace(child.path, '/[^/]*$', '') END;
+    """),
+    ("files_listing_keyset_idx", """
+        -- Keyset pagination of a folder's files by (uploaded_at, file_id), newest first.
+        -- Its (user_id, folder_id) prefix also covers the set-based deletes, so the narrower index goes.
+        CREATE INDEX IF NOT EXISTS files_listing_keyset_idx ON files (user_id, folder_id, uploaded_at DESC, file_id DESC);
+        DROP INDEX IF EXISTS files_user_folder_idx;
+    """),
+    ("listing_versions", """
+        -- Per-user change version that validates cached folder listings
+        CREATE TABLE IF NOT EXISTS listing_versions (
+            user_id UUID PRIMARY KEY,
+            version BIGINT NOT NULL
+        );
+    """),
+    ("file_shares_expires_at_idx", """
+        -- share_sweeper_lambda deletes expired shares oldest first in bounded batches
+        CREATE INDEX IF NOT EXISTS file_shares_expires_at_idx ON file_shares (expires_at)
+            WHERE expires_at IS NOT NULL;
+    """),
+    ("file_shares_token_unique", """
+        -- Token lookups on download go through a unique index; older duplicates lose
+        WITH ranked AS (
+            SELECT share_id, ROW_NUMBER() OVER (PARTITION BY token ORDER BY expires_at DESC NULLS LAST, share_id) AS rn
+            FROM file_shares
+        )
+        DELETE FROM file_shares WHERE share_id IN (SELECT share_id FROM ranked WHERE rn > 1);
+        CREATE UNIQUE INDEX IF NOT EXISTS file_shares_token_uidx ON file_shares (token);
+        -- file_share_lambda looks up a reusable share per file
+        CREATE INDEX IF NOT EXISTS file_shares_file_expires_idx ON file_shares (file_id, expires_at);
+    """),
+    ("refresh_tokens", """
+        -- Rotating refresh tokens, stored as SHA-256 hashes; family_id ties together every token
+        -- issued from one login so a replayed token can revoke all of them
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            token_hash TEXT PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+            family_id UUID NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            used_at TIMESTAMPTZ,
+            revoked_at TIMESTAMPTZ
+        );
+        CREATE INDEX IF NOT EXISTS refresh_tokens_family_idx ON refresh_tokens (family_id);
+        CREATE INDEX IF NOT EXISTS refresh_tokens_expires_at_idx ON refresh_tokens (expires_at);
+    """),
+    ("blobs", """
+        -- Content-addressed file bytes, one row per distinct content of an account (see blobs.py).
+        -- files.blob_key points at the object; rows written before this migration keep theirs at s3_key.
+        CREATE TABLE IF NOT EXISTS blobs (
+            user_id UUID NOT NULL,
+            sha256 TEXT NOT NULL,
+            s3_key TEXT NOT NULL UNIQUE,
+            size_bytes BIGINT NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            claimed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, sha256)
+        );
+        CREATE INDEX IF NOT EXISTS blobs_unreferenced_idx ON blobs (claimed_at) WHERE ref_count <= 0;
+        ALTER TABLE files ADD COLUMN IF NOT EXISTS content_sha256 TEXT;
+        ALTER TABLE files ADD COLUMN IF NOT EXISTS blob_key TEXT;
+    """),
+    ("storage_codec", """
+        -- Compression of stored bytes (see storage_codec.py). codec is NULL for objects stored as is;
+        -- stored_bytes is the object's size in S3, size_bytes stays the original size.
+        ALTER TABLE blobs ADD COLUMN IF NOT EXISTS codec TEXT;
+        ALTER TABLE blobs ADD COLUMN IF NOT EXISTS stored_bytes BIGINT;
+        UPDATE blobs SET stored_bytes = size_bytes WHERE stored_bytes IS NULL;
+        ALTER TABLE blobs ALTER COLUMN stored_bytes SET NOT NULL;
+        ALTER TABLE files ADD COLUMN IF NOT EXISTS codec TEXT;
+        ALTER TABLE files ADD COLUMN IF NOT EXISTS stored_bytes BIGINT;
+    """),
+]
+
+def applied_migrations(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("SELECT name FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+def migrate():
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            done = applied_migrations(cur)
+
+    for name, sql in MIGRATIONS:
+        if name in done:
+            print(f"Migration {name} already applied")
+            continue
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+        print(f"Migration {name} applied")
+
+if __name__ == "__main__":
+    migrate()
+    print("SparkDrive migrations complete.")
@@ -0,0 +1,72 @@
+import os
+import bcrypt
+from passlib.hash import pbkdf2_sha256
+
+# The one place passwords are hashed and checked (register_user_lambda, login_user_lambda,
+# create_hash_tool.py).
+#
+# PASSWORD_SCHEME picks the algorithm for new hashes ("bcrypt" or "pbkdf2_sha256") and
+# PASSWORD_BCRYPT_ROUNDS / PASSWORD_PBKDF2_ROUNDS its work factor; size them with
+# Benchmarks/bench_password_hash.py on the Lambda's memory setting. Hashes of either scheme
+# still verify, and verify_and_update() hands back a replacement whenever a stored hash does
+# not match the current policy, so a policy change rolls out as users log in.
+
+SCHEMES = ("bcrypt", "pbkdf2_sha256")
+SCHEME = os.environ.get("PASSWORD_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.environ.get("PASSWORD_BCRYPT_ROUNDS", "12"))
+PBKDF2_ROUNDS = int(os.environ.get("PASSWORD_PBKDF2_ROUNDS", "29000"))
+
+if SCHEME not in SCHEMES:
+    raise ValueError(f"PASSWORD_SCHEME must be one of {', '.join(SCHEMES)}")
+
+def _bcrypt_secret(password):
+    # bcrypt only ever used the first 72 bytes; newer releases raise instead of truncating
+    return password.encode()[:72]
+
+def _as_text(stored):
+    if isinstance(stored, memoryview):
+        stored = stored.tobytes()
+    return stored.decode() if isinstance(stored, bytes) else stored
+
+def policy_rounds(scheme):
+    return BCRYPT_ROUNDS if scheme == "bcrypt" else PBKDF2_ROUNDS
+
+def hash_password(password, scheme=None, rounds=None):
+    scheme = scheme or SCHEME
+    rounds = rounds or policy_rounds(scheme)
+    if scheme == "bcrypt":
+        return bcrypt.hashpw(_bcrypt_secret(password), bcrypt.gensalt(rounds)).decode()
+    if scheme == "pbkdf2_sha256":
+        return pbkdf2_sha256.using(rounds=rounds).hash(password)
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+# (scheme, rounds) of a stored hash; scheme is None if the format is not recognised
+def describe(stored):
+    stored = _as_text(stored)
+    if stored.startswith(("$2a$", "$2b$", "$2y$")):
+        return "bcrypt", int(stored.split("$")[2])
+    if stored.startswith("$pbkdf2-sha256$"):
+        return "pbkdf2_sha256", int(stored.split("$")[2])
+    return None, None
+
+def needs_update(stored):
+    scheme, rounds = describe(stored)
+    return scheme != SCHEME or rounds != policy_rounds(scheme)
+
+def verify(password, stored):
+    stored = _as_text(stored)
+    scheme, _ = describe(stored)
+    if scheme == "bcrypt":
+        return bcrypt.checkpw(_bcrypt_secret(password), stored.encode())
+    if scheme == "pbkdf2_sha256":
+        return pbkdf2_sha256.verify(password, stored)
+    return False
+
+# Returns (ok, new_hash). new_hash is set only when the password matched and the stored hash
+# should be replaced to follow the current scheme and work factor.
+def verify_and_update(password, stored):
+    if not verify(password, stored):
+        return False, None
+    if needs_update(stored):
+        return True, hash_password(password)
+    return True, None
@@ -0,0 +1,42 @@
+import json
+import db
+import refresh_tokens
+
+# {"refresh_token": ...} -> a new access token and refresh token.
+# {"refresh_token": ..., "revoke": true} -> logout: the token's login can no longer refresh.
+def lambda_handler(event, context):
+    try:
+        body = json.loads(event["body"])
+        token = body.get("refresh_token")
+        if not token:
+            return respond(400, {"message": "Missing refresh_token"})
+
+        if body.get("revoke"):
+            with db.connection() as conn:
+                with conn.cursor() as cur:
+                    refresh_tokens.revoke(cur, token)
+            return respond(200, {"message": "Logged out."})
+
+        # The revocation on a replayed token has to commit even though the refresh is refused
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                try:
+                    user_id, tokens = refresh_tokens.rotate(cur, token)
+                except ValueError as e:
+                    error = str(e)
+                else:
+                    error = None
+        if error:
+            return respond(401, {"message": error})
+
+        return respond(200, {**tokens, "user": {"user_id": user_id}})
+
+    except Exception as e:
+        return respond(500, {"message": f"Refresh error: {str(e)}"})
+
+def respond(status, body):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(body)
+    }
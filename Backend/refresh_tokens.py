@@ -0,0 +1,91 @@
+import os
+import uuid
+import hashlib
+import secrets
+import datetime
+import auth
+
+# Short-lived access tokens plus rotating refresh tokens.
+#
+# Login checks the password once and hands out an access JWT (ACCESS_TOKEN_MINUTES) and an
+# opaque refresh token (REFRESH_TOKEN_DAYS). When the access token runs out the client trades
+# the refresh token for a new pair: one indexed lookup and a SHA-256, no password hash.
+#
+# Only a SHA-256 of each refresh token is stored. Every refresh marks the presented token used
+# and issues a new one in the same family; presenting a used token again means it leaked, so
+# the whole family is revoked and that login has to start over. The exception is a token used
+# within the last REFRESH_REUSE_GRACE_SECONDS: that is what two requests refreshing the same
+# session at once look like (parallel page loads, a retried call), so it gets another pair in
+# the family instead of ending the login.
+
+ACCESS_TOKEN_MINUTES = int(os.environ.get("ACCESS_TOKEN_MINUTES", "15"))
+REFRESH_TOKEN_DAYS = int(os.environ.get("REFRESH_TOKEN_DAYS", "14"))
+REUSE_GRACE_SECONDS = int(os.environ.get("REFRESH_REUSE_GRACE_SECONDS", "30"))
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def issue_access_token(user_id):
+    return auth.issue_token({
+        "user_id": str(user_id),
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=ACCESS_TOKEN_MINUTES)
+    })
+
+# Store a new refresh token for user_id on the caller's cursor; returns the raw token
+def issue_refresh_token(cur, user_id, family_id=None):
+    token = secrets.token_urlsafe(32)
+    cur.execute("""
+        INSERT INTO refresh_tokens (token_hash, user_id, family_id, expires_at)
+        VALUES (%s, %s, %s, NOW() + %s)
+    """, (hash_token(token), str(user_id), str(family_id or uuid.uuid4()), datetime.timedelta(days=REFRESH_TOKEN_DAYS)))
+    return token
+
+def token_pair(cur, user_id, family_id=None):
+    return {
+        "token": issue_access_token(user_id),
+        "refresh_token": issue_refresh_token(cur, user_id, family_id),
+        "expires_in": ACCESS_TOKEN_MINUTES * 60
+    }
+
+# Trade a refresh token for a new access/refresh pair; raises ValueError if it is not usable
+def rotate(cur, token):
+    token_hash = hash_token(token)
+    cur.execute("""
+        UPDATE refresh_tokens SET used_at = NOW()
+        WHERE token_hash = %s AND used_at IS NULL AND revoked_at IS NULL AND expires_at > NOW()
+        RETURNING user_id, family_id
+    """, (token_hash,))
+    row = cur.fetchone()
+    if row:
+        user_id, family_id = row
+        return str(user_id), token_pair(cur, user_id, family_id)
+
+    # Just rotated by a concurrent refresh of the same session
+    cur.execute("""
+        SELECT user_id, family_id FROM refresh_tokens
+        WHERE token_hash = %s AND used_at > NOW() - make_interval(secs => %s)
+          AND revoked_at IS NULL AND expires_at > NOW()
+    """, (token_hash, REUSE_GRACE_SECONDS))
+    row = cur.fetchone()
+    if row:
+        user_id, family_id = row
+        return str(user_id), token_pair(cur, user_id, family_id)
+
+    # Replay of a token that was already rotated: revoke everything issued from that login
+    cur.execute("""
+        UPDATE refresh_tokens SET revoked_at = NOW()
+        WHERE family_id = (SELECT family_id FROM refresh_tokens WHERE token_hash = %s AND used_at IS NOT NULL)
+          AND revoked_at IS NULL
+    """, (token_hash,))
+    if cur.rowcount:
+        print(f"refresh_tokens: reused refresh token, revoked {cur.rowcount} token(s) in its family")
+    raise ValueError("Invalid refresh token")
+
+# Logout: revoke the token's whole family
+def revoke(cur, token):
+    cur.execute("""
+        UPDATE refresh_tokens SET revoked_at = NOW()
+        WHERE family_id = (SELECT family_id FROM refresh_tokens WHERE token_hash = %s)
+          AND revoked_at IS NULL
+    """, (hash_token(token),))
+    return cur.rowcount
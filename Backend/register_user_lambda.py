@@ -2,17 +2,10 @@ import json
 import os
 import uuid
 import psycopg2
-from passlib.hash import pbkdf2_sha256
-from passlib import registry
+import db
+import passwords
 
 JWT_SECRET = os.environ["JWT_SECRET"]
-DB_CONFIG = {
-    'dbname': os.environ["DB_NAME"],
-    'user': os.environ["DB_USER"],
-    'password': os.environ["DB_PASSWORD"],
-    'host': os.environ["DB_HOST"],
-    'port': 5432,
-}
 
 def lambda_handler(event, context):
     try:
@@ -24,10 +17,10 @@ def lambda_handler(event, context):
         if not email or not password:
             return respond(400, "Email and password are required.")
 
-        password_hash = pbkdf2_sha256.hash(password)
+        password_hash = passwords.hash_password(password)
         user_id = str(uuid.uuid4())
 
-        with psycopg2.connect(**DB_CONFIG) as conn:
+        with db.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT 1 FROM users WHERE email = %s", (email,))
                 if cur.fetchone():
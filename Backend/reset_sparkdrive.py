@@ -25,6 +25,10 @@ print("Deleted all records from file_shares")
 cur.execute("DELETE FROM files")
 print("Deleted all records from files")
 
+# Clean blobs (their objects go with the bucket below)
+cur.execute("DELETE FROM blobs")
+print("Deleted all records from blobs")
+
 # Clean folders, except for root ('/')
 cur.execute("DELETE FROM folders WHERE path != '/'")
 print("Deleted all folders except root")
@@ -0,0 +1,28 @@
+import os
+import batch_sweep
+
+# Scheduled cleanup of expired share tokens (e.g. an EventBridge rule every 15 minutes).
+# Rows go in short batches so no single statement holds locks on a large slice of
+# file_shares; file_download_lambda already rejects expired tokens on its own, so a
+# sweep that runs late only costs disk space.
+
+BATCH_SIZE = int(os.environ.get("SHARE_SWEEP_BATCH_SIZE", "1000"))
+MAX_BATCHES = int(os.environ.get("SHARE_SWEEP_MAX_BATCHES", "100"))
+
+def delete_expired_batch(cur, batch_size):
+    # Walks file_shares_expires_at_idx; rows another sweep already holds are skipped
+    cur.execute("""
+        DELETE FROM file_shares
+        WHERE share_id IN (
+            SELECT share_id FROM file_shares
+            WHERE expires_at < NOW()
+            ORDER BY expires_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+    """, (batch_size,))
+    return cur.rowcount
+
+def lambda_handler(event, context):
+    return batch_sweep.run("share_sweeper_lambda", "expired shares", event, delete_expired_batch,
+                           BATCH_SIZE, MAX_BATCHES)
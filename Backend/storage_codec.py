@@ -0,0 +1,106 @@
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:  # optional; STORAGE_CODEC=zstd falls back to gzip without it
+    zstandard = None
+
+# Optional compression of stored file bytes.
+#
+# Content the Lambda holds (inline and batch uploads) is compressed before put_object when that
+# saves at least STORAGE_CODEC_MIN_SAVING of its size. The object is written with the codec as
+# its Content-Encoding, so a presigned GET hands the browser (or requests) an encoded body it
+# decodes on its own, and transfer shrinks along with storage. Readers inside the backend go
+# through open_decoded(). files.codec and files.stored_bytes record the choice; size_bytes stays
+# the original size.
+#
+# gzip is the default because every HTTP client understands it; zstd compresses faster and
+# smaller but only recent browsers decode Content-Encoding: zstd.
+
+CODEC = os.environ.get("STORAGE_CODEC", "gzip")
+GZIP_LEVEL = int(os.environ.get("STORAGE_CODEC_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.environ.get("STORAGE_CODEC_ZSTD_LEVEL", "3"))
+MIN_BYTES = int(os.environ.get("STORAGE_CODEC_MIN_BYTES", "512"))
+MIN_SAVING = float(os.environ.get("STORAGE_CODEC_MIN_SAVING", "0.1"))
+CHUNK_SIZE = 256 * 1024
+
+# Leading bytes of formats that are already compressed; recompressing them only burns CPU
+COMPRESSED_SIGNATURES = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"PK\x03\x04", "zip"),          # also docx/xlsx/jar/apk
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+    (b"Rar!\x1a\x07", "rar"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF8", "gif"),
+    (b"OggS", "ogg"),
+    (b"fLaC", "flac"),
+    (b"ID3", "mp3"),
+    (b"\x1a\x45\xdf\xa3", "matroska"),  # mkv/webm
+)
+
+def available_codecs():
+    return ("gzip", "zstd") if zstandard else ("gzip",)
+
+def configured_codec():
+    if CODEC in ("", "none"):
+        return None
+    if CODEC == "zstd" and not zstandard:
+        return "gzip"
+    return CODEC
+
+# Name of the compressed format data starts with, or None
+def sniff(data):
+    for signature, name in COMPRESSED_SIGNATURES:
+        if data.startswith(signature):
+            return name
+    if data[4:8] == b"ftyp":
+        return "mp4"  # also mov/m4a/heic
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def compress(codec, data, level=None):
+    if codec == "gzip":
+        # mtime=0 keeps the output a pure function of the input
+        return gzip.compress(data, compresslevel=level or GZIP_LEVEL, mtime=0)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level or ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+def decompress(codec, data):
+    if not codec:
+        return data
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+# Returns (codec, payload): the compressed bytes when worth it, else (None, data) unchanged
+def encode(data, codec=None):
+    codec = codec or configured_codec()
+    if not codec or len(data) < MIN_BYTES or sniff(data):
+        return None, data
+    payload = compress(codec, data)
+    if len(payload) > len(data) * (1 - MIN_SAVING):
+        return None, data
+    return codec, payload
+
+# File-like reader of the original bytes of a stored object body
+def open_decoded(codec, body):
+    if not codec:
+        return body
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=body, mode="rb")
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(body)
+    raise ValueError(f"Unknown codec: {codec}")
+
+# Keyword arguments for put_object so S3 serves the codec as Content-Encoding
+def put_args(codec):
+    return {"ContentEncoding": codec} if codec else {}
@@ -1,37 +1,37 @@
 import json
+import math
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 import base64
 import os
-import jwt
+from auth import verify_jwt
+import blobs
+import db
+import folder_resolver
+import storage_codec
 
 s3 = boto3.client('s3')
 sns = boto3.client('sns')
 
 BUCKET_NAME = os.environ['S3_BUCKET']
 SNS_TOPIC_ARN = os.environ['SNS_TOPIC_ARN']
-JWT_SECRET = os.environ["JWT_SECRET"]
 
+# Multipart upload settings. S3 requires every part but the last to be at least 5 MiB
+# and allows at most 10,000 parts per upload.
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+PART_URL_EXPIRES = int(os.environ.get("UPLOAD_PART_URL_EXPIRES", "3600"))
 
-# NOTE: duplicated from vpc_bridge_lambda, will extract into shared layer later
-# Verify JWT from Authorization header
-def verify_jwt(headers):
-    auth_header = next((v for k, v in headers.items() if k.lower() == "authorization"), None)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise ValueError("Missing or invalid Authorization header")
+# Batch uploads of small files (inline base64, still bound by the API payload limit)
+BATCH_MAX_FILES = int(os.environ.get("UPLOAD_BATCH_MAX_FILES", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("UPLOAD_BATCH_CONCURRENCY", "8"))
+SNS_BATCH_SIZE = 10  # publish_batch accepts at most 10 entries
 
-    token = auth_header.split(" ", 1)[1]
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise ValueError("Token expired")
-    except jwt.InvalidTokenError:
-        raise ValueError("Invalid token")
 
 def lambda_handler(event, context):
     try:
         headers = event.get("headers", {})
-        print(f"[DEBUG] vpc_bridge_lambda event: {json.dumps(event)}")
 
         # Unwrap body if present
         if isinstance(event.get("body"), str):
@@ -51,6 +51,21 @@ def lambda_handler(event, context):
             }
         user_id = jwt_payload["user_id"]
 
+        # Multipart protocol: the client PUTs parts straight to S3 via presigned URLs
+        action = body.get("action")
+        if action == "initiate_upload":
+            return initiate_upload(user_id, body)
+        elif action == "upload_part_urls":
+            return upload_part_urls(user_id, body)
+        elif action == "complete_upload":
+            return complete_upload(user_id, body)
+        elif action == "abort_upload":
+            return abort_upload(user_id, body)
+        elif action == "upload_batch":
+            return upload_batch(user_id, body)
+        elif action:
+            return _response(400, f"Unknown action: {action}")
+
         folder = body.get('folder')
         folder = folder if folder == '/' else folder.lstrip('/')
         filename = body.get('filename')
@@ -81,23 +96,14 @@ def lambda_handler(event, context):
         folder_id = folder_check["folder_id"]
         folder = folder_id
         s3_key = f"{folder}/{filename}"
-        s3.put_object(Bucket=BUCKET_NAME, Key=s3_key, Body=file_bytes)
+        digest = blobs.digest_bytes(file_bytes)
+        object_key, created, codec, stored_size = store_blob(user_id, digest, file_bytes)
         file_size = len(file_bytes)
-        # 🔥 Publish event to SNS
-        message = {
-            "event": "upload",
-            "folder": folder,
-            "filename": filename,
-            "s3_key": s3_key,
-            "file_size" : file_size,
-            "user_id": user_id
-        }
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Message=json.dumps(message)
-        )
+        publish_upload_event(folder, filename, s3_key, file_size, user_id, digest, object_key, codec, stored_size)
 
-        return _response(200, "File uploaded successfully.", {"key": s3_key})
+        return _response(200, "File uploaded successfully.", {
+            "key": s3_key, "deduplicated": not created, "codec": codec, "stored_size": stored_size
+        })
 
     except Exception as e:
         return _response(500, f"Upload failed: {str(e)}")
@@ -115,18 +121,277 @@ def _response(status_code, message, data=None):
         "body": json.dumps(body)
     }
 
+# Resolved in-process (cached) instead of invoking check_folder_exists_lambda
 def check_folder_exists(user_id, path):
-    lambda_client = boto3.client("lambda")
-    payload = {
-        "user_id": user_id,
-        "path": path
+    folder_id = folder_resolver.resolve_folder_id(user_id, path)
+    if folder_id:
+        return {"exists": True, "folder_id": folder_id}
+    return {"exists": False}
+
+# s3_key is the file's identity ({folder_id}/{filename}); blob_key is where its bytes live,
+# stored_size bytes long after the codec (if any) was applied
+def upload_message(folder_id, filename, s3_key, file_size, user_id, digest=None, blob_key=None,
+                   codec=None, stored_size=None, staging_key=None):
+    message = {
+        "event": "upload",
+        "folder": folder_id,
+        "filename": filename,
+        "s3_key": s3_key,
+        "file_size" : file_size,
+        "user_id": user_id
     }
+    if digest:
+        message.update(content_sha256=digest, blob_key=blob_key)
+    if staging_key:
+        # log_upload_lambda verifies the staged bytes against the digest and picks the blob_key
+        message.update(staging_key=staging_key)
+    if codec:
+        message.update(codec=codec, stored_size=stored_size)
+    return message
 
-    response = lambda_client.invoke(
-        FunctionName="check_folder_exists_lambda",
-        InvocationType="RequestResponse",
-        Payload=json.dumps(payload)
+# 🔥 Publish upload event to SNS (log_upload_lambda records the metadata)
+def publish_upload_event(folder_id, filename, s3_key, file_size, user_id, digest=None, blob_key=None,
+                         codec=None, stored_size=None, staging_key=None):
+    sns.publish(
+        TopicArn=SNS_TOPIC_ARN,
+        Message=json.dumps(upload_message(folder_id, filename, s3_key, file_size, user_id, digest, blob_key,
+                                          codec, stored_size, staging_key))
     )
 
-    result = json.loads(response['Payload'].read())
-    return json.loads(result['body'])  # returns { "exists": true, "folder_id": "..." }
+# Store content the account does not have yet, compressed when storage_codec finds it worth it;
+# a dedup hit only re-claims the existing blob and skips both the codec and the S3 write.
+# Returns (blob_key, created, codec, stored_size). The claim commits only after put_object
+# succeeds, so no other upload can dedup against an object that was never written. Compression
+# runs between the two transactions so no connection or row lock is held while it does.
+def store_blob(user_id, digest, file_bytes):
+    with db.connection(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            existing = blobs.touch(cur, user_id, digest)
+    if existing:
+        object_key, size_bytes, codec, stored_size = existing
+        return object_key, False, codec, stored_size
+
+    codec, payload = storage_codec.encode(file_bytes)
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            object_key, created, codec, stored_size = blobs.claim(cur, user_id, digest, len(file_bytes),
+                                                                  codec, len(payload))
+            if created:
+                s3.put_object(Bucket=BUCKET_NAME, Key=object_key, Body=payload, **storage_codec.put_args(codec))
+    return object_key, created, codec, stored_size
+
+# Publish many upload events with publish_batch; returns {entry id: error message} for failures
+def publish_upload_events(messages):
+    failed = {}
+    entries = [{"Id": entry_id, "Message": json.dumps(message)} for entry_id, message in messages]
+    for i in range(0, len(entries), SNS_BATCH_SIZE):
+        chunk = entries[i:i + SNS_BATCH_SIZE]
+        try:
+            response = sns.publish_batch(TopicArn=SNS_TOPIC_ARN, PublishBatchRequestEntries=chunk)
+            for failure in response.get("Failed", []):
+                failed[failure["Id"]] = failure.get("Message") or failure.get("Code")
+        except Exception as e:
+            for entry in chunk:
+                failed[entry["Id"]] = str(e)
+    return failed
+
+# Upload many small files in one request: each distinct folder is resolved once, new content is
+# written concurrently (content the account already has is not written again) and the upload
+# events go out through SNS publish_batch. Every writer holds a pooled connection while its
+# put_object runs, so no more run at once than db.POOL_SIZE.
+# Every file gets its own result; one bad file does not fail the others.
+def upload_batch(user_id, body):
+    files = body.get("files")
+    if not isinstance(files, list) or not files:
+        return _response(400, "files must be a non-empty list.")
+    if len(files) > BATCH_MAX_FILES:
+        return _response(400, f"At most {BATCH_MAX_FILES} files per batch.")
+
+    results = []
+    folder_ids = {}
+    pending = []  # (index, folder_id, s3_key, bytes)
+
+    for i, f in enumerate(files):
+        f = f if isinstance(f, dict) else {}
+        folder, filename, content_b64 = f.get("folder"), f.get("filename"), f.get("content")
+        result = {"folder": folder, "filename": filename}
+        results.append(result)
+
+        if not folder or not filename or not content_b64 or "/" in filename:
+            result.update(status="error", message="Missing folder, filename or content.")
+            continue
+        try:
+            file_bytes = base64.b64decode(content_b64)
+        except Exception as decode_error:
+            result.update(status="error", message=f"Invalid base64 content: {str(decode_error)}")
+            continue
+
+        if folder not in folder_ids:
+            folder_ids[folder] = check_folder_exists(user_id, folder).get("folder_id")
+        folder_id = folder_ids[folder]
+        if not folder_id:
+            result.update(status="error", message="Folder does not exist")
+            continue
+        pending.append((i, folder_id, f"{folder_id}/{filename}", file_bytes))
+
+    def put(item):
+        i, folder_id, s3_key, file_bytes = item
+        digest = blobs.digest_bytes(file_bytes)
+        try:
+            return (digest, *store_blob(user_id, digest, file_bytes), None)
+        except Exception as e:
+            return digest, None, False, None, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, db.POOL_SIZE))) as pool:
+        outcomes = list(pool.map(put, pending))
+
+    stored = []
+    for (i, folder_id, s3_key, file_bytes), outcome in zip(pending, outcomes):
+        digest, object_key, created, codec, stored_size, error = outcome
+        if error:
+            results[i].update(status="error", message=f"Upload failed: {error}")
+        else:
+            results[i].update(status="success", key=s3_key, file_size=len(file_bytes), deduplicated=not created,
+                              codec=codec, stored_size=stored_size)
+            stored.append((str(i), upload_message(folder_id, results[i]["filename"], s3_key, len(file_bytes),
+                                                  user_id, digest, object_key, codec, stored_size)))
+
+    for entry_id, error in publish_upload_events(stored).items():
+        results[int(entry_id)].update(status="error", message=f"Stored but upload event not published: {error}")
+
+    uploaded = sum(1 for r in results if r.get("status") == "success")
+    return _response(200, f"{uploaded} of {len(files)} file(s) uploaded.", {"results": results})
+
+# Resolve the caller's folder and build the file key and the key the parts are written to; keys
+# are never taken from the client. With a content digest the parts go to a staging key, and
+# log_upload_lambda moves them to a blob key of the account once the digest checks out.
+def resolve_upload_key(user_id, folder, filename, digest=None):
+    if not folder or not filename or "/" in filename:
+        return None, None, None
+    if digest is not None and not blobs.is_digest(digest):
+        return None, None, None
+    folder_check = check_folder_exists(user_id, folder)
+    if not folder_check.get("exists"):
+        return None, None, None
+    folder_id = folder_check["folder_id"]
+    s3_key = f"{folder_id}/{filename}"
+    return folder_id, s3_key, blobs.staging_key(user_id, digest, s3_key) if digest else s3_key
+
+def presign_parts(s3_key, upload_id, part_numbers):
+    return [
+        {
+            "part_number": n,
+            "url": s3.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": BUCKET_NAME, "Key": s3_key, "UploadId": upload_id, "PartNumber": n},
+                ExpiresIn=PART_URL_EXPIRES
+            )
+        }
+        for n in part_numbers
+    ]
+
+def initiate_upload(user_id, body):
+    try:
+        file_size = int(body.get("file_size"))
+        part_size = int(body.get("part_size") or DEFAULT_PART_SIZE)
+    except (TypeError, ValueError):
+        return _response(400, "file_size and part_size must be integers.")
+    if file_size <= 0:
+        return _response(400, "file_size must be positive.")
+
+    # Grow the part size if the file would otherwise need more than MAX_PARTS parts
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(file_size / MAX_PARTS))
+    part_count = max(1, math.ceil(file_size / part_size))
+
+    digest = body.get("sha256")
+    folder_id, s3_key, object_key = resolve_upload_key(user_id, body.get("folder"), body.get("filename"), digest)
+    if not s3_key:
+        return _response(400, "Folder does not exist, filename or sha256 is invalid.")
+
+    # The client hashed the file while reading it; if the account already has that content the
+    # upload is done without sending a byte. The digest is the client's word here, which is safe
+    # because it can only ever match blobs of the same account; uploaded bytes are checked
+    # against it by log_upload_lambda.
+    if digest:
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                existing = blobs.touch(cur, user_id, digest)
+        if existing and existing[1] == file_size:
+            object_key, size_bytes, codec, stored_size = existing
+            publish_upload_event(folder_id, body.get("filename"), s3_key, file_size, user_id, digest, object_key,
+                                 codec, stored_size)
+            return _response(200, "File uploaded successfully.", {
+                "key": s3_key, "file_size": file_size, "deduplicated": True
+            })
+
+    upload = s3.create_multipart_upload(Bucket=BUCKET_NAME, Key=object_key)
+    upload_id = upload["UploadId"]
+
+    return _response(200, "Upload initiated.", {
+        "upload_id": upload_id,
+        "key": s3_key,
+        "part_size": part_size,
+        "part_count": part_count,
+        "parts": presign_parts(object_key, upload_id, range(1, part_count + 1))
+    })
+
+# Re-issue part URLs, e.g. when a slow upload outlives PART_URL_EXPIRES
+def upload_part_urls(user_id, body):
+    upload_id = body.get("upload_id")
+    part_numbers = body.get("part_numbers") or []
+    if not upload_id or not part_numbers:
+        return _response(400, "Missing upload_id or part_numbers.")
+    if any(not isinstance(n, int) or not 1 <= n <= MAX_PARTS for n in part_numbers):
+        return _response(400, f"part_numbers must be integers between 1 and {MAX_PARTS}.")
+
+    folder_id, s3_key, object_key = resolve_upload_key(user_id, body.get("folder"), body.get("filename"),
+                                                       body.get("sha256"))
+    if not s3_key:
+        return _response(400, "Folder does not exist, filename or sha256 is invalid.")
+
+    return _response(200, "Part URLs issued.", {"parts": presign_parts(object_key, upload_id, part_numbers)})
+
+def complete_upload(user_id, body):
+    upload_id = body.get("upload_id")
+    parts = body.get("parts") or []
+    if not upload_id or not parts:
+        return _response(400, "Missing upload_id or parts.")
+
+    digest = body.get("sha256")
+    folder_id, s3_key, object_key = resolve_upload_key(user_id, body.get("folder"), body.get("filename"), digest)
+    if not s3_key:
+        return _response(400, "Folder does not exist, filename or sha256 is invalid.")
+
+    s3.complete_multipart_upload(
+        Bucket=BUCKET_NAME,
+        Key=object_key,
+        UploadId=upload_id,
+        MultipartUpload={
+            "Parts": sorted(
+                ({"PartNumber": int(p["part_number"]), "ETag": p["etag"]} for p in parts),
+                key=lambda p: p["PartNumber"]
+            )
+        }
+    )
+    # Checking the staged bytes against digest means reading the whole object back, which can
+    # outlast the API's timeout on large files; log_upload_lambda does it before recording the file.
+    file_size = s3.head_object(Bucket=BUCKET_NAME, Key=object_key)["ContentLength"]
+    if digest:
+        publish_upload_event(folder_id, body.get("filename"), s3_key, file_size, user_id, digest,
+                             staging_key=object_key)
+    else:
+        publish_upload_event(folder_id, body.get("filename"), s3_key, file_size, user_id)
+    return _response(200, "File uploaded successfully.", {"key": s3_key, "file_size": file_size})
+
+def abort_upload(user_id, body):
+    upload_id = body.get("upload_id")
+    if not upload_id:
+        return _response(400, "Missing upload_id.")
+
+    folder_id, s3_key, object_key = resolve_upload_key(user_id, body.get("folder"), body.get("filename"),
+                                                       body.get("sha256"))
+    if not s3_key:
+        return _response(400, "Folder does not exist, filename or sha256 is invalid.")
+
+    s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=object_key, UploadId=upload_id)
+    return _response(200, "Upload aborted.")
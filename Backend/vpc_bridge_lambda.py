@@ -1,13 +1,64 @@
 import json
 import boto3
 import os
-import jwt
+import importlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from auth import verify_jwt
 
-JWT_SECRET = os.environ["JWT_SECRET"]
+# "remote" invokes each target Lambda through the Lambda API.
+# "local" imports the target handlers and calls them in this process, skipping the second hop.
+DISPATCH_MODE = os.environ.get("BRIDGE_DISPATCH_MODE", "remote")
+
+# Target handlers for "local" dispatch, keyed by the name passed to forward()
+LOCAL_HANDLERS = {
+    "folder_list_lambda": ("folder_list_lambda", "lambda_handler"),
+    "folder_create_lambda": ("folder_create_lambda", "lambda_handler"),
+    "folder_delete_lambda": ("folder_delete_lambda", "lambda_handler"),
+    "folder_archive_lambda": ("folder_archive_lambda", "lambda_handler"),
+    "file_share_lambda": ("file_share_lambda", "lambda_handler"),
+    "file_download_lambda": ("file_download_lambda", "lambda_handler"),
+    "file_delete_lambda": ("file_delete_lambda", "lambda_handler"),
+    "login_user_lambda": ("login_user_lambda", "handler"),
+    "register_user_lambda": ("register_user_lambda", "lambda_handler"),
+    "refresh_token_lambda": ("refresh_token_lambda", "lambda_handler"),
+}
+
+# "batch" runs many sub-actions for one verified caller; independent ones run concurrently
+BATCH_MAX_ITEMS = int(os.environ.get("BRIDGE_BATCH_MAX_ITEMS", "25"))
+BATCH_CONCURRENCY = int(os.environ.get("BRIDGE_BATCH_CONCURRENCY", "8"))
+# Actions that run without an access token
+PUBLIC_ACTIONS = ("login_user", "register_user", "refresh_token", "logout_user")
+UNBATCHED_ACTIONS = PUBLIC_ACTIONS + ("batch",)
+
+# Never logged: request fields and headers that carry credentials (matched case-insensitively)
+SECRET_FIELDS = ("password", "refresh_token", "token", "authorization")
+
+_lambda_client = None
+
+def get_lambda_client():
+    global _lambda_client
+    if _lambda_client is None:
+        _lambda_client = boto3.client('lambda')
+    return _lambda_client
+
+# Copy of an event or payload that is safe to print: credential fields are masked, including
+# inside the JSON-encoded "body" strings that events and forwarded payloads carry
+def redact(value):
+    if isinstance(value, dict):
+        return {k: "[REDACTED]" if str(k).lower() in SECRET_FIELDS else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    if isinstance(value, str) and value.startswith(("{", "[")):
+        try:
+            return json.dumps(redact(json.loads(value)))
+        except json.JSONDecodeError:
+            return value
+    return value
 
 # Helper to invoke an internal Lambda
 def invoke_lambda(lambda_name, payload):
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_lambda_client()
     response = lambda_client.invoke(
         FunctionName=lambda_name,
         InvocationType='RequestResponse',
@@ -16,23 +67,26 @@ def invoke_lambda(lambda_name, payload):
     body = response['Payload'].read().decode()
     return json.loads(body)
 
-# Verify JWT from Authorization header
-def verify_jwt(headers):
-    auth_header = next((v for k, v in headers.items() if k.lower() == "authorization"), None)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise ValueError("Missing or invalid Authorization header")
+# Helper to start an internal Lambda without waiting for it (the Lambda API queues the event)
+def invoke_lambda_async(lambda_name, payload):
+    get_lambda_client().invoke(
+        FunctionName=lambda_name,
+        InvocationType='Event',
+        Payload=json.dumps(payload).encode()
+    )
 
-    token = auth_header.split(" ", 1)[1]
+# Helper to call an internal Lambda's handler in this process
+def invoke_local(lambda_name_env_var, payload):
+    module_name, handler_name = LOCAL_HANDLERS[lambda_name_env_var]
+    handler = getattr(importlib.import_module(module_name), handler_name)
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise ValueError("Token expired")
-    except jwt.InvalidTokenError:
-        raise ValueError("Invalid token")
+        return handler(payload, None)
+    except Exception as e:
+        # Same shape the Lambda service returns for an unhandled handler error
+        return {"errorMessage": str(e), "errorType": type(e).__name__}
 
 def lambda_handler(event, context):
-    print(f"[DEBUG] vpc_bridge_lambda event: {json.dumps(event)}")
+    print(f"[DEBUG] vpc_bridge_lambda event: {json.dumps(redact(event))}")
 
     try:
         headers = event.get("headers", {})
@@ -43,7 +97,7 @@ def lambda_handler(event, context):
             return error_response("Missing action parameter")
 
         # These actions are called before auth, so don't verify token
-        if action not in ("login_user", "register_user"):
+        if action not in PUBLIC_ACTIONS:
             # Verify JWT and extract user_id
             try:
                 jwt_payload = verify_jwt(headers)
@@ -56,112 +110,224 @@ def lambda_handler(event, context):
         else:
             user_id = None
 
-        path = body.get("path")
+        # Conditional listing: the client's cached validator travels with the request
+        if_none_match = next((v for k, v in headers.items() if k.lower() == "if-none-match"), None)
+        if if_none_match:
+            body.setdefault("if_none_match", if_none_match)
+
+        if action == "batch":
+            return run_batch(user_id, body)
+        return dispatch(action, body, user_id)
 
-        if action == "list_contents":
-            if not path:
-                return error_response("Missing path")
-            return forward("folder_list_lambda", {
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": "vpc_bridge_lambda: " + str(e)})
+        }
+
+# Route one action to its target Lambda
+def dispatch(action, body, user_id):
+    path = body.get("path")
+
+    if action == "list_contents":
+        if not path:
+            return error_response("Missing path")
+        return forward("folder_list_lambda", {
+            "user_id": user_id,
+            "path": path,
+            "limit": body.get("limit"),
+            "cursor": body.get("cursor"),
+            "if_none_match": body.get("if_none_match")
+        })
+
+    elif action == "create_folder":
+        if not path:
+            return error_response("Missing path")
+        return forward("folder_create_lambda", {
+            "body": json.dumps({
                 "user_id": user_id,
                 "path": path
             })
+        })
 
-        elif action == "create_folder":
-            if not path:
-                return error_response("Missing path")
-            return forward("folder_create_lambda", {
-                "body": json.dumps({
-                    "user_id": user_id,
-                    "path": path
-                })
-            })
+    elif action == "download_file":
+        file_id = body.get("file_id")
+        if not file_id:
+            return error_response("Missing file_id")
 
-        elif action == "download_file":
-            file_id = body.get("file_id")
-            if not file_id:
-                return error_response("Missing file_id")
+        # The caller is the owner, so skip the share-token round trip and presign directly
+        return forward("file_download_lambda", {
+            "user_id": user_id,
+            "file_id": file_id
+        })
 
-            share_result = forward("file_share_lambda", {
-                "body": json.dumps({
-                    "user_id": user_id,
-                    "file_id": file_id
-                })
-            })
-            if "error" in share_result.get("body", ""):
-                return share_result
+    elif action == "download_files":
+        file_ids = body.get("file_ids")
+        if not file_ids:
+            return error_response("Missing file_ids")
+        return forward("file_download_lambda", {
+            "user_id": user_id,
+            "file_ids": file_ids
+        })
 
-            token = json.loads(share_result["body"])["token"]
-            result = forward("file_download_lambda", {
-                "queryStringParameters": {
-                    "token": token
-                }
+    elif action == "download_folder":
+        if not path:
+            return error_response("Missing path")
+        # Building the ZIP can outlast API Gateway's 29 s, so it runs as an async invoke and
+        # the client polls archive_status for the download URL
+        archive_id = str(uuid.uuid4())
+        return forward_async("folder_archive_lambda", {
+            "user_id": user_id,
+            "path": path,
+            "archive_id": archive_id
+        }, {"archive_id": archive_id, "status": "pending"})
+
+    elif action == "archive_status":
+        archive_id = body.get("archive_id")
+        if not archive_id:
+            return error_response("Missing archive_id")
+        return forward("folder_archive_lambda", {
+            "user_id": user_id,
+            "archive_id": archive_id,
+            "status": True
+        })
+
+    elif action == "delete_folder":
+        if not path:
+            return error_response("Missing path")
+        return forward("folder_delete_lambda", {
+            "body": json.dumps({
+                "user_id": user_id,
+                "path": path
             })
-            print("📦 file_download_lambda response:", result)
-            return result
-
-        elif action == "delete_folder":
-            if not path:
-                return error_response("Missing path")
-            return forward("folder_delete_lambda", {
-                "body": json.dumps({
-                    "user_id": user_id,
-                    "path": path
-                })
+        })
+
+    elif action == "delete_file":
+        file_id = body.get("file_id")
+        if not file_id:
+            return error_response("Missing file_id")
+        return forward("file_delete_lambda", {
+            "body": json.dumps({
+                "user_id": user_id,
+                "file_id": file_id
             })
+        })
 
-        elif action == "delete_file":
-            file_id = body.get("file_id")
-            if not file_id:
-                return error_response("Missing file_id")
-            return forward("file_delete_lambda", {
-                "body": json.dumps({
-                    "user_id": user_id,
-                    "file_id": file_id
-                })
+    elif action == "login_user":
+        email = body.get("email")
+        password = body.get("password")
+        if not email or not password:
+            return error_response("Missing email or password")
+        return forward("login_user_lambda", {
+            "body": json.dumps({
+                "email": email,
+                "password": password
             })
+        })
 
-        elif action == "login_user":
-            email = body.get("email")
-            password = body.get("password")
-            if not email or not password:
-                return error_response("Missing email or password")
-            return forward("login_user_lambda", {
-                "body": json.dumps({
-                    "email": email,
-                    "password": password
-                })
+    elif action in ("refresh_token", "logout_user"):
+        refresh_token = body.get("refresh_token")
+        if not refresh_token:
+            return error_response("Missing refresh_token")
+        return forward("refresh_token_lambda", {
+            "body": json.dumps({
+                "refresh_token": refresh_token,
+                "revoke": action == "logout_user"
             })
+        })
 
-        elif action == "register_user":
-            email = body.get("email")
-            password = body.get("password")
-            display_name = body.get("display_name")
-            if not email or not password or not display_name:
-                return error_response("Missing required registration fields")
-            return forward("register_user_lambda", {
-                "body": json.dumps({
-                    "email": email,
-                    "password": password,
-                    "display_name": display_name
-                })
+    elif action == "register_user":
+        email = body.get("email")
+        password = body.get("password")
+        display_name = body.get("display_name")
+        if not email or not password or not display_name:
+            return error_response("Missing required registration fields")
+        return forward("register_user_lambda", {
+            "body": json.dumps({
+                "email": email,
+                "password": password,
+                "display_name": display_name
             })
+        })
+
+    else:
+        return error_response(f"Unknown action: {action}")
 
+# Run a list of sub-actions after a single JWT verification. Items run concurrently (up to
+# BRIDGE_BATCH_CONCURRENCY) unless "sequential" is set, for callers whose items depend on
+# each other. Results come back in request order, one per item, each with its own status code.
+def run_batch(user_id, body):
+    items = body.get("items")
+    if not isinstance(items, list) or not items:
+        return error_response("batch: items must be a non-empty list")
+    if len(items) > BATCH_MAX_ITEMS:
+        return error_response(f"batch: at most {BATCH_MAX_ITEMS} items")
+
+    def run_item(item):
+        action = item.get("action") if isinstance(item, dict) else None
+        if not action:
+            result = error_response("Missing action parameter")
+        elif action in UNBATCHED_ACTIONS:
+            result = error_response(f"Action not allowed in batch: {action}")
         else:
-            return error_response(f"Unknown action: {action}")
+            try:
+                result = dispatch(action, item, user_id)
+            except Exception as e:
+                result = {"statusCode": 500, "body": json.dumps({"error": "vpc_bridge_lambda: " + str(e)})}
+        return batch_result(action, result)
 
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "vpc_bridge_lambda: " + str(e)})
-        }
+    workers = 1 if body.get("sequential") else max(1, min(BATCH_CONCURRENCY, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_item, items))
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"results": results})
+    }
+
+# Flatten a handler response into a batch entry; the body is decoded so callers parse once
+def batch_result(action, result):
+    if "errorMessage" in result:
+        return {"action": action, "statusCode": 500, "body": {"error": result["errorMessage"]}}
+    body = result.get("body")
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError:
+            pass
+    entry = {"action": action, "statusCode": result.get("statusCode", 500), "body": body}
+    if result.get("headers"):
+        entry["headers"] = result["headers"]
+    return entry
 
 def forward(lambda_name_env_var, payload):
+    if DISPATCH_MODE == "local":
+        print(f"Dispatching {lambda_name_env_var} in-process")
+        return invoke_local(lambda_name_env_var, payload)
+
     lambda_name = os.environ.get(lambda_name_env_var)
     if not lambda_name:
         return error_response(f"Missing env var for {lambda_name_env_var}")
-    print(f"Forwarding to {lambda_name} with payload {payload}")
+    print(f"Forwarding to {lambda_name} with payload {redact(payload)}")
     return invoke_lambda(lambda_name, payload)
 
+# Start a target without waiting for its result and answer 202 with accepted_body. In "local"
+# mode there is no second Lambda to hand the work to, so it runs here before the 202.
+def forward_async(lambda_name_env_var, payload, accepted_body):
+    if DISPATCH_MODE == "local":
+        print(f"Dispatching {lambda_name_env_var} in-process")
+        invoke_local(lambda_name_env_var, payload)
+    else:
+        lambda_name = os.environ.get(lambda_name_env_var)
+        if not lambda_name:
+            return error_response(f"Missing env var for {lambda_name_env_var}")
+        print(f"Starting {lambda_name} asynchronously")
+        invoke_lambda_async(lambda_name, payload)
+    return {
+        "statusCode": 202,
+        "body": json.dumps(accepted_body)
+    }
+
 def error_response(message):
     return {
         "statusCode": 400,
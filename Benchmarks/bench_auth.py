@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+os.environ.setdefault("JWT_SECRETS", "sparkdrive-benchmark-secret-new-0123456789,sparkdrive-benchmark-secret-old-0123456789")
+
+import jwt
+import auth
+
+# Verify-path microbenchmark. A realistic request mix: a few hundred active sessions, each
+# session's browser sends many requests with the same token (page loads, listings, downloads),
+# with a skew towards the busiest sessions. Tokens are split between the current and the
+# previous secret to exercise rotation.
+#
+# Usage: python Benchmarks/bench_auth.py [requests] [sessions]
+
+def make_tokens(sessions):
+    now = int(time.time())
+    tokens = []
+    for i in range(sessions):
+        secret = auth.SECRETS[i % len(auth.SECRETS)]
+        payload = {"user_id": f"{i:08d}-0000-0000-0000-000000000000", "exp": now + 3600}
+        tokens.append(jwt.encode(payload, secret, algorithm="HS256"))
+    return tokens
+
+def run(label, verify, requests):
+    start = time.perf_counter()
+    for token in requests:
+        verify({"Authorization": f"Bearer {token}"})
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {len(requests)} verifies in {elapsed * 1000:8.1f} ms  ({elapsed / len(requests) * 1e6:6.2f} us/verify)")
+    return elapsed
+
+# The pre-cache behaviour: a full decode on every request
+def verify_uncached(headers):
+    token = headers["Authorization"].split(" ", 1)[1]
+    for secret in auth.SECRETS:
+        try:
+            return jwt.decode(token, secret, algorithms=["HS256"])
+        except jwt.InvalidSignatureError:
+            continue
+    raise ValueError("Invalid token")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    rng = random.Random(42)
+    tokens = make_tokens(sessions)
+    weights = [1 / (rank + 1) for rank in range(sessions)]  # Zipf-like session activity
+    requests = rng.choices(tokens, weights=weights, k=n)
+
+    auth.clear_cache()
+    uncached = run("full decode", verify_uncached, requests)
+    cached = run("auth.verify_jwt", auth.verify_jwt, requests)
+    hits, misses = auth.stats["hits"], auth.stats["misses"]
+    print(f"cache hit ratio {hits / (hits + misses):.3f} ({misses} decodes), speedup {uncached / cached:.1f}x")
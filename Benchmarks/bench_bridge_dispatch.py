@@ -0,0 +1,77 @@
+import io
+import os
+import sys
+import json
+import time
+import types
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+os.environ.setdefault("JWT_SECRET", "sparkdrive-benchmark-secret-0123456789")
+
+import jwt
+import vpc_bridge_lambda
+
+# Latency of a list_contents request through vpc_bridge_lambda in "remote" vs "local"
+# dispatch mode. The target handler and the Lambda API are local stand-ins; the
+# stand-in invoke JSON-encodes the payload and response like the real service and
+# sleeps for HOP_MS to model the extra Lambda hop.
+#
+# Usage: python Benchmarks/bench_bridge_dispatch.py [requests] [hop_ms]
+
+def standin_folder_list(event, context):
+    files = [
+        {"file_id": f"{i:08d}-0000-0000-0000-000000000000", "filename": f"file_{i}.txt",
+         "size_bytes": 1024 * i, "uploaded_at": "08/01/2025 12:00:00"}
+        for i in range(50)
+    ]
+    return {"statusCode": 200, "body": json.dumps({"folders": [], "files": files})}
+
+class StandinLambdaClient:
+    def __init__(self, hop_ms):
+        self.hop_seconds = hop_ms / 1000
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        time.sleep(self.hop_seconds)
+        result = standin_folder_list(json.loads(Payload), None)
+        return {"Payload": io.BytesIO(json.dumps(result).encode())}
+
+def measure(label, event, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        result = vpc_bridge_lambda.lambda_handler(event, None)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert result["statusCode"] == 200
+    print(f"{label:<8} n={n:<5} mean={statistics.mean(samples):8.3f} ms  p50={statistics.median(samples):8.3f} ms")
+    return result
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    hop_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    module = types.ModuleType("folder_list_lambda")
+    module.lambda_handler = standin_folder_list
+    sys.modules["folder_list_lambda"] = module
+    os.environ["folder_list_lambda"] = "sparkdrive-folder-list"
+    vpc_bridge_lambda._lambda_client = StandinLambdaClient(hop_ms)
+
+    token = jwt.encode({"user_id": "00000000-0000-0000-0000-000000000000",
+                        "exp": datetime.utcnow() + timedelta(hours=1)},
+                       os.environ["JWT_SECRET"], algorithm="HS256")
+    event = {"headers": {"Authorization": f"Bearer {token}"},
+             "body": json.dumps({"action": "list_contents", "path": "/Projects"})}
+
+    # Keep the per-request debug prints out of the timings
+    stdout, sys.stdout = sys.stdout, io.StringIO()
+    try:
+        vpc_bridge_lambda.DISPATCH_MODE = "remote"
+        remote = measure("remote", event, n)
+        vpc_bridge_lambda.DISPATCH_MODE = "local"
+        local = measure("local", event, n)
+    finally:
+        report, sys.stdout = sys.stdout.getvalue(), stdout
+
+    print("\n".join(line for line in report.splitlines() if line.startswith(("remote", "local"))))
+    print(f"responses identical: {remote == local}")
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+
+import psycopg2
+import db
+
+# Per-request latency of a typical handler query, opening a fresh connection
+# per request (the old behaviour) vs. borrowing one from the shared pool.
+#
+# Usage: DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... python Benchmarks/bench_db_pool.py [requests]
+
+QUERY = "SELECT folder_id FROM folders WHERE user_id = %s AND path = %s"
+PARAMS = ("00000000-0000-0000-0000-000000000000", "/")
+
+def request_without_pool():
+    conn = psycopg2.connect(**db.db_config())
+    try:
+        with conn.cursor() as cur:
+            cur.execute(QUERY, PARAMS)
+            cur.fetchone()
+    finally:
+        conn.close()
+
+def request_with_pool():
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(QUERY, PARAMS)
+            cur.fetchone()
+
+def measure(label, fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<14} n={n:<5} mean={statistics.mean(samples):7.3f} ms  p50={statistics.median(samples):7.3f} ms  p95={p95:7.3f} ms")
+    return statistics.mean(samples)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    # Warm up both paths so the first-connection cost of the pool is not counted as steady state
+    request_without_pool()
+    request_with_pool()
+
+    cold = measure("without pool", request_without_pool, n)
+    warm = measure("with pool", request_with_pool, n)
+    print(f"speedup: {cold / warm:.1f}x")
+    db.close_all()
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import uuid
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+os.environ.setdefault("S3_BUCKET", "sparkdrive-bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+from psycopg2.extras import execute_values
+import db
+import folder_delete_lambda
+
+# Deletes a synthetic subtree (10 x 10 x 10 x 10 folders = 11,110 folders, 10 files per leaf
+# = 100,000 files) from a local Postgres with folder_delete_lambda. S3 is a stand-in that
+# sleeps S3_CALL_MS per request, so the report shows how many S3 calls the delete needs and
+# what the old one-delete_object-per-file loop would have cost at the same latency.
+#
+# Usage: DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... python Benchmarks/bench_folder_delete.py [fanout] [files_per_leaf] [s3_call_ms]
+
+BENCH_USER = "00000000-0000-0000-0000-00000000beef"
+
+class StandinS3:
+    def __init__(self, call_ms):
+        self.call_seconds = call_ms / 1000
+        self.calls = 0
+        self.keys = 0
+        self.lock = threading.Lock()
+
+    def delete_objects(self, Bucket, Delete):
+        time.sleep(self.call_seconds)
+        with self.lock:
+            self.calls += 1
+            self.keys += len(Delete["Objects"])
+        return {}
+
+def seed_tree(fanout, files_per_leaf):
+    root = (str(uuid.uuid4()), "/bench", None)
+    folders = [root]
+    level = [root]
+    for _ in range(4):
+        level = [(str(uuid.uuid4()), f"{path}/d{i}", folder_id) for folder_id, path, _ in level for i in range(fanout)]
+        folders.extend(level)
+    leaves = {folder_id for folder_id, _, _ in level}
+
+    files = [
+        (str(uuid.uuid4()), BENCH_USER, folder_id, f"f{i}.log", f"{folder_id}/f{i}.log", 1024)
+        for folder_id in leaves
+        for i in range(files_per_leaf)
+    ]
+
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO users (user_id, email, password_hash, display_name)
+                VALUES (%s, 'bench@sparkdrive.local', 'x', 'bench') ON CONFLICT DO NOTHING
+            """, (BENCH_USER,))
+            cur.execute("SELECT folder_id FROM folders WHERE user_id = %s AND path = '/'", (BENCH_USER,))
+            row = cur.fetchone()
+            if row:
+                root_parent = row[0]
+            else:
+                cur.execute("INSERT INTO folders (user_id, path) VALUES (%s, '/') RETURNING folder_id", (BENCH_USER,))
+                root_parent = cur.fetchone()[0]
+            execute_values(cur, "INSERT INTO folders (folder_id, user_id, path, parent_id) VALUES %s",
+                           [(folder_id, BENCH_USER, path, parent_id or root_parent) for folder_id, path, parent_id in folders],
+                           page_size=5000)
+            execute_values(cur, """
+                INSERT INTO files (file_id, user_id, folder_id, filename, s3_key, size_bytes) VALUES %s
+            """, files, page_size=5000)
+    return len(folders), len(files)
+
+if __name__ == "__main__":
+    fanout = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    files_per_leaf = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    call_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+
+    start = time.perf_counter()
+    folder_count, file_count = seed_tree(fanout, files_per_leaf)
+    print(f"seeded {folder_count} folders / {file_count} files in {time.perf_counter() - start:.1f} s")
+
+    s3 = StandinS3(call_ms)
+    folder_delete_lambda.s3 = s3
+
+    start = time.perf_counter()
+    with db.connection() as conn:
+        result = folder_delete_lambda.delete_subtree(conn, BENCH_USER, "/bench")
+    elapsed = time.perf_counter() - start
+
+    print(f"deleted {result[0]} folders / {result[1]} files in {elapsed:.2f} s")
+    print(f"S3: {s3.calls} delete_objects call(s) for {s3.keys} keys at {call_ms:.0f} ms/call, "
+          f"concurrency {folder_delete_lambda.S3_DELETE_CONCURRENCY}")
+    print(f"old per-file loop at the same latency: {file_count} delete_object calls "
+          f"+ {file_count} DELETE statements, >= {file_count * call_ms / 1000:.0f} s of S3 time alone")
+    db.close_all()
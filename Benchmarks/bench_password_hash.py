@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+
+import passwords
+
+# Login latency per password-hashing setting, for choosing PASSWORD_SCHEME and its rounds.
+# A login's CPU is almost entirely one verify, so run this where the login Lambda runs (same
+# architecture and memory size, since Lambda CPU scales with memory) and pick the largest cost
+# that fits the latency budget.
+#
+# Usage: python Benchmarks/bench_password_hash.py [budget_ms] [samples]
+
+SETTINGS = [("bcrypt", rounds) for rounds in (8, 9, 10, 11, 12, 13)] + \
+           [("pbkdf2_sha256", rounds) for rounds in (10000, 29000, 100000, 310000, 600000)]
+
+def verify_ms(scheme, rounds, samples):
+    stored = passwords.hash_password("correct horse battery staple", scheme, rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        assert passwords.verify("correct horse battery staple", stored)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+if __name__ == "__main__":
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"{'scheme':<15}{'rounds':>8}{'median ms':>12}{'max ms':>10}")
+    best = {}
+    for scheme, rounds in SETTINGS:
+        median, worst = verify_ms(scheme, rounds, samples)
+        print(f"{scheme:<15}{rounds:>8}{median:>12.1f}{worst:>10.1f}")
+        if median <= budget_ms:
+            best[scheme] = (rounds, median)
+
+    current = passwords.policy_rounds(passwords.SCHEME)
+    print(f"\ncurrent policy: {passwords.SCHEME} rounds={current}")
+    for scheme, (rounds, median) in best.items():
+        print(f"largest {scheme} cost within {budget_ms:.0f} ms: rounds={rounds} ({median:.1f} ms)")
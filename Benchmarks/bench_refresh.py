@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import random
+import secrets
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+os.environ.setdefault("JWT_SECRET", "sparkdrive-benchmark-secret-0123456789abcdef")
+
+import passwords
+import refresh_tokens
+
+# Authentication CPU under a week of realistic use: how often each policy needs a full
+# password check versus a cheap refresh, and what that costs.
+#
+#   old: 12-hour JWT, back to the login page (a password verify) whenever it has expired
+#   new: 15-minute access token renewed with a rotating refresh token (SHA-256 + JWT sign),
+#        a password verify only when the refresh token itself has lapsed (14 days idle) or on first login
+#
+# Each user is active on most days, in one to three sessions of 10 minutes to 4 hours with a
+# request every couple of minutes. Unit costs are measured here; database round trips are the
+# same single query for both paths and are left out.
+#
+# Usage: python Benchmarks/bench_refresh.py [users] [days]
+
+HOUR = 3600
+OLD_TOKEN_SECONDS = 12 * HOUR
+ACCESS_SECONDS = refresh_tokens.ACCESS_TOKEN_MINUTES * 60
+REFRESH_SECONDS = refresh_tokens.REFRESH_TOKEN_DAYS * 24 * HOUR
+
+def user_requests(rng, days):
+    times = []
+    for day in range(days):
+        if rng.random() < 0.2:
+            continue  # a day off
+        for _ in range(rng.randint(1, 3)):
+            start = day * 24 * HOUR + rng.uniform(7, 22) * HOUR
+            end = start + rng.uniform(10 * 60, 4 * HOUR)
+            t = start
+            while t < end:
+                times.append(t)
+                t += rng.expovariate(1 / 120)
+    return sorted(times)
+
+def simulate(users, days, seed=7):
+    rng = random.Random(seed)
+    counts = {"requests": 0, "old_logins": 0, "new_logins": 0, "refreshes": 0}
+    for _ in range(users):
+        old_expires = new_access_expires = refresh_expires = -1
+        for t in user_requests(rng, days):
+            counts["requests"] += 1
+            if t >= old_expires:
+                counts["old_logins"] += 1
+                old_expires = t + OLD_TOKEN_SECONDS
+            if t >= new_access_expires:
+                if t < refresh_expires:
+                    counts["refreshes"] += 1
+                else:
+                    counts["new_logins"] += 1
+                new_access_expires = t + ACCESS_SECONDS
+                refresh_expires = t + REFRESH_SECONDS  # rotation slides the window
+    return counts
+
+def cpu_per_call(fn, n):
+    start = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - start) / n
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+
+    password = "correct horse battery staple"
+    stored = passwords.hash_password(password)  # current PASSWORD_SCHEME policy
+    login_cpu = cpu_per_call(lambda: passwords.verify(password, stored), 5)
+
+    def refresh():
+        refresh_tokens.hash_token(secrets.token_urlsafe(32))  # presented token
+        refresh_tokens.hash_token(secrets.token_urlsafe(32))  # its replacement
+        refresh_tokens.issue_access_token("00000000-0000-0000-0000-000000000000")
+    refresh_cpu = cpu_per_call(refresh, 5000)
+
+    c = simulate(users, days)
+    old_cpu = c["old_logins"] * login_cpu
+    new_cpu = c["new_logins"] * login_cpu + c["refreshes"] * refresh_cpu
+
+    print(f"{users} users, {days} days, {c['requests']} requests")
+    print(f"unit CPU: password verify {login_cpu * 1000:.1f} ms, refresh {refresh_cpu * 1e6:.1f} us")
+    print(f"old (12h JWT):          {c['old_logins']:6d} password logins                    -> {old_cpu:8.2f} s CPU")
+    print(f"new (15m + refresh):    {c['new_logins']:6d} password logins, {c['refreshes']:6d} refreshes -> {new_cpu:8.2f} s CPU")
+    print(f"login CPU reduced {old_cpu / new_cpu:.1f}x; users typed their password {c['old_logins'] - c['new_logins']} fewer times")
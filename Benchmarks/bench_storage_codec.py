@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import json
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+
+import storage_codec
+
+# Storage and transfer savings of the upload codec against its CPU cost.
+#
+# The corpus mirrors what SparkDrive holds: the .log and .sh files populate_sparkdrive.py creates
+# (scaled up to realistic sizes), JSON exports, and already-compressed media that the sniffing
+# has to let through untouched. Each codec runs through storage_codec.encode exactly as an upload
+# would, so skipped and not-worth-it files count at their raw size. Transfer time is what the
+# stored bytes take on the given link, since downloads are served with Content-Encoding.
+#
+# Usage: python Benchmarks/bench_storage_codec.py [link_mbit_per_s]
+
+def log_file(rng, lines):
+    levels = ["INFO", "INFO", "INFO", "DEBUG", "WARN", "ERROR"]
+    return "".join(
+        f"[{rng.choice(levels)}] 2025-08-01 12:{i // 60 % 60:02d}:{i % 60:02d} "
+        f"worker-{rng.randrange(8)} request_id={rng.getrandbits(32):08x} path=/api/{rng.choice(['list', 'upload', 'download'])} "
+        f"status={rng.choice([200, 200, 200, 304, 404, 500])} ms={rng.randrange(1, 900)}\n"
+        for i in range(lines)
+    ).encode()
+
+def shell_script(rng, blocks):
+    return ("#!/bin/bash\nset -euo pipefail\necho 'Auditing SparkDrive...'\n" + "".join(
+        f"for f in /var/log/sparkdrive/{rng.choice(['app', 'audit', 'upload'])}*.log; do\n"
+        f"  grep -c '{rng.choice(['ERROR', 'WARN'])}' \"$f\" || true\ndone\n"
+        for _ in range(blocks)
+    )).encode()
+
+def json_export(rng, rows):
+    return json.dumps([
+        {"file_id": f"{rng.getrandbits(128):032x}", "filename": f"report_{i}.pdf",
+         "size_bytes": rng.randrange(10 ** 6), "uploaded_at": f"2025-08-{1 + i % 28:02d}T12:00:00Z"}
+        for i in range(rows)
+    ], indent=2).encode()
+
+def media(header, size):
+    return header + os.urandom(size - len(header))
+
+def corpus(rng):
+    files = []
+    files += [("log", log_file(rng, rng.randrange(200, 20000))) for _ in range(40)]
+    files += [("sh", shell_script(rng, rng.randrange(5, 200))) for _ in range(20)]
+    files += [("json", json_export(rng, rng.randrange(50, 5000))) for _ in range(10)]
+    files += [("jpeg", media(b"\xff\xd8\xff\xe0", rng.randrange(200_000, 2_000_000))) for _ in range(10)]
+    files += [("zip", media(b"PK\x03\x04", rng.randrange(100_000, 1_000_000))) for _ in range(5)]
+    files += [("bin", os.urandom(rng.randrange(10_000, 200_000))) for _ in range(5)]
+    return files
+
+def run(label, files, codec, level, link_bytes_per_s):
+    raw = stored = compressed = 0
+    encode_cpu = decode_cpu = 0.0
+    for kind, data in files:
+        start = time.process_time()
+        if codec:
+            if codec == "gzip":
+                storage_codec.GZIP_LEVEL = level
+            else:
+                storage_codec.ZSTD_LEVEL = level
+            used, payload = storage_codec.encode(data, codec)
+        else:
+            used, payload = None, data
+        encode_cpu += time.process_time() - start
+
+        start = time.process_time()
+        assert storage_codec.decompress(used, payload) == data
+        decode_cpu += time.process_time() - start
+
+        raw += len(data)
+        stored += len(payload)
+        compressed += used is not None
+
+    transfer = stored / link_bytes_per_s
+    rate = f"{raw / 2 ** 20 / encode_cpu:6.0f} MiB/s" if codec else "     -     "
+    print(f"{label:<10} {stored / 2 ** 20:8.1f} MiB  {stored / raw:6.1%}  {compressed:3d}/{len(files)} compressed  "
+          f"encode {encode_cpu * 1000:7.0f} ms ({rate})  "
+          f"decode {decode_cpu * 1000:5.0f} ms  transfer {transfer:6.1f} s")
+    return stored, encode_cpu, decode_cpu, transfer
+
+if __name__ == "__main__":
+    link_mbit = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    link_bytes_per_s = link_mbit * 1e6 / 8
+
+    files = corpus(random.Random(42))
+    raw = sum(len(data) for _, data in files)
+    text = sum(len(data) for kind, data in files if kind in ("log", "sh", "json"))
+    print(f"{len(files)} files, {raw / 2 ** 20:.1f} MiB ({text / raw:.0%} text), link {link_mbit:g} Mbit/s")
+
+    base = run("none", files, None, None, link_bytes_per_s)
+    configs = [("gzip-1", "gzip", 1), ("gzip-6", "gzip", 6), ("gzip-9", "gzip", 9)]
+    if "zstd" in storage_codec.available_codecs():
+        configs += [("zstd-1", "zstd", 1), ("zstd-3", "zstd", 3), ("zstd-9", "zstd", 9)]
+    else:
+        print("zstd: skipped (pip install zstandard)")
+
+    for label, codec, level in configs:
+        stored, encode_cpu, decode_cpu, transfer = run(label, files, codec, level, link_bytes_per_s)
+        saved = base[0] - stored
+        print(f"{'':<10} saves {saved / 2 ** 20:.1f} MiB stored and {base[3] - transfer:.1f} s of transfer "
+              f"for {encode_cpu * 1000:.0f} ms upload CPU ({saved / 2 ** 20 / max(encode_cpu, 1e-9):.0f} MiB saved per CPU second)")
@@ -1,4 +1,89 @@
 import sys
 import os
+import threading
+from contextlib import contextmanager
+import pytest
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
\ No newline at end of file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../Backend")))
+
+import db
+
+# Stand-in for db.connection() shared by the lambda tests.
+#
+# Every statement is recorded in fake_db.executed as (sql with whitespace collapsed, params).
+# Results come from fake_db.respond(sql, params) when a test sets it, otherwise from the
+# fake_db.results queue (one list of rows per statement, [] once it runs dry). Connections
+# count as committed when their block exits normally and rolled back when it raises; setting
+# fake_db.available = False makes db.connection() fail the way an unreachable database does.
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.rows = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.rows = list(self.database.answer(sql, params) or [])
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+class FakeDatabase:
+    def __init__(self):
+        self.executed = []
+        self.results = []
+        self.respond = None
+        self.available = True
+        self.connections = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.lock = threading.Lock()
+
+    def answer(self, sql, params):
+        with self.lock:
+            self.executed.append((" ".join(sql.split()), params))
+            if self.respond:
+                return self.respond(sql, params)
+            return self.results.pop(0) if self.results else []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    @contextmanager
+    def connection(self, autocommit=False):
+        with self.lock:
+            self.connections += 1
+        if not self.available:
+            raise RuntimeError("database unavailable in this test")
+        try:
+            yield FakeConnection(self)
+        except Exception:
+            with self.lock:
+                self.rollbacks += 1
+            raise
+        with self.lock:
+            self.commits += 1
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(db, "connection", database.connection)
+    return database
@@ -0,0 +1,60 @@
+import os
+import sys
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../UI")))
+
+import api_client
+from api_client import ApiClient
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+class ScriptedSession(requests.Session):
+    # Plays back a list of responses/exceptions instead of touching the network
+    def __init__(self, script):
+        super().__init__()
+        self.script = list(script)
+        self.calls = []
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.calls.append((json.get("action"), timeout))
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(api_client.time, "sleep", lambda seconds: None)
+
+def test_idempotent_actions_retry_gateway_errors_and_timeouts():
+    session = ScriptedSession([503, requests.ConnectTimeout(), 200])
+    client = ApiClient(session=session, max_retries=2)
+
+    resp = client.post("https://api/folder/list", json={"action": "list_contents", "path": "/"})
+
+    assert resp.status_code == 200
+    assert len(session.calls) == 3
+    assert client.stats()["list_contents"]["calls"] == 3
+    assert client.stats()["list_contents"]["errors"] == 2
+
+def test_writes_are_sent_once():
+    session = ScriptedSession([503])
+    client = ApiClient(session=session, max_retries=2)
+
+    resp = client.post("https://api/upload", json={"action": "upload_batch", "files": []})
+
+    assert resp.status_code == 503
+    assert len(session.calls) == 1
+
+def test_every_call_has_a_timeout():
+    session = ScriptedSession([200, 200])
+    client = ApiClient(session=session, timeout=(1, 5))
+
+    client.post("https://api/login", json={"action": "login_user"})
+    client.post("https://api/file/download", json={"action": "download_folder"}, timeout=(1, 300))
+
+    assert session.calls == [("login_user", (1, 5)), ("download_folder", (1, 300))]
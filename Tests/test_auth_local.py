@@ -0,0 +1,57 @@
+import os
+import time
+import pytest
+import jwt
+
+os.environ.setdefault("JWT_SECRET", "testsecret")
+
+import auth
+
+OLD_SECRET = "old-secret-0123456789-0123456789-01"
+NEW_SECRET = "new-secret-0123456789-0123456789-01"
+
+@pytest.fixture(autouse=True)
+def rotated_secrets(monkeypatch):
+    monkeypatch.setattr(auth, "SECRETS", [NEW_SECRET, OLD_SECRET])
+    auth.clear_cache()
+    yield
+    auth.clear_cache()
+
+def make_token(secret, exp_seconds=3600, user_id="00000000-0000-0000-0000-000000000000"):
+    return jwt.encode({"user_id": user_id, "exp": int(time.time()) + exp_seconds}, secret, algorithm="HS256")
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_tokens_signed_with_any_accepted_secret_verify():
+    for secret in (NEW_SECRET, OLD_SECRET):
+        assert auth.verify_jwt(bearer(make_token(secret)))["user_id"] == "00000000-0000-0000-0000-000000000000"
+
+def test_new_tokens_are_signed_with_the_first_secret():
+    token = auth.issue_token({"user_id": "u1"})
+    assert jwt.decode(token, NEW_SECRET, algorithms=["HS256"]) == {"user_id": "u1"}
+
+def test_unknown_secret_and_expired_tokens_are_rejected():
+    with pytest.raises(ValueError, match="Invalid token"):
+        auth.verify_jwt(bearer(make_token("someone-elses-secret-0123456789-0123")))
+    with pytest.raises(ValueError, match="Token expired"):
+        auth.verify_jwt(bearer(make_token(OLD_SECRET, exp_seconds=-10)))
+    with pytest.raises(ValueError, match="Missing or invalid Authorization header"):
+        auth.verify_jwt({})
+
+def test_repeat_verification_is_served_from_cache():
+    token = make_token(NEW_SECRET)
+    first = auth.verify_token(token)
+    first["user_id"] = "tampered"
+    assert auth.verify_token(token)["user_id"] == "00000000-0000-0000-0000-000000000000"
+    assert auth.stats == {"hits": 1, "misses": 1}
+
+def test_cached_entry_does_not_outlive_token_exp(monkeypatch):
+    token = make_token(NEW_SECRET, exp_seconds=2)
+    auth.verify_token(token)
+
+    # Past exp the cache must not answer; the token goes back through a full decode
+    later = time.time() + 5
+    monkeypatch.setattr(auth.time, "time", lambda: later)
+    auth.verify_token(token)
+    assert auth.stats == {"hits": 0, "misses": 2}
@@ -0,0 +1,143 @@
+import os
+import json
+import pytest
+
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+import blobs
+import blob_sweeper_lambda
+import file_delete_lambda
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+OTHER_USER_ID = "11111111-1111-1111-1111-111111111111"
+A, B = "a" * 64, "b" * 64
+
+def test_adjust_locks_rows_in_key_order_and_skips_net_zero(fake_db):
+    blobs.adjust(fake_db.cursor(), {(OTHER_USER_ID, A): 1, (USER_ID, B): -1, (USER_ID, A): 2, (USER_ID, "c" * 64): 0})
+
+    (lock_sql, lock_params), (update_sql, update_params) = fake_db.executed
+    assert lock_sql.endswith("FOR UPDATE")
+    assert lock_params == ([USER_ID, USER_ID, OTHER_USER_ID], [A, B, A])
+    assert update_params == ([USER_ID, USER_ID, OTHER_USER_ID], [A, B, A], [2, -1, 1])
+
+def test_adjust_without_changes_runs_nothing(fake_db):
+    blobs.adjust(fake_db.cursor(), {(USER_ID, A): 0})
+    assert fake_db.executed == []
+
+def test_release_drops_one_reference_per_row_and_returns_removed_keys(fake_db):
+    fake_db.respond = lambda sql, params: [(blobs.blob_key(USER_ID, A),)] if "DELETE FROM blobs" in sql else []
+
+    keys = blobs.release(fake_db.cursor(), [(USER_ID, A), (USER_ID, A), (USER_ID, B)])
+
+    assert keys == [blobs.blob_key(USER_ID, A)]
+    update_params = fake_db.executed[1][1]
+    assert update_params == ([USER_ID, USER_ID], [A, B], [-2, -1])
+    delete_sql, delete_params = fake_db.executed[2]
+    assert "b.ref_count <= 0" in delete_sql and "b.claimed_at <" in delete_sql
+    assert delete_params == ([USER_ID, USER_ID], [A, B], blobs.CLAIM_GRACE_SECONDS)
+
+def test_release_of_nothing_runs_nothing(fake_db):
+    assert blobs.release(fake_db.cursor(), []) == []
+    assert fake_db.executed == []
+
+class FakeS3:
+    def __init__(self, fail=False):
+        self.deleted = []
+        self.fail = fail
+
+    def delete_object(self, Bucket, Key):
+        if self.fail:
+            raise RuntimeError("AccessDenied")
+        self.deleted.append(Key)
+
+def delete_file(file_id="f1"):
+    return file_delete_lambda.lambda_handler({"body": json.dumps({"file_id": file_id, "user_id": USER_ID})}, None)
+
+@pytest.fixture
+def deleting(monkeypatch, fake_db):
+    s3, released = FakeS3(), []
+    monkeypatch.setattr(file_delete_lambda, "s3", s3)
+    monkeypatch.setattr(file_delete_lambda.listing_cache, "bump_version", lambda user_id, cur: None)
+
+    def release(cur, refs):
+        released.extend(refs)
+        return [blobs.blob_key(user_id, digest) for user_id, digest in refs if digest == A]
+
+    monkeypatch.setattr(file_delete_lambda.blobs, "release", release)
+    return s3, released, fake_db
+
+def test_file_delete_removes_the_blob_with_its_last_reference(deleting):
+    s3, released, fake_db = deleting
+    fake_db.results = [[("f-logs/a.log", "a.log", A)]]
+
+    assert delete_file()["statusCode"] == 200
+    assert released == [(USER_ID, A)]
+    assert s3.deleted == [blobs.blob_key(USER_ID, A)]
+
+def test_file_delete_keeps_a_blob_other_files_still_use(deleting):
+    s3, released, fake_db = deleting
+    fake_db.results = [[("f-logs/b.log", "b.log", B)]]
+
+    assert delete_file()["statusCode"] == 200
+    assert released == [(USER_ID, B)] and s3.deleted == []
+    assert fake_db.commits == 1
+
+def test_file_delete_removes_the_files_shares_first(deleting):
+    s3, released, fake_db = deleting
+    fake_db.results = [[("f-logs/a.log", "a.log", A)]]
+
+    assert delete_file()["statusCode"] == 200
+    deletes = [(sql, params) for sql, params in fake_db.executed if sql.startswith("DELETE")]
+    assert deletes == [("DELETE FROM file_shares WHERE file_id = %s", ("f1",)),
+                       ("DELETE FROM files WHERE file_id = %s", ("f1",))]
+
+def test_file_delete_of_a_pre_blob_file_removes_its_own_key(deleting):
+    s3, released, fake_db = deleting
+    fake_db.results = [[("f-logs/old.log", "old.log", None)]]
+
+    assert delete_file()["statusCode"] == 200
+    assert released == [] and s3.deleted == ["f-logs/old.log"]
+
+def test_file_delete_rolls_back_when_s3_fails(deleting, monkeypatch):
+    s3, released, fake_db = deleting
+    monkeypatch.setattr(s3, "fail", True)
+    fake_db.results = [[("f-logs/a.log", "a.log", A)]]
+
+    assert delete_file()["statusCode"] == 500
+    assert (fake_db.commits, fake_db.rollbacks) == (0, 1)
+
+@pytest.fixture
+def unreferenced(monkeypatch, fake_db):
+    state = {"remaining": 0, "deleted_keys": [], "db": fake_db}
+
+    def delete_unreferenced(cur, limit):
+        n = min(limit, state["remaining"])
+        state["remaining"] -= n
+        return [f"blobs/{USER_ID}/{i}" for i in range(n)]
+
+    monkeypatch.setattr(blob_sweeper_lambda.blobs, "delete_unreferenced", delete_unreferenced)
+    monkeypatch.setattr(blob_sweeper_lambda, "delete_s3_objects", state["deleted_keys"].extend)
+    return state
+
+def test_blob_sweeper_deletes_objects_batch_by_batch(unreferenced):
+    unreferenced["remaining"] = 250
+
+    body = json.loads(blob_sweeper_lambda.lambda_handler({"batch_size": 100}, None)["body"])
+
+    assert body == {"deleted": 250, "batches": 3, "complete": True}
+    assert len(unreferenced["deleted_keys"]) == 250
+    assert unreferenced["db"].commits == 3
+
+def test_blob_sweeper_keeps_rows_when_s3_fails(unreferenced, monkeypatch):
+    unreferenced["remaining"] = 50
+
+    def broken(keys):
+        raise RuntimeError("Failed to delete 50 object(s) from S3")
+
+    monkeypatch.setattr(blob_sweeper_lambda, "delete_s3_objects", broken)
+    response = blob_sweeper_lambda.lambda_handler({"batch_size": 100}, None)
+
+    assert response["statusCode"] == 500
+    assert json.loads(response["body"])["deleted"] == 0
+    assert (unreferenced["db"].commits, unreferenced["db"].rollbacks) == (0, 1)
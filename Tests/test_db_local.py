@@ -0,0 +1,104 @@
+import pytest
+import psycopg2
+
+import db
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        if self.conn.dead:
+            self.conn.closed = 2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.queries.append(query)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.dead = False
+        self.queries = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        if self.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def fake_connect(monkeypatch):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    db.close_all()
+    monkeypatch.setattr(db, "connect", connect)
+    yield created
+    db.close_all()
+
+def test_connection_is_reused_across_invocations(fake_connect):
+    with db.connection() as first:
+        pass
+    with db.connection() as second:
+        pass
+    assert first is second
+    assert len(fake_connect) == 1
+    assert first.commits == 2
+
+def test_closed_connection_is_replaced(fake_connect):
+    with db.connection() as first:
+        pass
+    first.closed = 1
+    with db.connection() as second:
+        pass
+    assert second is not first
+    assert len(fake_connect) == 2
+
+def test_idle_connection_is_health_checked(fake_connect, monkeypatch):
+    monkeypatch.setattr(db, "HEALTHCHECK_IDLE_SECONDS", 0)
+    with db.connection() as first:
+        pass
+    first.dead = True
+    with db.connection() as second:
+        pass
+    assert second is not first
+    assert first.closed
+
+def test_error_rolls_back_and_drops_broken_connection(fake_connect):
+    with pytest.raises(psycopg2.OperationalError):
+        with db.connection() as conn:
+            conn.dead = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+    with db.connection() as fresh:
+        pass
+    assert fresh is not conn
+    assert conn.commits == 0
+
+def test_error_keeps_healthy_connection(fake_connect):
+    with pytest.raises(ValueError):
+        with db.connection() as conn:
+            raise ValueError("boom")
+    with db.connection() as again:
+        pass
+    assert again is conn
+    assert conn.rollbacks == 1
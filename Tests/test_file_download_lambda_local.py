@@ -0,0 +1,45 @@
+import os
+import json
+import pytest
+
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+import file_download_lambda
+from link_cache import LinkCache
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+OWNED = {
+    "11111111-1111-1111-1111-111111111111": ("a.txt", "f1/a.txt", 10),
+    "22222222-2222-2222-2222-222222222222": ("b.txt", "f1/b.txt", 20),
+}
+FOREIGN = "33333333-3333-3333-3333-333333333333"
+
+@pytest.fixture
+def queries(monkeypatch, fake_db):
+    fake_db.respond = lambda sql, params: [(file_id,) + OWNED[file_id] for file_id in params[1] if file_id in OWNED]
+    monkeypatch.setattr(file_download_lambda, "urls", LinkCache())
+    monkeypatch.setattr(file_download_lambda, "presign_download", lambda s3_key, filename=None: f"https://s3.example/{s3_key}?sig=1")
+    return fake_db.executed
+
+def test_download_files_checks_ownership_in_one_query(queries):
+    file_ids = list(OWNED) + [FOREIGN]
+
+    response = file_download_lambda.lambda_handler({"user_id": USER_ID, "file_ids": file_ids}, None)
+    files = json.loads(response["body"])["files"]
+
+    assert response["statusCode"] == 200
+    assert len(queries) == 1
+    assert [f["file_id"] for f in files] == file_ids
+    assert files[0]["filename"] == "a.txt" and "f1/a.txt" in files[0]["download_url"]
+    assert files[2] == {"file_id": FOREIGN, "error": "Unauthorized file access"}
+
+def test_download_files_rejects_bad_ids_before_querying(queries):
+    response = file_download_lambda.lambda_handler({"user_id": USER_ID, "file_ids": ["../etc"]}, None)
+    assert response["statusCode"] == 400
+    assert queries == []
+
+def test_download_file_rejects_a_bad_id_like_the_batch_path(queries):
+    response = file_download_lambda.lambda_handler({"user_id": USER_ID, "file_id": "../etc"}, None)
+    assert response["statusCode"] == 400
+    assert queries == []
@@ -0,0 +1,165 @@
+import io
+import os
+import gzip
+import json
+import zipfile
+import tracemalloc
+
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+from botocore.exceptions import ClientError
+import folder_archive_lambda
+
+MiB = 1024 * 1024
+
+def object_bytes(key, size):
+    pattern = (key.encode() + b"\n") * 64
+    return (pattern * (size // len(pattern) + 1))[:size]
+
+class GeneratedBody:
+    # Produces the object's bytes on demand, so the stand-in never holds a whole object
+    def __init__(self, key, size):
+        self.key, self.size, self.offset = key, size, 0
+
+    def read(self, amt=None):
+        amt = self.size - self.offset if amt is None else min(amt, self.size - self.offset)
+        start = self.offset
+        self.offset += amt
+        pattern = (self.key.encode() + b"\n") * 64
+        skip = start % len(pattern)
+        return (pattern * ((skip + amt) // len(pattern) + 2))[skip:skip + amt]
+
+# Local S3 stand-in: objects are generated from their key, archive parts are spooled to disk
+class StandinS3:
+    def __init__(self, sizes, spool):
+        self.sizes = sizes
+        self.spool = spool
+        self.completed = None
+        self.aborted = False
+        self.encoded = {}  # key -> stored (compressed) bytes
+        self.saved = {}    # key -> put_object body (archive build results)
+
+    def get_object(self, Bucket, Key):
+        if Key in self.encoded:
+            return {"ContentLength": len(self.encoded[Key]), "Body": io.BytesIO(self.encoded[Key])}
+        if Key in self.saved:
+            return {"ContentLength": len(self.saved[Key]), "Body": io.BytesIO(self.saved[Key])}
+        if Key not in self.sizes:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"ContentLength": self.sizes[Key], "Body": GeneratedBody(Key, self.sizes[Key])}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.saved[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.spool.write(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = (Key, len(MultipartUpload["Parts"]))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://s3.example/{Params['Key']}"
+
+def make_tree(monkeypatch, files, folders, spool):
+    sizes = {s3_key: size for _, _, s3_key, size, _ in files}
+    s3 = StandinS3(sizes, spool)
+    monkeypatch.setattr(folder_archive_lambda, "s3", s3)
+    monkeypatch.setattr(folder_archive_lambda, "list_subtree",
+                        lambda user_id, path: (folders, files, len(files), sum(sizes.values())))
+    return s3
+
+def test_archive_streams_a_tree_far_larger_than_its_memory_budget(monkeypatch, tmp_path):
+    folders = ["/Big", "/Big/a", "/Big/b"]
+    files = [(folders[1 + i % 2], f"blob{i}.bin", f"k/blob{i}", 6 * MiB, None) for i in range(32)]
+    files += [("/Big", f"note{i}.txt", f"k/note{i}", 2048, None) for i in range(200)]
+    total = sum(f[3] for f in files)
+    # Stored entries, so the archive itself is as large as the tree and spans many parts
+    monkeypatch.setattr(folder_archive_lambda, "COMPRESSION", zipfile.ZIP_STORED)
+
+    with open(tmp_path / "archive.zip", "w+b") as spool:
+        s3 = make_tree(monkeypatch, files, folders, spool)
+
+        tracemalloc.start()
+        response = folder_archive_lambda.lambda_handler({"user_id": "u", "path": "/Big"}, None)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert response["statusCode"] == 200, response
+        assert peak < total / 6  # ~190 MiB archived in well under 32 MiB
+        assert s3.completed[1] > 1 and not s3.aborted
+
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as zf:
+            names = zf.namelist()
+            assert "Big/a/" in names and "Big/b/blob1.bin" in names and "Big/note7.txt" in names
+            assert zf.testzip() is None
+            assert zf.read("Big/a/blob0.bin")[:1024] == object_bytes("k/blob0", 1024)
+
+def test_archive_rejects_folders_over_the_caps(monkeypatch):
+    files = [("/Big", "a.bin", "k/a", 10, None)] * 3
+    make_tree(monkeypatch, files, ["/Big"], io.BytesIO())
+
+    monkeypatch.setattr(folder_archive_lambda, "MAX_FILES", 2)
+    response = folder_archive_lambda.lambda_handler({"user_id": "u", "path": "/Big"}, None)
+    assert response["statusCode"] == 413
+
+def test_archive_aborts_the_upload_when_reading_fails(monkeypatch):
+    s3 = make_tree(monkeypatch, [("/Big", "gone.bin", "k/gone", 10, None)], ["/Big"], io.BytesIO())
+    s3.sizes.clear()
+
+    response = folder_archive_lambda.lambda_handler({"user_id": "u", "path": "/Big"}, None)
+    assert response["statusCode"] == 500
+    assert s3.aborted
+
+def test_archive_holds_the_original_bytes_of_compressed_objects(monkeypatch):
+    small, large = object_bytes("k/small", 4096), object_bytes("k/large", 3 * MiB)
+    files = [("/Big", "small.log", "k/small", len(small), "gzip"), ("/Big", "large.log", "k/large", len(large), "gzip")]
+    spool = io.BytesIO()
+    s3 = make_tree(monkeypatch, files, ["/Big"], spool)
+    s3.encoded = {"k/small": gzip.compress(small), "k/large": gzip.compress(large)}
+
+    response = folder_archive_lambda.lambda_handler({"user_id": "u", "path": "/Big"}, None)
+
+    assert response["statusCode"] == 200, response
+    with zipfile.ZipFile(io.BytesIO(spool.getvalue())) as zf:
+        assert zf.read("Big/small.log") == small
+        assert zf.read("Big/large.log") == large
+
+ARCHIVE_ID = "22222222-2222-2222-2222-222222222222"
+
+def archive_status():
+    return folder_archive_lambda.lambda_handler({"user_id": "u", "archive_id": ARCHIVE_ID, "status": True}, None)
+
+def test_async_build_is_polled_until_its_url_is_ready(monkeypatch):
+    s3 = make_tree(monkeypatch, [("/Big", "a.bin", "k/a", 10, None)], ["/Big"], io.BytesIO())
+
+    assert archive_status()["statusCode"] == 202
+    folder_archive_lambda.lambda_handler({"user_id": "u", "path": "/Big", "archive_id": ARCHIVE_ID}, None)
+    response = archive_status()
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["download_url"] == f"https://s3.example/archives/u/{ARCHIVE_ID}.zip"
+    assert body["filename"] == "Big.zip" and body["files"] == 1
+    assert s3.completed[0] == f"archives/u/{ARCHIVE_ID}.zip"
+    assert "download_url" not in json.loads(s3.saved[f"archives/u/{ARCHIVE_ID}.json"])["body"]
+
+def test_async_build_errors_reach_the_poller(monkeypatch):
+    make_tree(monkeypatch, [("/Big", "a.bin", "k/a", 10, None)] * 3, ["/Big"], io.BytesIO())
+    monkeypatch.setattr(folder_archive_lambda, "MAX_FILES", 2)
+
+    folder_archive_lambda.lambda_handler({"user_id": "u", "path": "/Big", "archive_id": ARCHIVE_ID}, None)
+
+    assert archive_status()["statusCode"] == 413
+
+def test_status_rejects_a_malformed_archive_id():
+    response = folder_archive_lambda.lambda_handler({"user_id": "u", "archive_id": "../x", "status": True}, None)
+    assert response["statusCode"] == 400
@@ -0,0 +1,66 @@
+import json
+import pytest
+
+import folder_create_lambda
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+ROOT_ID = "0849d21b-7ab3-48e5-9508-e54963431b97"
+
+def test_ancestor_paths_run_from_the_root_down():
+    assert folder_create_lambda.ancestor_paths("/a/b/c") == ["/", "/a", "/a/b"]
+    assert folder_create_lambda.ancestor_paths("/a") == ["/"]
+    assert folder_create_lambda.ancestor_paths("/") == ["/"]
+
+@pytest.fixture
+def folders(monkeypatch, fake_db):
+    existing = {"/": ROOT_ID}
+    bumped = []
+    fake_db.respond = lambda sql, params: [(p, existing[p]) for p in params[1] if p in existing] if sql.lstrip().startswith("SELECT") else []
+    monkeypatch.setattr(folder_create_lambda.listing_cache, "bump_version", lambda user_id, cur: bumped.append(user_id))
+    return existing, bumped, fake_db
+
+def create(path):
+    response = folder_create_lambda.lambda_handler({"body": json.dumps({"user_id": USER_ID, "path": path})}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+def inserted(fake_db):
+    return [params for sql, params in fake_db.executed if sql.startswith("INSERT INTO folders")]
+
+def test_missing_ancestors_are_created_top_down_with_their_parents(folders):
+    existing, bumped, fake_db = folders
+
+    status, body = create("/a/b/c/")
+
+    assert status == 201
+    rows = inserted(fake_db)
+    assert [row[2] for row in rows] == ["/a", "/a/b", "/a/b/c"]
+    assert rows[0][3] == ROOT_ID
+    assert [row[3] for row in rows[1:]] == [row[0] for row in rows[:-1]]  # each row points at the one above
+    assert body["folder_id"] == rows[-1][0]
+    assert bumped == [USER_ID] and fake_db.commits == 1
+
+def test_existing_ancestors_are_reused(folders):
+    existing, bumped, fake_db = folders
+    existing["/a"] = "f-a"
+
+    create("/a/b")
+
+    rows = inserted(fake_db)
+    assert [(row[2], row[3]) for row in rows] == [("/a/b", "f-a")]
+    lookup = fake_db.executed[0][1]
+    assert lookup == (USER_ID, ["/", "/a", "/a/b"])  # one query for the whole lineage
+
+def test_existing_folder_is_left_alone(folders):
+    existing, bumped, fake_db = folders
+    existing["/a"] = "f-a"
+
+    status, body = create("/a")
+
+    assert status == 200 and body == {"message": "Folder already exists"}
+    assert inserted(fake_db) == [] and bumped == []
+
+@pytest.mark.parametrize("path", ["", "a/b", "/a//b"])
+def test_invalid_paths_are_rejected(folders, path):
+    existing, bumped, fake_db = folders
+    assert create(path)[0] == 400
+    assert fake_db.executed == []
@@ -0,0 +1,82 @@
+import os
+import json
+import pytest
+
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+import folder_delete_lambda
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+FOLDERS = ["f-projects", "f-spark", "f-spark-docs"]  # /Projects and the folders nested below it
+
+# delete_objects reports keys it could not remove in Errors instead of raising
+class FakeS3:
+    def __init__(self, failing=()):
+        self.batches = []
+        self.failing = set(failing)
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        self.batches.append(keys)
+        return {"Errors": [{"Key": key, "Code": "AccessDenied"} for key in keys if key in self.failing]}
+
+def delete_folder(path="/Projects"):
+    return folder_delete_lambda.lambda_handler({"body": json.dumps({"path": path, "user_id": USER_ID})}, None)
+
+@pytest.fixture
+def subtree(monkeypatch, fake_db):
+    files = [(f"f-spark/{i}.log", None) for i in range(2500)]
+
+    def respond(sql, params):
+        if "WITH RECURSIVE subtree" in sql:
+            return [(folder_id,) for folder_id in FOLDERS] if params[1] == "/Projects" else []
+        if "DELETE FROM files" in sql:
+            return files
+        return []
+
+    fake_db.respond = respond
+    s3 = FakeS3()
+    monkeypatch.setattr(folder_delete_lambda, "s3", s3)
+    monkeypatch.setattr(folder_delete_lambda.listing_cache, "bump_version", lambda user_id, cur: None)
+    monkeypatch.setattr(folder_delete_lambda.blobs, "release", lambda cur, refs: [])
+    return s3, files
+
+def test_nested_subtree_is_deleted_with_set_based_statements(subtree, fake_db):
+    response = delete_folder()
+
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert body["folders_deleted"] == 3 and body["files_deleted"] == 2500
+    sql, params = fake_db.executed[0]
+    assert "f.user_id = %s" in sql and params == (USER_ID, "/Projects", USER_ID)
+    deletes = [(sql.split()[2], params) for sql, params in fake_db.executed if sql.startswith("DELETE")]
+    assert deletes == [("file_shares", (USER_ID, FOLDERS)), ("files", (USER_ID, FOLDERS)),
+                       ("folders", (USER_ID, FOLDERS))]
+    assert fake_db.commits == 1
+
+def test_objects_are_deleted_in_batches_of_at_most_1000(subtree):
+    s3, files = subtree
+    delete_folder()
+
+    assert [len(batch) for batch in s3.batches] == [1000, 1000, 500]
+    assert sorted(key for batch in s3.batches for key in batch) == sorted(key for key, _ in files)
+
+def test_failed_keys_are_reported_and_the_transaction_rolls_back(subtree, fake_db):
+    s3, files = subtree
+    s3.failing = {"f-spark/7.log", "f-spark/2100.log"}
+
+    response = delete_folder()
+
+    assert response["statusCode"] == 500
+    details = json.loads(response["body"])["details"]
+    assert "Failed to delete 2 object(s)" in details and "f-spark/7.log: AccessDenied" in details
+    assert len(s3.batches) == 3  # every batch was still attempted
+    assert fake_db.rollbacks == 1 and fake_db.commits == 0
+
+def test_missing_folder_is_a_404(subtree, fake_db):
+    s3, files = subtree
+    response = delete_folder("/Nope")
+
+    assert response["statusCode"] == 404
+    assert s3.batches == [] and len(fake_db.executed) == 1
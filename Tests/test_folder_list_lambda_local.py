@@ -0,0 +1,77 @@
+import json
+import string
+from datetime import datetime, timedelta
+import pytest
+
+import folder_list_lambda
+from listing_cache import ListingCache, MemoryVersionStore
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+FOLDER_ID = "0849d21b-7ab3-48e5-9508-e54963431b97"
+START = datetime(2025, 8, 1, 12, 0, 0)
+
+# Newest first, like the keyset query returns them
+FILES = [(f"{i:08d}-0000-0000-0000-000000000000", f"file{i}.txt", i, START - timedelta(minutes=i)) for i in range(5)]
+
+@pytest.fixture
+def listing(monkeypatch, fake_db):
+    monkeypatch.setattr(folder_list_lambda.listing_cache, "cache", ListingCache(MemoryVersionStore(), 8))
+
+    def respond(sql, params):
+        if "SELECT folder_id FROM folders" in sql:
+            return [(FOLDER_ID,)]
+        if "parent_id" in sql:
+            return [("/Logs/2025",)]
+        if "FROM files" in sql:
+            rows = FILES
+            if "(uploaded_at, file_id) <" in sql:
+                rows = [row for row in FILES if (row[3], row[0]) < (params[2], params[3])]
+            return rows[:params[-1]]
+        return []
+
+    fake_db.respond = respond
+    return fake_db
+
+def list_page(limit, cursor=None):
+    response = folder_list_lambda.lambda_handler({"user_id": USER_ID, "path": "/Logs", "limit": limit, "cursor": cursor}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+def test_cursor_round_trips():
+    uploaded_at, file_id = FILES[2][3], FILES[2][0]
+    cursor = folder_list_lambda.encode_cursor(uploaded_at, file_id)
+
+    assert folder_list_lambda.decode_cursor(cursor) == (uploaded_at, file_id)
+    assert set(cursor) <= set(string.ascii_letters + string.digits + "-_=")  # safe in a query string
+
+def test_pages_follow_the_cursor_until_the_last_one(listing):
+    status, first = list_page(2)
+    assert status == 200
+    assert [f["filename"] for f in first["files"]] == ["file0.txt", "file1.txt"]
+    assert first["folders"] == [{"name": "2025", "path": "/Logs/2025"}]
+
+    status, second = list_page(2, first["next_cursor"])
+    assert [f["filename"] for f in second["files"]] == ["file2.txt", "file3.txt"]
+    assert second["folders"] == []  # child folders only come with the first page
+
+    status, last = list_page(2, second["next_cursor"])
+    assert [f["filename"] for f in last["files"]] == ["file4.txt"]
+    assert last["next_cursor"] is None
+
+def test_one_extra_row_is_read_to_detect_the_next_page(listing):
+    status, page = list_page(5)
+
+    assert len(page["files"]) == 5 and page["next_cursor"] is None
+    file_queries = [params for sql, params in listing.executed if "FROM files" in sql]
+    assert file_queries[0][-1] == 6
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30=", folder_list_lambda.encode_cursor(START, "x")[:-4]])
+def test_malformed_cursor_is_a_bad_request(listing, cursor):
+    status, body = list_page(2, cursor)
+
+    assert status == 400 and "Invalid limit or cursor" in body["error"]
+    assert listing.executed == []
+
+def test_limit_is_capped(listing):
+    list_page(10 ** 6)
+    file_queries = [params for sql, params in listing.executed if "FROM files" in sql]
+    assert file_queries[0][-1] == folder_list_lambda.MAX_PAGE_SIZE + 1
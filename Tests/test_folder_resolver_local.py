@@ -0,0 +1,45 @@
+import pytest
+
+import folder_resolver
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+
+@pytest.fixture
+def lookups(monkeypatch):
+    folders = {(USER_ID, "/Projects"): "f-projects", (USER_ID, "/Projects/SparkDrive"): "f-spark", (USER_ID, "/Logs"): "f-logs"}
+    calls = []
+
+    def lookup(user_id, path):
+        calls.append(path)
+        return folders.get((user_id, path))
+
+    folder_resolver.clear()
+    monkeypatch.setattr(folder_resolver, "_lookup", lookup)
+    yield calls
+    folder_resolver.clear()
+
+def test_repeat_resolution_is_served_from_cache(lookups):
+    assert folder_resolver.resolve_folder_id(USER_ID, "/Projects") == "f-projects"
+    assert folder_resolver.resolve_folder_id(USER_ID, "/Projects") == "f-projects"
+    assert lookups == ["/Projects"]
+
+def test_missing_folders_are_not_cached(lookups):
+    assert folder_resolver.resolve_folder_id(USER_ID, "/Nope") is None
+    assert folder_resolver.resolve_folder_id(USER_ID, "/Nope") is None
+    assert lookups == ["/Nope", "/Nope"]
+
+def test_invalidate_drops_the_deleted_subtree_only(lookups):
+    for path in ("/Projects", "/Projects/SparkDrive", "/Logs"):
+        folder_resolver.resolve_folder_id(USER_ID, path)
+
+    folder_resolver.invalidate(USER_ID, "/Projects")
+    for path in ("/Projects", "/Projects/SparkDrive", "/Logs"):
+        folder_resolver.resolve_folder_id(USER_ID, path)
+
+    assert lookups[3:] == ["/Projects", "/Projects/SparkDrive"]
+
+def test_entries_expire_after_ttl(lookups, monkeypatch):
+    monkeypatch.setattr(folder_resolver, "CACHE_TTL", 0)
+    folder_resolver.resolve_folder_id(USER_ID, "/Logs")
+    folder_resolver.resolve_folder_id(USER_ID, "/Logs")
+    assert lookups == ["/Logs", "/Logs"]
@@ -0,0 +1,64 @@
+import os
+import time
+import json
+import pytest
+
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+import link_cache
+from link_cache import LinkCache
+import file_download_lambda
+
+def test_links_are_reused_for_most_of_their_lifetime(monkeypatch):
+    cache = LinkCache(max_entries=8)
+    now = time.time()
+    monkeypatch.setattr(link_cache, "REUSE_FRACTION", 0.8)
+
+    cache.put("fresh", "url-1", now + 300, now)
+    cache.put("late", "url-2", now + 30, now - 270)   # 90% of its lifetime gone
+
+    assert cache.get("fresh") == "url-1"
+    assert cache.get("late") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_cache_is_bounded():
+    cache = LinkCache(max_entries=2)
+    expires = time.time() + 300
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper(), expires)
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+
+@pytest.fixture
+def presigned(monkeypatch):
+    presigned = []
+
+    def presign(s3_key, filename=None):
+        presigned.append(s3_key)
+        return f"https://s3.example/{s3_key}?sig={len(presigned)}"
+
+    monkeypatch.setattr(file_download_lambda, "urls", LinkCache())
+    monkeypatch.setattr(file_download_lambda, "presign_download", presign)
+    return presigned
+
+EVENT = {"user_id": "u1", "file_id": "11111111-1111-1111-1111-111111111111"}
+
+def test_owner_downloads_reuse_the_presigned_url(fake_db, presigned):
+    fake_db.respond = lambda sql, params: [("blobs/u1/aaa", "report.pdf")]
+
+    first = file_download_lambda.lambda_handler(EVENT, None)
+    second = file_download_lambda.lambda_handler(EVENT, None)
+
+    assert first == second
+    assert json.loads(first["body"])["download_url"].endswith("sig=1")
+    assert len(fake_db.executed) == 2 and len(presigned) == 1
+
+def test_reupload_under_the_same_file_id_gets_a_fresh_url(fake_db, presigned):
+    fake_db.results = [[("blobs/u1/aaa", "report.pdf")], [("blobs/u1/bbb", "report.pdf")]]
+
+    before = json.loads(file_download_lambda.lambda_handler(EVENT, None)["body"])["download_url"]
+    after = json.loads(file_download_lambda.lambda_handler(EVENT, None)["body"])["download_url"]
+
+    assert before == "https://s3.example/blobs/u1/aaa?sig=1"
+    assert after == "https://s3.example/blobs/u1/bbb?sig=2"
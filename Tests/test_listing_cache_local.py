@@ -0,0 +1,71 @@
+from listing_cache import ListingCache, MemoryVersionStore
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+OTHER_USER_ID = "11111111-1111-1111-1111-111111111111"
+
+def make_cache(max_entries=8):
+    return ListingCache(MemoryVersionStore(), max_entries)
+
+def test_entry_is_served_until_the_user_changes_something():
+    cache = make_cache()
+    key = (USER_ID, "/Projects", 100)
+    version, cached = cache.get(key)
+    assert cached is None
+    cache.put(key, version, {"statusCode": 200, "body": "listing"})
+
+    assert cache.get(key)[1] == {"statusCode": 200, "body": "listing"}
+
+    cache.bump(USER_ID)
+    assert cache.get(key)[1] is None
+    assert cache.stats()["stale"] == 1
+
+def test_other_users_mutations_do_not_invalidate():
+    cache = make_cache()
+    key = (USER_ID, "/", 100)
+    version, _ = cache.get(key)
+    cache.put(key, version, {"statusCode": 200, "body": "listing"})
+
+    cache.bump(OTHER_USER_ID)
+    assert cache.get(key)[1] is not None
+
+def test_entry_built_during_a_mutation_is_never_served():
+    cache = make_cache()
+    key = (USER_ID, "/", 100)
+    version, _ = cache.get(key)
+    cache.bump(USER_ID)  # mutation commits while the listing is being built
+    cache.put(key, version, {"statusCode": 200, "body": "pre-mutation listing"})
+
+    assert cache.get(key)[1] is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    for path in ("/a", "/b"):
+        cache.put((USER_ID, path, 100), 0, {"body": path})
+    cache.get((USER_ID, "/a", 100))
+    cache.put((USER_ID, "/c", 100), 0, {"body": "/c"})
+
+    assert cache.get((USER_ID, "/b", 100))[1] is None
+    assert cache.get((USER_ID, "/a", 100))[1] == {"body": "/a"}
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hit_ratio"] == 2 / 3
+
+def test_unchanged_listing_revalidates_without_touching_the_database(monkeypatch, fake_db):
+    import folder_list_lambda
+
+    cache = make_cache()
+    monkeypatch.setattr(folder_list_lambda.listing_cache, "cache", cache)
+    event = {"user_id": USER_ID, "path": "/Projects", "limit": 100}
+    etag = folder_list_lambda.listing_etag(USER_ID, cache.version(USER_ID), "/Projects", 100, None)
+
+    fake_db.available = False
+
+    response = folder_list_lambda.lambda_handler({**event, "if_none_match": etag}, None)
+    assert response == {"statusCode": 304, "headers": {"ETag": etag}, "body": ""}
+    assert fake_db.connections == 0
+
+    cache.bump(USER_ID)
+    with_new_version = folder_list_lambda.listing_etag(USER_ID, cache.version(USER_ID), "/Projects", 100, None)
+    assert with_new_version != etag
+    folder_list_lambda.lambda_handler({**event, "if_none_match": etag}, None)
+    assert fake_db.connections == 1  # stale validator: the listing is rebuilt
@@ -0,0 +1,200 @@
+import io
+import json
+import os
+import psycopg2
+import pytest
+
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+import blobs
+import log_upload_lambda
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+FOLDER_ID = "0849d21b-7ab3-48e5-9508-e54963431b97"
+
+def make_record(message_id, **overrides):
+    message = {
+        "event": "upload",
+        "folder": FOLDER_ID,
+        "filename": "register.txt",
+        "s3_key": f"{FOLDER_ID}/register.txt",
+        "file_size": "12",
+        "user_id": USER_ID,
+    }
+    message.update(overrides)
+    return {"messageId": message_id, "body": json.dumps({"Message": json.dumps(message)})}
+
+@pytest.fixture
+def batches(monkeypatch):
+    written = []
+
+    def insert_metadata_batch(rows):
+        written.append(rows)
+        return []
+
+    monkeypatch.setattr(log_upload_lambda, "insert_metadata_batch", insert_metadata_batch)
+    return written
+
+def test_batch_is_written_once_and_only_bad_records_fail(batches):
+    event = {"Records": [
+        make_record("m1"),
+        make_record("m2", s3_key=f"{FOLDER_ID}/other.txt", filename="other.txt"),
+        make_record("m3", user_id="not-a-uuid"),
+        {"messageId": "m4", "body": "{not json"},
+    ]}
+    result = log_upload_lambda.lambda_handler(event, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m3"}, {"itemIdentifier": "m4"}]}
+    assert len(batches) == 1
+    assert [row[4] for row in batches[0]] == [f"{FOLDER_ID}/register.txt", f"{FOLDER_ID}/other.txt"]
+
+def test_repeated_key_in_batch_keeps_latest_upload(batches):
+    event = {"Records": [make_record("m1", file_size="12"), make_record("m2", file_size="99")]}
+    result = log_upload_lambda.lambda_handler(event, None)
+
+    assert result == {"batchItemFailures": []}
+    assert [row[5] for row in batches[0]] == [99]
+
+def test_db_failure_fails_every_parsed_record(monkeypatch):
+    def broken(rows):
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(log_upload_lambda, "insert_metadata_batch", broken)
+    event = {"Records": [make_record("m1"), make_record("m2", s3_key="k2")]}
+    result = log_upload_lambda.lambda_handler(event, None)
+
+    assert sorted(f["itemIdentifier"] for f in result["batchItemFailures"]) == ["m1", "m2"]
+
+def test_overwrite_moves_blob_reference(monkeypatch, fake_db):
+    old, new = "a" * 64, "b" * 64
+    # the row being overwritten held `old`
+    fake_db.respond = lambda sql, params: [(USER_ID, old)] if "SELECT user_id, content_sha256" in sql else []
+
+    adjusted = []
+    monkeypatch.setattr(log_upload_lambda, "execute_values", lambda *args, **kwargs: None)
+    monkeypatch.setattr(log_upload_lambda.listing_cache, "bump_version", lambda user_id, cur: None)
+    monkeypatch.setattr(log_upload_lambda.blobs, "adjust", lambda cur, deltas: adjusted.append(dict(deltas)))
+
+    row = log_upload_lambda.build_file_row(json.loads(json.loads(
+        make_record("m1", content_sha256=new, blob_key=f"blobs/{USER_ID}/{new}")["body"])["Message"]))
+    log_upload_lambda.insert_metadata_batch([row])
+
+    assert adjusted == [{(USER_ID, new): 1, (USER_ID, old): -1}]
+
+def test_rejected_row_fails_alone_and_the_rest_commit(monkeypatch, fake_db):
+    upserted = []
+
+    def execute_values(cursor, query, rows, page_size=None):
+        if any(row[4] == f"{FOLDER_ID}/orphan.txt" for row in rows):
+            raise psycopg2.IntegrityError("violates foreign key constraint files_folder_id_fkey")
+        upserted.extend(row[4] for row in rows)
+
+    monkeypatch.setattr(log_upload_lambda, "execute_values", execute_values)
+    monkeypatch.setattr(log_upload_lambda.listing_cache, "bump_version", lambda user_id, cur: None)
+    event = {"Records": [
+        make_record("m1"),
+        make_record("m2", s3_key=f"{FOLDER_ID}/orphan.txt", filename="orphan.txt"),
+        make_record("m3", s3_key=f"{FOLDER_ID}/other.txt", filename="other.txt"),
+    ]}
+
+    result = log_upload_lambda.lambda_handler(event, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m2"}]}
+    assert upserted == [f"{FOLDER_ID}/register.txt", f"{FOLDER_ID}/other.txt"]
+    savepoints = [sql for sql, _ in fake_db.executed if "SAVEPOINT" in sql]
+    assert savepoints == ["SAVEPOINT batch", "ROLLBACK TO SAVEPOINT batch",
+                          "SAVEPOINT file_row", "RELEASE SAVEPOINT file_row",
+                          "SAVEPOINT file_row", "ROLLBACK TO SAVEPOINT file_row",
+                          "SAVEPOINT file_row", "RELEASE SAVEPOINT file_row"]
+    assert fake_db.commits == 1
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.copies = []
+
+    def get_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key]), "Body": io.BytesIO(self.objects[Key])}
+
+    def copy(self, CopySource, Bucket, Key):
+        self.copies.append(Key)
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+CONTENT = b"large file body"
+DIGEST = blobs.digest_bytes(CONTENT)
+STAGING = blobs.staging_key(USER_ID, DIGEST, f"{FOLDER_ID}/big.bin")
+
+def staged_record(message_id, **overrides):
+    fields = dict(filename="big.bin", s3_key=f"{FOLDER_ID}/big.bin", file_size=len(CONTENT),
+                  content_sha256=DIGEST, blob_key=None, staging_key=STAGING)
+    fields.update(overrides)
+    return make_record(message_id, **fields)
+
+@pytest.fixture
+def staged(monkeypatch, fake_db, batches):
+    s3 = FakeS3({STAGING: CONTENT})
+    claims = []
+
+    def claim(cur, user_id, digest, size_bytes, codec=None, stored_bytes=None, s3_key=None):
+        claims.append(s3_key)
+        return s3_key, True, None, size_bytes
+
+    monkeypatch.setattr(log_upload_lambda, "s3", s3)
+    monkeypatch.setattr(log_upload_lambda.blobs, "touch", lambda cur, user_id, digest: None)
+    monkeypatch.setattr(log_upload_lambda.blobs, "claim", claim)
+    return s3, claims
+
+def test_verified_staged_upload_is_copied_to_a_blob_claimed_after_the_copy(staged, batches):
+    s3, claims = staged
+
+    result = log_upload_lambda.lambda_handler({"Records": [staged_record("m1")]}, None)
+
+    assert result == {"batchItemFailures": []}
+    assert len(s3.copies) == 1 and s3.copies[0].startswith(blobs.blob_key(USER_ID, DIGEST) + ".")
+    assert claims == s3.copies
+    assert s3.objects == {s3.copies[0]: CONTENT}  # staging removed once the row was written
+    assert batches[0][0][7] == s3.copies[0]
+
+def test_staged_upload_not_matching_its_sha256_is_dropped(staged, batches):
+    s3, claims = staged
+    s3.objects[STAGING] = b"not what was hashed"
+
+    result = log_upload_lambda.lambda_handler({"Records": [staged_record("m1", file_size=19)]}, None)
+
+    assert result == {"batchItemFailures": []}
+    assert s3.objects == {} and claims == [] and batches == []
+
+def test_staged_upload_of_existing_content_reuses_the_blob(staged, batches, monkeypatch):
+    s3, claims = staged
+    existing = (blobs.blob_key(USER_ID, DIGEST), len(CONTENT), "gzip", 9)
+    monkeypatch.setattr(log_upload_lambda.blobs, "touch", lambda cur, user_id, digest: existing)
+    s3.get_object = None  # content the account has is not read again
+
+    log_upload_lambda.lambda_handler({"Records": [staged_record("m1")]}, None)
+
+    assert s3.objects == {} and s3.copies == [] and claims == []
+    assert batches[0][0][7:] == (existing[0], "gzip", 9)
+
+def test_copy_that_loses_the_claim_is_deleted(staged, batches, monkeypatch):
+    s3, claims = staged
+    winner = blobs.blob_key(USER_ID, DIGEST)
+    monkeypatch.setattr(log_upload_lambda.blobs, "claim",
+                        lambda cur, user_id, digest, size_bytes, s3_key=None, **kwargs: (winner, False, None, size_bytes))
+
+    log_upload_lambda.lambda_handler({"Records": [staged_record("m1")]}, None)
+
+    assert s3.objects == {}
+    assert batches[0][0][7] == winner
+
+def test_staging_is_kept_when_the_row_is_not_written(staged, monkeypatch):
+    s3, claims = staged
+    monkeypatch.setattr(log_upload_lambda, "insert_metadata_batch", lambda rows: rows)
+
+    result = log_upload_lambda.lambda_handler({"Records": [staged_record("m1")]}, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert STAGING in s3.objects
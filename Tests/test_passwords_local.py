@@ -0,0 +1,36 @@
+import pytest
+
+import passwords
+
+@pytest.fixture(autouse=True)
+def cheap_policy(monkeypatch):
+    monkeypatch.setattr(passwords, "SCHEME", "bcrypt")
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 5)
+    monkeypatch.setattr(passwords, "PBKDF2_ROUNDS", 1000)
+
+def test_both_schemes_verify():
+    for scheme in passwords.SCHEMES:
+        stored = passwords.hash_password("hunter2", scheme)
+        assert passwords.describe(stored)[0] == scheme
+        assert passwords.verify("hunter2", stored)
+        assert not passwords.verify("hunter3", stored)
+
+def test_current_policy_hash_is_left_alone():
+    stored = passwords.hash_password("hunter2")
+    assert passwords.verify_and_update("hunter2", stored) == (True, None)
+
+def test_old_scheme_and_old_cost_are_upgraded_on_login():
+    legacy = passwords.hash_password("hunter2", "pbkdf2_sha256").encode()  # bytea column
+    ok, new_hash = passwords.verify_and_update("hunter2", memoryview(legacy))
+    assert ok and passwords.describe(new_hash) == ("bcrypt", 5)
+
+    weaker = passwords.hash_password("hunter2", "bcrypt", rounds=4)
+    ok, new_hash = passwords.verify_and_update("hunter2", weaker)
+    assert ok and passwords.describe(new_hash) == ("bcrypt", 5)
+
+def test_wrong_password_never_rehashes():
+    legacy = passwords.hash_password("hunter2", "pbkdf2_sha256")
+    assert passwords.verify_and_update("wrong", legacy) == (False, None)
+
+def test_unknown_formats_do_not_verify():
+    assert not passwords.verify("hunter2", "plaintext")
@@ -0,0 +1,53 @@
+import os
+import json
+import time
+import pytest
+import jwt
+
+os.environ.setdefault("JWT_SECRET", "testsecret")
+
+import auth
+import refresh_tokens
+import refresh_token_lambda
+
+def test_refresh_tokens_are_stored_hashed(fake_db):
+    tokens = refresh_tokens.token_pair(fake_db.cursor(), "u1")
+
+    sql, params = fake_db.executed[0]
+    assert sql.startswith("INSERT INTO refresh_tokens")
+    assert params[0] == refresh_tokens.hash_token(tokens["refresh_token"])
+    assert tokens["refresh_token"] not in params
+
+    claims = jwt.decode(tokens["token"], auth.SECRETS[0], algorithms=["HS256"])
+    assert claims["user_id"] == "u1"
+    assert claims["exp"] - time.time() <= refresh_tokens.ACCESS_TOKEN_MINUTES * 60
+
+def test_rotation_keeps_the_family(fake_db):
+    fake_db.results = [[("u1", "fam-1")]]
+    user_id, tokens = refresh_tokens.rotate(fake_db.cursor(), "presented")
+
+    assert user_id == "u1"
+    assert fake_db.executed[0][0].startswith("UPDATE refresh_tokens SET used_at = NOW()")
+    assert fake_db.executed[1][1][2] == "fam-1"
+
+def test_token_rotated_moments_ago_by_a_concurrent_refresh_gets_a_new_pair(fake_db):
+    fake_db.results = [[], [("u1", "fam-1")]]  # already used, but within the grace window
+    user_id, tokens = refresh_tokens.rotate(fake_db.cursor(), "presented")
+
+    assert user_id == "u1" and tokens["refresh_token"]
+    statements = [sql for sql, _ in fake_db.executed]
+    assert "used_at > NOW() - make_interval" in statements[1]
+    assert statements[2].startswith("INSERT INTO refresh_tokens") and fake_db.executed[2][1][2] == "fam-1"
+    assert not any("SET revoked_at" in sql for sql in statements)
+
+def test_replay_after_the_grace_window_revokes_the_family(fake_db):
+    with pytest.raises(ValueError):
+        refresh_tokens.rotate(fake_db.cursor(), "replayed")
+
+    assert fake_db.executed[2][0].startswith("UPDATE refresh_tokens SET revoked_at = NOW()")
+
+def test_rejected_refresh_still_commits_the_family_revocation(fake_db):
+    response = refresh_token_lambda.lambda_handler({"body": json.dumps({"refresh_token": "replayed"})}, None)
+
+    assert response["statusCode"] == 401
+    assert (fake_db.commits, fake_db.rollbacks) == (1, 0)
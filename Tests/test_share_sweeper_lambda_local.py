@@ -0,0 +1,32 @@
+import json
+import pytest
+
+import share_sweeper_lambda
+
+@pytest.fixture
+def expired(monkeypatch, fake_db):
+    state = {"remaining": 0, "db": fake_db}
+
+    def delete_expired_batch(cur, batch_size):
+        removed = min(batch_size, state["remaining"])
+        state["remaining"] -= removed
+        return removed
+
+    monkeypatch.setattr(share_sweeper_lambda, "delete_expired_batch", delete_expired_batch)
+    return state
+
+def test_sweeper_deletes_in_bounded_committed_batches(expired):
+    expired["remaining"] = 2500
+
+    body = json.loads(share_sweeper_lambda.lambda_handler({"batch_size": 1000}, None)["body"])
+
+    assert body == {"deleted": 2500, "batches": 3, "complete": True}
+    assert expired["db"].commits == 3
+
+def test_sweeper_stops_at_max_batches_and_reports_incomplete(expired):
+    expired["remaining"] = 5000
+
+    body = json.loads(share_sweeper_lambda.lambda_handler({"batch_size": 1000, "max_batches": 2}, None)["body"])
+
+    assert body == {"deleted": 2000, "batches": 2, "complete": False}
+    assert expired["remaining"] == 3000
@@ -0,0 +1,290 @@
+import os
+import sys
+import gzip
+import hashlib
+import json
+import threading
+import http.server
+from urllib.parse import urlparse, parse_qs
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sparkdrive_client import RangedDownload, SparkDriveClient, SparkDriveError
+
+KiB = 1024
+
+# Local S3 stand-in serving one object with Range/If-Match support, plus the download API that
+# hands out presigned URLs. A URL is "signed" with the generation it was issued in; every
+# expire_every-th request moves the generation on, so older URLs get 403. drop_every cuts every
+# Nth response off halfway through its body; fail_after answers 500 after that many requests.
+class StandinS3(http.server.ThreadingHTTPServer):
+    def __init__(self, body, encoding=None):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.body = body
+        self.encoding = encoding
+        self.etag = '"v1"'
+        self.generation = 0
+        self.expire_every = None
+        self.drop_every = None
+        self.fail_after = None
+        self.requests = 0
+        self.dropped = 0
+        self.api_calls = 0
+        self.served = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def url(self):
+        return f"{self.base}/bucket/blob?sig={self.generation}"
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.api_calls += 1
+            files = [{"file_id": file_id, "download_url": server.url()} for file_id in payload["file_ids"]]
+        self._reply(200, json.dumps({"files": files}).encode(), {"Content-Type": "application/json"})
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            n = server.requests
+            if server.expire_every and n % server.expire_every == 0:
+                server.generation += 1
+            expired = int(parse_qs(urlparse(self.path).query)["sig"][0]) < server.generation
+            failing = server.fail_after is not None and n > server.fail_after
+            drop = bool(server.drop_every) and n % server.drop_every == 0
+
+        if expired:
+            return self._reply(403, b"<Error><Code>AccessDenied</Code><Message>Request has expired</Message></Error>")
+        if failing:
+            return self._reply(500, b"InternalError")
+        if self.headers.get("If-Match") not in (None, server.etag):
+            return self._reply(412, b"PreconditionFailed")
+
+        start, end = (int(v) for v in self.headers["Range"].split("=")[1].split("-"))
+        end = min(end, len(server.body) - 1)
+        data = server.body[start:end + 1]
+        headers = {"Content-Range": f"bytes {start}-{end}/{len(server.body)}", "ETag": server.etag}
+        if server.encoding:
+            headers["Content-Encoding"] = server.encoding
+        if drop and len(data) > 1:
+            with server.lock:
+                server.dropped += 1
+            self._reply(206, data[:len(data) // 2], headers, length=len(data))
+            self.close_connection = True
+            return
+        with server.lock:
+            server.served += len(data)
+        self._reply(206, data, headers)
+
+    def _reply(self, status, data, headers=None, length=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data) if length is None else length))
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def standin():
+    servers = []
+
+    def start(body, encoding=None):
+        server = StandinS3(body, encoding)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(RangedDownload, "_backoff", lambda self, attempt: None)
+
+def test_parallel_download_survives_drops_and_url_expiry(standin, tmp_path):
+    body = os.urandom(3 * 1024 * KiB + 123)
+    server = standin(body)
+    server.drop_every = 4
+    server.expire_every = 9
+    client = SparkDriveClient("token", api_base=server.base)
+    target = str(tmp_path / "big.bin")
+
+    result = client.download_file("f1", target, workers=4, chunk_size=256 * KiB)
+
+    with open(target, "rb") as f:
+        assert f.read() == body
+    assert server.dropped > 0 and result["url_refreshes"] > 0
+    assert server.api_calls == 1 + result["url_refreshes"]
+    assert result["bytes_fetched"] == len(body)  # dropped ranges resume at the next byte
+    assert sorted(os.listdir(tmp_path)) == ["big.bin"]
+
+def test_interrupted_download_resumes_from_the_journal(standin, tmp_path):
+    body = os.urandom(2 * 1024 * KiB)
+    server = standin(body)
+    server.fail_after = 5  # probe + 4 chunks, then the "network" goes away
+    target = str(tmp_path / "big.bin")
+
+    def download():
+        return RangedDownload(requests.Session(), server.url, target, workers=1, chunk_size=128 * KiB, retries=1).run()
+
+    with pytest.raises(SparkDriveError):
+        download()
+    with open(target + ".part.journal") as f:
+        assert json.load(f)["done"] == [0, 1, 2, 3]
+
+    server.fail_after = None
+    server.served = 0
+    result = download()
+
+    with open(target, "rb") as f:
+        assert f.read() == body
+    assert result["resumed_chunks"] == 4
+    assert server.served == len(body) - 4 * 128 * KiB + 1  # the rest, plus the one-byte probe
+    assert not os.path.exists(target + ".part.journal")
+
+def test_changed_file_is_not_stitched_together(standin, tmp_path):
+    server = standin(os.urandom(512 * KiB))
+    target = str(tmp_path / "big.bin")
+    download = RangedDownload(requests.Session(), server.url, target, workers=1, chunk_size=128 * KiB)
+    original_probe = download._probe
+
+    def probe_then_replace():
+        found = original_probe()
+        server.etag = '"v2"'
+        return found
+
+    download._probe = probe_then_replace
+    with pytest.raises(SparkDriveError, match="changed"):
+        download.run()
+
+def test_compressed_object_is_decoded_after_download(standin, tmp_path):
+    text = b"".join(b"[INFO] line %d of the app log\n" % i for i in range(40000))
+    server = standin(gzip.compress(text), encoding="gzip")
+    target = str(tmp_path / "app.log")
+
+    result = RangedDownload(requests.Session(), server.url, target, workers=3, chunk_size=64 * KiB).run()
+
+    with open(target, "rb") as f:
+        assert f.read() == text
+    assert result["encoding"] == "gzip" and result["size"] == len(server.body)
+
+class Response:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}")
+
+# Plays both the upload API (posts) and S3 (part PUTs). The API rounds part_size up to
+# server_part_size; fail_parts answer 500, expired_parts answer 403 once.
+class UploadSession:
+    def __init__(self, server_part_size, deduplicated=False):
+        self.server_part_size = server_part_size
+        self.deduplicated = deduplicated
+        self.posts = []
+        self.parts = {}
+        self.fail_parts = set()
+        self.expired_parts = set()
+        self.lock = threading.Lock()
+
+    def post(self, url, json, headers):
+        with self.lock:
+            self.posts.append(json)
+        action = json["action"]
+        if action == "initiate_upload":
+            if self.deduplicated:
+                return Response(200, {"deduplicated": True, "key": "f/big.bin"})
+            count = -(-json["file_size"] // self.server_part_size)
+            return Response(200, {"upload_id": "up-1", "part_size": self.server_part_size, "part_count": count,
+                                  "parts": [{"part_number": n, "url": f"s3://part/{n}?sig=1"} for n in range(1, count + 1)]})
+        if action == "upload_part_urls":
+            return Response(200, {"parts": [{"part_number": n, "url": f"s3://part/{n}?sig=2"} for n in json["part_numbers"]]})
+        return Response(200, {"action": action})
+
+    def put(self, url, data):
+        n = int(url.split("/")[-1].split("?")[0])
+        with self.lock:
+            if n in self.fail_parts:
+                return Response(500)
+            if n in self.expired_parts and url.endswith("sig=1"):
+                return Response(403)
+            self.parts[n] = data
+        return Response(200, headers={"ETag": f'"etag-{n}"'})
+
+def local_file(tmp_path, size):
+    path = tmp_path / "big.bin"
+    body = os.urandom(size)
+    path.write_bytes(body)
+    return str(path), body
+
+def test_large_upload_sends_parts_of_the_size_the_server_chose(tmp_path):
+    path, body = local_file(tmp_path, 10 * KiB + 5)
+    session = UploadSession(server_part_size=4 * KiB)
+    client = SparkDriveClient("token", api_base="https://api.example", session=session)
+
+    result = client.upload_large_file(path, "/Logs", part_size=KiB, concurrency=3)
+
+    assert result == {"action": "complete_upload"}
+    assert session.posts[0]["part_size"] == KiB
+    assert [len(session.parts[n]) for n in sorted(session.parts)] == [4 * KiB, 4 * KiB, 2 * KiB + 5]
+    assert b"".join(session.parts[n] for n in sorted(session.parts)) == body
+    complete = session.posts[-1]
+    assert complete["parts"] == [{"part_number": n, "etag": f'"etag-{n}"'} for n in (1, 2, 3)]
+    assert complete["folder"] == "/Logs" and complete["filename"] == "big.bin"
+    assert complete["sha256"] == hashlib.sha256(body).hexdigest()
+    assert "key" not in complete  # the server rebuilds every key from folder and filename
+
+def test_expired_part_url_is_reissued_once(tmp_path):
+    path, body = local_file(tmp_path, 9 * KiB)
+    session = UploadSession(server_part_size=4 * KiB)
+    session.expired_parts = {2}
+
+    SparkDriveClient("token", session=session).upload_large_file(path, "/Logs")
+
+    reissue = [p for p in session.posts if p["action"] == "upload_part_urls"]
+    assert [p["part_numbers"] for p in reissue] == [[2]]
+    assert b"".join(session.parts[n] for n in sorted(session.parts)) == body
+
+def test_failed_part_aborts_the_upload(tmp_path):
+    path, _ = local_file(tmp_path, 9 * KiB)
+    session = UploadSession(server_part_size=4 * KiB)
+    session.fail_parts = {3}
+
+    with pytest.raises(requests.HTTPError):
+        SparkDriveClient("token", session=session).upload_large_file(path, "/Logs")
+
+    actions = [p["action"] for p in session.posts]
+    assert actions[-1] == "abort_upload" and "complete_upload" not in actions
+    assert session.posts[-1]["upload_id"] == "up-1" and session.posts[-1]["folder"] == "/Logs"
+
+def test_content_the_account_has_is_not_sent_again(tmp_path):
+    path, _ = local_file(tmp_path, 9 * KiB)
+    session = UploadSession(server_part_size=4 * KiB, deduplicated=True)
+
+    result = SparkDriveClient("token", session=session).upload_large_file(path, "/Logs")
+
+    assert result["deduplicated"] is True
+    assert session.parts == {} and [p["action"] for p in session.posts] == ["initiate_upload"]
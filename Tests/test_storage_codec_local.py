@@ -0,0 +1,34 @@
+import gzip
+import io
+import os
+import pytest
+
+import storage_codec
+
+LOG = b"".join(b"[INFO] 2025-08-01 12:00:%02d worker-%d handled request\n" % (i % 60, i % 7) for i in range(400))
+
+def test_text_is_compressed_and_round_trips():
+    codec, payload = storage_codec.encode(LOG, "gzip")
+
+    assert codec == "gzip" and len(payload) < len(LOG) / 5
+    assert storage_codec.decompress(codec, payload) == LOG
+    assert storage_codec.open_decoded(codec, io.BytesIO(payload)).read() == LOG
+    assert storage_codec.put_args(codec) == {"ContentEncoding": "gzip"}
+
+@pytest.mark.parametrize("data", [
+    gzip.compress(LOG),
+    b"PK\x03\x04" + LOG,                   # zip container, e.g. a .docx
+    b"\x89PNG\r\n\x1a\n" + LOG,
+    b"\x00\x00\x00\x18ftypmp42" + LOG,
+])
+def test_compressed_formats_are_stored_as_is(data):
+    assert storage_codec.encode(data, "gzip") == (None, data)
+
+def test_small_or_incompressible_content_is_stored_as_is():
+    noise = os.urandom(64 * 1024)
+    assert storage_codec.encode(noise, "gzip") == (None, noise)
+    assert storage_codec.encode(LOG[:100], "gzip") == (None, LOG[:100])
+
+def test_disabled_codec_stores_everything_as_is(monkeypatch):
+    monkeypatch.setattr(storage_codec, "CODEC", "none")
+    assert storage_codec.encode(LOG) == (None, LOG)
@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import subprocess
+import textwrap
+
+UI_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../UI"))
+MiB = 1024 * 1024
+
+# Runs one streamed upload in a fresh interpreter and reports its peak RSS. The file is a sparse
+# temp file and the S3 stand-in reads and discards each part, so only the upload path itself
+# can make the peak grow with the file size.
+SCRIPT = textwrap.dedent("""
+    import sys, json, hashlib, resource, tempfile, threading, http.server
+    import requests
+    sys.path.insert(0, sys.argv[1])
+    import uploads
+
+    size = int(sys.argv[2])
+    received = {"bytes": 0, "parts": 0}
+
+    class StandinS3(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_PUT(self):
+            remaining = int(self.headers["Content-Length"])
+            digest = hashlib.md5()
+            while remaining:
+                chunk = self.rfile.read(min(remaining, 64 * 1024))
+                digest.update(chunk)
+                remaining -= len(chunk)
+                received["bytes"] += len(chunk)
+            received["parts"] += 1
+            self.send_response(200)
+            self.send_header("ETag", '"%s"' % digest.hexdigest())
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandinS3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % server.server_address[1]
+
+    class Response:
+        def __init__(self, body):
+            self.status_code, self.body, self.text = 200, body, json.dumps(body)
+        def json(self):
+            return self.body
+
+    def post(url, payload):
+        if payload["action"] == "initiate_upload":
+            part_size = payload["part_size"]
+            count = -(-payload["file_size"] // part_size)
+            return Response({"upload_id": "u1", "part_size": part_size,
+                             "parts": [{"part_number": n, "url": "%s/part/%d" % (base, n)} for n in range(1, count + 1)]})
+        return Response({"status": "success", "parts": len(payload.get("parts", []))})
+
+    with tempfile.TemporaryFile() as spooled:
+        spooled.truncate(size)
+        result = uploads.stream_upload(post, requests.Session(), "https://api/upload", "/Big", "big.bin",
+                                       spooled, uploads.stream_size(spooled))
+
+    print(json.dumps({"peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      "received": received["bytes"], "parts": received["parts"], "completed": result["parts"]}))
+""")
+
+def profile(size):
+    out = subprocess.run([sys.executable, "-c", SCRIPT, UI_DIR, str(size)],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def test_streamed_upload_peak_rss_does_not_grow_with_file_size():
+    small, large = profile(16 * MiB), profile(256 * MiB)
+
+    assert small["received"] == 16 * MiB and large["received"] == 256 * MiB
+    assert large["parts"] == large["completed"] == 32
+    # 16x the data, same memory: allow a few MiB of allocator noise
+    assert large["peak_kb"] - small["peak_kb"] < 8 * 1024
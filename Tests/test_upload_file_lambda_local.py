@@ -0,0 +1,264 @@
+import base64
+import io
+import json
+import os
+import threading
+import time
+import pytest
+import jwt
+
+os.environ.setdefault("JWT_SECRET", "testsecret")
+os.environ.setdefault("S3_BUCKET", "sparkdrive-test")
+os.environ.setdefault("SNS_TOPIC_ARN", "arn:aws:sns:us-east-2:000000000000:sparkdrive-test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+
+import blobs
+import upload_file_lambda
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+
+# Multipart uploads complete with whatever bytes the test put in `uploaded`
+class FakeS3:
+    def __init__(self):
+        self.keys = []
+        self.objects = {}
+        self.uploaded = b""
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if Body == b"denied":
+            raise RuntimeError("AccessDenied")
+        self.keys.append(Key)
+        self.objects[Key] = Body
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.example/{Params['Key']}?part={Params.get('PartNumber')}"
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": f"upload-{len(self.keys)}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.keys.append(Key)
+        self.objects[Key] = self.uploaded
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append((Key, UploadId))
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key]), "Body": io.BytesIO(self.objects[Key])}
+
+    def copy(self, CopySource, Bucket, Key):
+        self.keys.append(Key)
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+class FakeSNS:
+    def __init__(self):
+        self.batches = []
+
+    def publish(self, TopicArn, Message):
+        self.batches.append([{"Message": Message}])
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.batches.append(PublishBatchRequestEntries)
+        return {"Successful": [], "Failed": []}
+
+# Stands in for the blobs table: content the account already has is claimed, not created
+class FakeBlobs:
+    def __init__(self):
+        self.sizes = {}
+        self.lock = threading.Lock()
+
+    def claim(self, cur, user_id, digest, size_bytes, codec=None, stored_bytes=None):
+        with self.lock:
+            created = digest not in self.sizes
+            self.sizes.setdefault(digest, (size_bytes, codec, stored_bytes))
+        return (blobs.blob_key(user_id, digest), created, *self.sizes[digest][1:])
+
+    def touch(self, cur, user_id, digest):
+        if digest in self.sizes:
+            return (blobs.blob_key(user_id, digest), *self.sizes[digest])
+        return None
+
+@pytest.fixture
+def aws(monkeypatch, fake_db):
+    s3, sns, lookups = FakeS3(), FakeSNS(), []
+    store = FakeBlobs()
+    monkeypatch.setattr(upload_file_lambda.blobs, "claim", store.claim)
+    monkeypatch.setattr(upload_file_lambda.blobs, "touch", store.touch)
+
+    def check_folder_exists(user_id, path):
+        lookups.append(path)
+        return {"exists": True, "folder_id": "f-logs"} if path == "/Logs" else {"exists": False}
+
+    monkeypatch.setattr(upload_file_lambda, "s3", s3)
+    monkeypatch.setattr(upload_file_lambda, "sns", sns)
+    monkeypatch.setattr(upload_file_lambda, "check_folder_exists", check_folder_exists)
+    return s3, sns, lookups
+
+def api_event(body):
+    token = jwt.encode({"user_id": USER_ID}, os.environ["JWT_SECRET"], algorithm="HS256")
+    return {"headers": {"Authorization": f"Bearer {token}"}, "body": json.dumps(body)}
+
+def batch_event(files):
+    return api_event({"action": "upload_batch", "files": files})
+
+def encoded(folder, filename, text="x"):
+    return {"folder": folder, "filename": filename, "content": base64.b64encode(text.encode()).decode()}
+
+def test_upload_batch_resolves_folders_once_and_publishes_in_batches(aws):
+    s3, sns, lookups = aws
+    files = [encoded("/Logs", f"app{i}.log", f"line {i}") for i in range(12)]
+
+    response = upload_file_lambda.lambda_handler(batch_event(files), None)
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 200
+    assert body["message"] == "12 of 12 file(s) uploaded."
+    assert lookups == ["/Logs"]
+    assert sorted(s3.keys) == sorted(blobs.blob_key(USER_ID, blobs.digest_bytes(f"line {i}".encode())) for i in range(12))
+    assert [r["key"] for r in body["results"]] == [f"f-logs/app{i}.log" for i in range(12)]
+    assert [len(b) for b in sns.batches] == [10, 2]
+
+def test_identical_content_is_written_once(aws):
+    s3, sns, lookups = aws
+    files = [encoded("/Logs", "a.log", "same"), encoded("/Logs", "b.log", "same"), encoded("/Logs", "c.log", "other")]
+
+    body = json.loads(upload_file_lambda.lambda_handler(batch_event(files), None)["body"])
+    single = json.loads(upload_file_lambda.lambda_handler(api_event(encoded("/Logs", "d.log", "same")), None)["body"])
+
+    assert len(s3.keys) == 2
+    assert sorted(r["deduplicated"] for r in body["results"]) == [False, False, True]
+    assert single["deduplicated"] is True
+    messages = [json.loads(e["Message"]) for b in sns.batches for e in b]
+    assert messages[0]["blob_key"] == messages[1]["blob_key"] != messages[2]["blob_key"]
+
+def test_initiate_upload_skips_content_the_account_has(aws, monkeypatch):
+    s3, sns, lookups = aws
+    published = []
+    monkeypatch.setattr(upload_file_lambda, "publish_upload_event", lambda *args: published.append(args))
+    upload_file_lambda.lambda_handler(batch_event([encoded("/Logs", "a.log", "x" * 100)]), None)
+    digest = blobs.digest_bytes(b"x" * 100)
+
+    body = json.loads(upload_file_lambda.lambda_handler(api_event({
+        "action": "initiate_upload", "folder": "/Logs", "filename": "copy.log", "file_size": 100, "sha256": digest
+    }), None)["body"])
+
+    assert body["deduplicated"] is True and "upload_id" not in body
+    assert published[0][2] == "f-logs/copy.log" and published[0][6] == blobs.blob_key(USER_ID, digest)
+
+def test_upload_batch_reports_each_failure_separately(aws):
+    s3, sns, lookups = aws
+    files = [
+        encoded("/Logs", "ok.txt"),
+        encoded("/Secret", "hidden.txt"),
+        encoded("/Logs", "denied.txt", "denied"),
+        {"folder": "/Logs", "filename": "empty.txt"},
+    ]
+
+    body = json.loads(upload_file_lambda.lambda_handler(batch_event(files), None)["body"])
+
+    assert [r["status"] for r in body["results"]] == ["success", "error", "error", "error"]
+    assert body["results"][1]["message"] == "Folder does not exist"
+    assert body["results"][2]["message"] == "Upload failed: AccessDenied"
+    assert [json.loads(e["Message"])["filename"] for b in sns.batches for e in b] == ["ok.txt"]
+
+def test_upload_batch_rejects_oversized_batches(aws):
+    files = [encoded("/Logs", f"{i}.txt") for i in range(upload_file_lambda.BATCH_MAX_FILES + 1)]
+    assert upload_file_lambda.lambda_handler(batch_event(files), None)["statusCode"] == 400
+
+def multipart(action, digest, **fields):
+    return api_event({"action": action, "folder": "/Logs", "filename": "big.bin", "sha256": digest, **fields})
+
+def complete_multipart(content, digest):
+    upload = json.loads(upload_file_lambda.lambda_handler(multipart("initiate_upload", digest, file_size=len(content)), None)["body"])
+    parts = [{"part_number": 1, "etag": '"e1"'}]
+    return upload, upload_file_lambda.lambda_handler(multipart("complete_upload", digest, upload_id=upload["upload_id"], parts=parts), None)
+
+def test_multipart_parts_are_staged_and_left_for_the_consumer_to_verify(aws):
+    s3, sns, lookups = aws
+    s3.uploaded = b"large file body"
+    digest = blobs.digest_bytes(s3.uploaded)
+    s3.get_object = None  # completing must not read the object back
+
+    upload, response = complete_multipart(s3.uploaded, digest)
+
+    staging = blobs.staging_key(USER_ID, digest, "f-logs/big.bin")
+    assert upload["parts"][0]["url"].startswith(f"https://s3.example/{staging}?")
+    assert response["statusCode"] == 200
+    assert s3.objects == {staging: b"large file body"}
+    message = json.loads(sns.batches[0][0]["Message"])
+    assert message["staging_key"] == staging and message["content_sha256"] == digest
+    assert message["blob_key"] is None and message["file_size"] == len(b"large file body")
+
+def test_batch_writers_never_outnumber_the_connection_pool(aws, monkeypatch):
+    s3, sns, lookups = aws
+    monkeypatch.setattr(upload_file_lambda.db, "POOL_SIZE", 2)
+    active, peak, lock = [0], [0], threading.Lock()
+    put_object = s3.put_object
+
+    def slow_put(**kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        put_object(**kwargs)
+        with lock:
+            active[0] -= 1
+
+    monkeypatch.setattr(s3, "put_object", slow_put)
+    upload_file_lambda.lambda_handler(batch_event([encoded("/Logs", f"{i}.log", f"line {i}") for i in range(12)]), None)
+
+    assert len(s3.keys) == 12 and peak[0] <= 2
+
+def upload_call(action, **fields):
+    response = upload_file_lambda.lambda_handler(api_event({"action": action, "folder": "/Logs", "filename": "big.bin", **fields}), None)
+    return response["statusCode"], json.loads(response["body"])
+
+def test_part_size_is_raised_to_the_s3_minimum_and_the_part_limit(aws):
+    MiB = 1024 * 1024
+
+    status, small_parts = upload_call("initiate_upload", file_size=12 * MiB, part_size=1024)
+    status, huge_file = upload_call("initiate_upload", file_size=100_000 * MiB)
+
+    assert small_parts["part_size"] == upload_file_lambda.MIN_PART_SIZE and small_parts["part_count"] == 3
+    assert huge_file["part_count"] <= upload_file_lambda.MAX_PARTS
+    assert huge_file["part_size"] == -(-100_000 * MiB // upload_file_lambda.MAX_PARTS)
+    assert len(huge_file["parts"]) == huge_file["part_count"]
+
+def test_part_keys_are_always_rebuilt_from_the_folder(aws):
+    s3, sns, lookups = aws
+
+    status, issued = upload_call("upload_part_urls", upload_id="up-1", part_numbers=[2], key="someone-else/file.bin")
+    assert status == 200 and issued["parts"][0]["url"] == "https://s3.example/f-logs/big.bin?part=2"
+
+    status, refused = upload_call("upload_part_urls", upload_id="up-1", part_numbers=[2], folder="/Secret")
+    assert status == 400
+
+    status, refused = upload_call("initiate_upload", file_size=10, filename="../escape.bin")
+    assert status == 400
+
+def test_abort_targets_the_rebuilt_key(aws):
+    s3, sns, lookups = aws
+    digest = blobs.digest_bytes(b"big")
+
+    status, body = upload_call("abort_upload", upload_id="up-1", sha256=digest, key="blobs/victim")
+
+    assert status == 200
+    assert s3.aborted == [(blobs.staging_key(USER_ID, digest, "f-logs/big.bin"), "up-1")]
+
+def test_complete_without_a_digest_publishes_the_stored_size(aws):
+    s3, sns, lookups = aws
+    s3.uploaded = b"twelve bytes"
+
+    status, body = upload_call("complete_upload", upload_id="up-1", parts=[{"part_number": 1, "etag": '"e1"'}])
+
+    assert status == 200 and body == {"status": "success", "message": "File uploaded successfully.",
+                                      "key": "f-logs/big.bin", "file_size": 12}
+    message = json.loads(sns.batches[0][0]["Message"])
+    assert message["s3_key"] == "f-logs/big.bin" and message["file_size"] == 12 and "blob_key" not in message
@@ -2,12 +2,16 @@ import pytest
 import jwt
 import json
 import os
+import io
+import sys
+import types
 from datetime import datetime, timedelta
 
 # Setup for testing
 JWT_SECRET = "testsecret"
 os.environ["JWT_SECRET"] = JWT_SECRET
 
+import vpc_bridge_lambda
 from vpc_bridge_lambda import lambda_handler
 
 def make_token(user_id="00000000-0000-0000-0000-000000000000", exp_hours=12):
@@ -54,5 +58,136 @@ def test_unknown_action():
     assert result["statusCode"] == 400
     assert "Unknown action" in result["body"]
 
-# Additional success-path tests would require mock forwarding logic,
-# which can be added using unittest.mock or moto for AWS mocking.
+# Local stand-in for folder_list_lambda
+def standin_folder_list(event, context):
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"folders": [{"name": "Alpha", "path": event["path"] + "/Alpha"}], "files": []})
+    }
+
+# Local stand-in for the Lambda API: JSON round-trips the payload through the named handler
+class StandinLambdaClient:
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        result = self.handlers[FunctionName](json.loads(Payload), None)
+        return {"Payload": io.BytesIO(json.dumps(result).encode())}
+
+@pytest.fixture
+def standin_targets(monkeypatch):
+    module = types.ModuleType("folder_list_lambda")
+    module.lambda_handler = standin_folder_list
+    monkeypatch.setitem(sys.modules, "folder_list_lambda", module)
+    monkeypatch.setenv("folder_list_lambda", "sparkdrive-folder-list")
+    monkeypatch.setattr(vpc_bridge_lambda, "_lambda_client",
+                        StandinLambdaClient({"sparkdrive-folder-list": standin_folder_list}))
+
+def test_local_and_remote_dispatch_match(standin_targets, monkeypatch):
+    event = make_event("list_contents", path="/Projects", jwt_token=make_token())
+
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "remote")
+    remote = lambda_handler(event, None)
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "local")
+    local = lambda_handler(event, None)
+
+    assert remote["statusCode"] == 200
+    assert local == remote
+
+def test_local_dispatch_reports_handler_errors_like_lambda(monkeypatch):
+    def broken(event, context):
+        raise KeyError("DB_HOST")
+
+    module = types.ModuleType("folder_list_lambda")
+    module.lambda_handler = broken
+    monkeypatch.setitem(sys.modules, "folder_list_lambda", module)
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "local")
+
+    result = lambda_handler(make_event("list_contents", path="/", jwt_token=make_token()), None)
+    assert result == {"errorMessage": "'DB_HOST'", "errorType": "KeyError"}
+
+def make_batch_event(items, jwt_token, **extra):
+    body = {"action": "batch", "items": items}
+    body.update(extra)
+    return {"body": json.dumps(body), "headers": {"Authorization": f"Bearer {jwt_token}"}}
+
+def test_batch_returns_ordered_per_item_results(standin_targets, monkeypatch):
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "local")
+    items = [
+        {"action": "list_contents", "path": "/Projects"},
+        {"action": "list_contents"},
+        {"action": "login_user", "email": "a@b.c", "password": "x"},
+        {"action": "list_contents", "path": "/Docs"},
+    ]
+
+    result = lambda_handler(make_batch_event(items, make_token()), None)
+    results = json.loads(result["body"])["results"]
+
+    assert result["statusCode"] == 200
+    assert [r["statusCode"] for r in results] == [200, 400, 400, 200]
+    assert results[0]["body"]["folders"][0]["path"] == "/Projects/Alpha"
+    assert results[3]["body"]["folders"][0]["path"] == "/Docs/Alpha"
+    assert "not allowed in batch" in results[2]["body"]["error"]
+
+def test_batch_verifies_token_once(standin_targets, monkeypatch):
+    calls = []
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "local")
+    monkeypatch.setattr(vpc_bridge_lambda, "verify_jwt",
+                        lambda headers: calls.append(headers) or {"user_id": "u1"})
+
+    items = [{"action": "list_contents", "path": f"/F{i}"} for i in range(5)]
+    lambda_handler(make_batch_event(items, make_token(), sequential=True), None)
+
+    assert len(calls) == 1
+
+def test_batch_requires_valid_token_and_bounded_items():
+    items = [{"action": "list_contents", "path": "/"}]
+    assert lambda_handler(make_batch_event(items, "invalid.token.blob"), None)["statusCode"] == 401
+
+    too_many = items * (vpc_bridge_lambda.BATCH_MAX_ITEMS + 1)
+    assert lambda_handler(make_batch_event(too_many, make_token()), None)["statusCode"] == 400
+
+def test_download_folder_starts_the_archive_asynchronously(monkeypatch):
+    invoked = []
+
+    class LambdaClient:
+        def invoke(self, FunctionName, InvocationType, Payload):
+            invoked.append((FunctionName, InvocationType, json.loads(Payload)))
+            return {"Payload": io.BytesIO(json.dumps({"statusCode": 202, "body": "{}"}).encode())}
+
+    monkeypatch.setenv("folder_archive_lambda", "sparkdrive-folder-archive")
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "remote")
+    monkeypatch.setattr(vpc_bridge_lambda, "_lambda_client", LambdaClient())
+
+    started = lambda_handler(make_event("download_folder", path="/Projects", jwt_token=make_token()), None)
+    archive_id = json.loads(started["body"])["archive_id"]
+    status_event = make_event("archive_status", jwt_token=make_token())
+    status_event["body"] = json.dumps({"action": "archive_status", "archive_id": archive_id})
+    lambda_handler(status_event, None)
+
+    assert started["statusCode"] == 202
+    assert [(name, kind) for name, kind, _ in invoked] == [("sparkdrive-folder-archive", "Event"),
+                                                          ("sparkdrive-folder-archive", "RequestResponse")]
+    assert invoked[0][2]["archive_id"] == invoked[1][2]["archive_id"] == archive_id
+    assert invoked[1][2]["status"] is True
+
+def test_debug_logs_never_contain_credentials(standin_targets, monkeypatch, capsys):
+    module = types.ModuleType("refresh_token_lambda")
+    module.lambda_handler = lambda event, context: {"statusCode": 401, "body": "{}"}
+    monkeypatch.setitem(sys.modules, "refresh_token_lambda", module)
+    monkeypatch.setenv("refresh_token_lambda", "sparkdrive-refresh")
+    monkeypatch.setattr(vpc_bridge_lambda, "_lambda_client", StandinLambdaClient({"sparkdrive-refresh": module.lambda_handler}))
+    monkeypatch.setattr(vpc_bridge_lambda, "DISPATCH_MODE", "remote")
+
+    access_token = make_token()
+    event = {
+        "headers": {"Authorization": f"Bearer {access_token}"},
+        "body": json.dumps({"action": "refresh_token", "refresh_token": "rt-secret-value"})
+    }
+    lambda_handler(event, None)
+    login = {"headers": {}, "body": json.dumps({"action": "login_user", "email": "a@b.c", "password": "hunter2"})}
+    lambda_handler(login, None)
+
+    logged = capsys.readouterr().out
+    assert "rt-secret-value" not in logged and "hunter2" not in logged and access_token not in logged
+    assert "a@b.c" in logged  # everything else is still there to debug with
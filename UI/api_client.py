@@ -0,0 +1,79 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared HTTP client for every call the UI makes to API Gateway.
+#
+# One requests.Session per process keeps TLS connections alive between page views. The pool
+# holds one connection per WSGI worker thread (UI_WORKER_THREADS), so concurrent requests do
+# not queue for a socket or churn connections. Every call has a timeout. Actions that are safe
+# to repeat are retried on connection errors, timeouts and gateway 502/503/504 with jittered
+# exponential backoff; anything that writes (uploads, deletes, logins, token rotation) is sent
+# exactly once.
+
+WORKER_THREADS = int(os.environ.get("UI_WORKER_THREADS", "8"))
+CONNECT_TIMEOUT = float(os.environ.get("UI_API_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("UI_API_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.environ.get("UI_API_RETRIES", "2"))
+BACKOFF_BASE = 0.2   # seconds; attempt n sleeps uniform(0, BACKOFF_BASE * 2**n)
+BACKOFF_CAP = 2.0
+
+IDEMPOTENT_ACTIONS = {"list_contents", "download_file", "download_files"}
+RETRY_STATUSES = {502, 503, 504}
+LATENCY_SAMPLES = 500  # recent calls kept per action
+
+class ApiClient:
+    def __init__(self, pool_size=WORKER_THREADS, max_retries=MAX_RETRIES,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=None):
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.latencies = {}  # action -> deque of (seconds, status)
+        self.lock = threading.Lock()
+
+    # Same call shape as requests.post; the payload's "action" picks the retry policy
+    def post(self, url, json=None, headers=None, timeout=None):
+        action = (json or {}).get("action", url.rsplit("/", 1)[-1])
+        retries = self.max_retries if action in IDEMPOTENT_ACTIONS else 0
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                resp = self.session.post(url, json=json, headers=headers, timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(action, time.perf_counter() - start, type(e).__name__)
+                if attempt == retries:
+                    raise
+            else:
+                self._record(action, time.perf_counter() - start, resp.status_code)
+                if resp.status_code not in RETRY_STATUSES or attempt == retries:
+                    return resp
+            time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+    def _record(self, action, seconds, status):
+        print(f"[API] {action} {status} {seconds * 1000:.0f} ms")
+        with self.lock:
+            self.latencies.setdefault(action, deque(maxlen=LATENCY_SAMPLES)).append((seconds, status))
+
+    # Per-action call count, error count and latency percentiles (ms) over the recent window
+    def stats(self):
+        with self.lock:
+            snapshot = {action: list(samples) for action, samples in self.latencies.items()}
+        report = {}
+        for action, samples in snapshot.items():
+            times = sorted(s for s, _ in samples)
+            report[action] = {
+                "calls": len(samples),
+                "errors": sum(1 for _, status in samples if not isinstance(status, int) or status >= 500),
+                "p50_ms": round(times[len(times) // 2] * 1000, 1),
+                "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 1),
+                "max_ms": round(times[-1] * 1000, 1),
+            }
+        return report
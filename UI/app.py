@@ -1,19 +1,76 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 import requests
 import json
 import os
-import base64
+import secrets
 from config import SECRET_KEY
+from api_client import ApiClient
+import uploads
+from view_cache import ViewCache
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 
 API_BASE = "https://4gezooenuc.execute-api.us-east-2.amazonaws.com/dev"
+PAGE_SIZE = 100  # files per listing page; further pages load on demand
+# Folder ZIPs are built asynchronously; the browser polls /archive_status until the URL is ready.
+# ARCHIVE_WAIT stays within the archive Lambda's own 15 minute limit.
+ARCHIVE_POLL_INTERVAL = 2
+ARCHIVE_WAIT = 900
+
+api = ApiClient()
+listings = ViewCache()
 
 def auth_headers():
     token = session.get("jwt")
     return {"Authorization": f"Bearer {token}"} if token else {}
 
+# Trade the session's refresh token for a new access token; False if the user must log in again
+def refresh_session():
+    refresh_token = session.get("refresh_token")
+    if not refresh_token:
+        return False
+    try:
+        resp = api.post(f"{API_BASE}/login", json={"action": "refresh_token", "refresh_token": refresh_token})
+    except requests.RequestException:
+        return False
+    if resp.status_code != 200:
+        # Only a refused token ends the login; a failed call can be retried with the same one
+        if resp.status_code == 401:
+            session.pop("refresh_token", None)
+        return False
+    data = resp.json()
+    session["jwt"] = data["token"]
+    session["refresh_token"] = data["refresh_token"]
+    return True
+
+# POST to the API as the logged-in user. An expired access token is refreshed once and the call
+# retried, so a 401 only reaches the caller when the refresh token is gone too.
+def api_post(url, payload, timeout=None, headers=None):
+    resp = api.post(url, json=payload, headers={**auth_headers(), **(headers or {})}, timeout=timeout)
+    if resp.status_code == 401 and refresh_session():
+        resp = api.post(url, json=payload, headers={**auth_headers(), **(headers or {})}, timeout=timeout)
+    return resp
+
+# First page of a folder, revalidated against this session's last copy with If-None-Match.
+# Returns (status_code, data, resp); a 304 comes back as 200 with the cached data.
+def list_folder(path):
+    sid = session.setdefault("sid", secrets.token_hex(16))
+    key = (sid, path, PAGE_SIZE)
+    cached = listings.get(key)
+
+    payload = {"action": "list_contents", "path": path, "limit": PAGE_SIZE}
+    resp = api_post(f"{API_BASE}/folder/list", payload, headers={"If-None-Match": cached[0]} if cached else None)
+    if resp.status_code == 304 and cached:
+        listings.revalidated += 1
+        return 200, cached[1], resp
+    if resp.status_code != 200:
+        return resp.status_code, None, resp
+
+    data = resp.json()
+    listings.put(key, resp.headers.get("ETag"), data)
+    return 200, data, resp
+
 def parent_path(path):
     if path == "/":
         return "/"
@@ -25,15 +82,13 @@ def home():
 
 @app.route("/folder")
 def folder():
-    api_url = f"{API_BASE}/folder/list"
     path = request.args.get("path", "/")
 
-    payload = {"action": "list_contents", "path": path}
-    resp = requests.post(api_url, json=payload, headers=auth_headers())
-    if resp.status_code == 200:
-        data = resp.json()
-        return render_template("folder_view.html", path=path, folders=data.get("folders", []), files=data.get("files", []))
-    elif resp.status_code == 401:
+    status, data, resp = list_folder(path)
+    if status == 200:
+        return render_template("folder_view.html", path=path, folders=data.get("folders", []), files=data.get("files", []),
+                               next_cursor=data.get("next_cursor"))
+    elif status == 401:
         flash("Session expired. Please log in again.", "warning")
         return redirect(url_for("login"))
     else:
@@ -43,23 +98,35 @@ def folder():
 @app.route("/folder/view/icon")
 def folder_view_icon():
     path = request.args.get("path", "/")
-    api_url = f"{API_BASE}/folder/list"
 
-    payload = {
-        "action": "list_contents",
-        "path": path
-    }
+    status, data, resp = list_folder(path)
+    if status != 200:
+        return f"Error loading folder: {resp.text}", 500
+
+    folders = data.get("folders", [])
+    files = data.get("files", [])
+    return render_template("folder_view_icons.html", path=path, folders=folders, files=files,
+                           next_cursor=data.get("next_cursor"))
 
-    print(f"auth_headers = {auth_headers()}")
+# Next page of a folder's files, rendered for the list or icon view and appended by the page's "Load more" button
+@app.route("/folder/files")
+def folder_files():
+    path = request.args.get("path", "/")
+    cursor = request.args.get("cursor")
+    view = request.args.get("view", "list")
+    api_url = f"{API_BASE}/folder/list"
 
-    resp = requests.post(api_url, json=payload, headers=auth_headers())
+    payload = {"action": "list_contents", "path": path, "limit": PAGE_SIZE, "cursor": cursor}
+    resp = api_post(api_url, payload)
     if resp.status_code != 200:
-        return f"Error loading folder: {resp.text}", 500
+        return jsonify({"error": resp.text}), resp.status_code
 
     data = resp.json()
-    folders = data.get("folders", [])
-    files = data.get("files", [])
-    return render_template("folder_view_icons.html", path=path, folders=folders, files=files)
+    template = "folder_files_icons.html" if view == "icon" else "folder_files_list.html"
+    return jsonify({
+        "html": render_template(template, path=path, files=data.get("files", [])),
+        "next_cursor": data.get("next_cursor")
+    })
 
 @app.route("/download/<file_id>")
 def download(file_id):
@@ -68,7 +135,7 @@ def download(file_id):
         "file_id": file_id,
     }
 
-    resp = requests.post(f"{API_BASE}/file/download", json=payload, headers=auth_headers())
+    resp = api_post(f"{API_BASE}/file/download", payload)
     if resp.status_code != 200:
         return f"Error downloading file: {resp.text}", 500
 
@@ -80,6 +147,43 @@ def download(file_id):
 
     return redirect(url)
 
+@app.route("/download_folder")
+def download_folder():
+    path = request.args.get("path", "/")
+    payload = {
+        "action": "download_folder",
+        "path": path,
+    }
+
+    resp = api_post(f"{API_BASE}/file/download", payload)
+    if resp.status_code == 202:
+        # Building the ZIP can take minutes; the page polls /archive_status instead of holding this worker
+        return render_template("archive_status.html", path=path, archive_id=resp.json().get("archive_id"),
+                               poll_interval=ARCHIVE_POLL_INTERVAL, wait=ARCHIVE_WAIT)
+    if resp.status_code != 200:
+        return f"Error downloading folder: {resp.text}", resp.status_code if resp.status_code in (404, 413) else 500
+
+    url = resp.json().get("download_url")
+    if not url:
+        return "Error: No download URL received", 500
+
+    return redirect(url)
+
+# One poll of an archive started by /download_folder: 202 while it is being built, then its download URL
+@app.route("/archive_status")
+def archive_status():
+    payload = {"action": "archive_status", "archive_id": request.args.get("archive_id")}
+    resp = api_post(f"{API_BASE}/file/download", payload)
+    if resp.status_code == 202:
+        return jsonify({"status": "pending"}), 202
+    if resp.status_code != 200:
+        return jsonify({"error": resp.text}), resp.status_code if resp.status_code in (401, 404, 413) else 500
+
+    url = resp.json().get("download_url")
+    if not url:
+        return jsonify({"error": "No download URL received"}), 500
+    return jsonify({"download_url": url})
+
 @app.route("/newfolder", methods=["GET","POST"])
 def newfolder():
     api_url = f"{API_BASE}/newfolder"
@@ -97,7 +201,7 @@ def newfolder():
             "path": path,
         }
         try:
-            resp = requests.post(api_url, json=payload, headers=auth_headers())
+            resp = api_post(api_url, payload)
             if resp.status_code == 200 or resp.status_code == 201:
                 flash(f"Folder {path} created successfully!", "success")
             else:
@@ -115,30 +219,45 @@ def upload():
 
     if request.method == "POST":
         folder = request.form.get("folder")
-        file = request.files.get("file")
+        files = [f for f in request.files.getlist("file") if f.filename]
 
-        if not folder or not file:
+        if not folder or not files:
             flash("Folder path and file are required.", "error")
             return redirect("/upload")
 
-        encoded_content = base64.b64encode(file.read()).decode("utf-8")
-
-        payload = {
-            "folder": folder.strip(),
-            "filename": file.filename,
-            "content": encoded_content,
-        }
-
-        print(f"payload = {payload}")
-
-        try:
-            resp = requests.post(api_url, json=payload, headers=auth_headers())
-            if resp.status_code == 200:
-                flash("File uploaded successfully!", "success")
-            else:
-                flash(f"Upload failed: {resp.text}", "error")
-        except Exception as e:
-            flash(f"Exception during upload: {str(e)}", "error")
+        folder = folder.strip()
+        sized = [(f, uploads.stream_size(f.stream)) for f in files]
+        small = [(f, size) for f, size in sized if size <= uploads.INLINE_MAX]
+        large = [(f, size) for f, size in sized if size > uploads.INLINE_MAX]
+        uploaded, failures = 0, []
+
+        # Small files: base64-inlined upload_batch requests of bounded size
+        for batch in uploads.inline_batches(folder, small):
+            try:
+                resp = api_post(api_url, {"action": "upload_batch", "files": batch})
+                if resp.status_code != 200:
+                    failures += [f"{f['filename']}: {resp.status_code}" for f in batch]
+                    continue
+                for r in resp.json().get("results", []):
+                    if r.get("status") == "success":
+                        uploaded += 1
+                    else:
+                        failures.append(f"{r.get('filename')}: {r.get('message')}")
+            except Exception as e:
+                failures += [f"{f['filename']}: {str(e)}" for f in batch]
+
+        # Large files: streamed part by part to presigned S3 URLs
+        for f, size in large:
+            try:
+                uploads.stream_upload(api_post, api.session, api_url, folder, f.filename, f.stream, size)
+                uploaded += 1
+            except Exception as e:
+                failures.append(f"{f.filename}: {str(e)}")
+
+        if uploaded:
+            flash(f"{uploaded} of {len(files)} file(s) uploaded successfully!", "success" if not failures else "warning")
+        for failure in failures:
+            flash(f"Upload failed: {failure}", "error")
 
     return render_template("upload.html", folder_default=folder_default)
 
@@ -169,7 +288,7 @@ def delete():
     }
 
     try:
-        resp = requests.post(api_url, json=payload, headers=auth_headers())
+        resp = api_post(api_url, payload)
         if resp.status_code == 200:
             flash(f"Folder {path} deleted successfully!", "success")
             return redirect(return_to_success)  # success = go up
@@ -195,7 +314,7 @@ def delete_file():
     }
 
     try:
-        resp = requests.post(f"{API_BASE}/file/delete", json=payload, headers=auth_headers())
+        resp = api_post(f"{API_BASE}/file/delete", payload)
         if resp.status_code == 200:
             flash("File deleted successfully.", "success")
         else:
@@ -212,11 +331,12 @@ def login():
         password = request.form["password"]
         payload = {"email": email, "password": password, "action": "login_user"}
         api_url = f"{API_BASE}/login"
-        resp = requests.post(api_url, json=payload)
+        resp = api.post(api_url, json=payload)
 
         if resp.status_code == 200:
             data = resp.json()
             session["jwt"] = data["token"]
+            session["refresh_token"] = data.get("refresh_token")
             session["display_name"] = data["user"]["display_name"]
             return redirect(url_for("folder_view_icon"))
         else:
@@ -236,7 +356,7 @@ def register():
             "action": "register_user",
         }
         api_url = f"{API_BASE}/register"
-        resp = requests.post(api_url, json=payload)
+        resp = api.post(api_url, json=payload)
         if resp.status_code == 200:
             flash("Registration successful. You may now log in.", "success")
             return redirect(url_for("login"))
@@ -244,8 +364,23 @@ def register():
             flash("Registration failed: " + resp.text, "danger")
     return render_template("register.html")
 
+# Recent API call latencies for this UI process
+@app.route("/api/stats")
+def api_stats():
+    if not session.get("jwt"):
+        return redirect(url_for("login"))
+    return jsonify(api.stats())
+
 @app.route("/logout")
 def logout():
+    refresh_token = session.get("refresh_token")
+    if refresh_token:
+        try:
+            api.post(f"{API_BASE}/login", json={"action": "logout_user", "refresh_token": refresh_token})
+        except requests.RequestException as e:
+            print(f"Refresh token revocation failed: {e}")
+    if session.get("sid"):
+        listings.drop_session(session["sid"])
     session.clear()
     return redirect(url_for("login"))
 
@@ -0,0 +1,115 @@
+import os
+import base64
+import hashlib
+
+# Browser uploads without holding whole files in the worker.
+#
+# Werkzeug spools each uploaded file to a temporary file, so it can be read back a piece at a
+# time. Large files go through the backend's multipart protocol: every part is PUT to its
+# presigned S3 URL straight from the spooled file in CHUNK_SIZE reads, so worker memory stays
+# flat however big the file is. Small files are base64-inlined into upload_batch requests that
+# are capped at BATCH_BYTES of raw content each. File content is never logged.
+#
+# Large files are hashed in one pass over the spooled file before the upload starts; the backend
+# stores content by SHA-256, and when the account already has it no part is sent at all.
+
+CHUNK_SIZE = 64 * 1024
+INLINE_MAX = int(os.environ.get("UI_UPLOAD_INLINE_MAX", str(1024 * 1024)))
+BATCH_BYTES = int(os.environ.get("UI_UPLOAD_BATCH_BYTES", str(4 * 1024 * 1024)))
+PART_SIZE = int(os.environ.get("UI_UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+PART_TIMEOUT = (3.05, 120)
+
+class UploadError(Exception):
+    pass
+
+def stream_size(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+# File-like view of [offset, offset + length) of a seekable stream. requests sends it with a
+# Content-Length and reads it in blocks, so a part is never held in memory as a whole.
+class PartReader:
+    def __init__(self, stream, offset, length):
+        self.stream = stream
+        self.offset = offset
+        self.len = length
+        self.remaining = length
+        stream.seek(offset)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(min(size, CHUNK_SIZE))
+        self.remaining -= len(data)
+        return data
+
+def stream_sha256(stream):
+    h = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+# Split small files into upload_batch payloads of at most BATCH_BYTES raw content each
+def inline_batches(folder, files):
+    batch, batch_bytes = [], 0
+    for f, size in files:
+        if batch and batch_bytes + size > BATCH_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+        f.stream.seek(0)
+        batch.append({
+            "folder": folder,
+            "filename": f.filename,
+            "content": base64.b64encode(f.stream.read()).decode("utf-8"),
+        })
+        batch_bytes += size
+    if batch:
+        yield batch
+
+# Multipart upload of one spooled file. post(url, payload) sends an authenticated API request;
+# session is the pooled requests.Session used for the S3 part PUTs.
+def stream_upload(post, session, upload_url, folder, filename, stream, size):
+    target = {"folder": folder, "filename": filename, "sha256": stream_sha256(stream)}
+    resp = post(upload_url, {"action": "initiate_upload", "file_size": size, "part_size": PART_SIZE, **target})
+    if resp.status_code != 200:
+        raise UploadError(f"initiate failed: {resp.status_code} - {resp.text}")
+    init = resp.json()
+    if init.get("deduplicated"):
+        return init
+    upload_id, part_size = init["upload_id"], init["part_size"]
+
+    try:
+        parts = []
+        for part in init["parts"]:
+            number = part["part_number"]
+            offset = (number - 1) * part_size
+            length = min(part_size, size - offset)
+            put = session.put(part["url"], data=PartReader(stream, offset, length), timeout=PART_TIMEOUT)
+            if put.status_code == 403:
+                # Presigned URL expired on a slow upload: fetch a fresh one and resend the part once
+                fresh = post(upload_url, {"action": "upload_part_urls", "upload_id": upload_id,
+                                          "part_numbers": [number], **target})
+                if fresh.status_code != 200:
+                    raise UploadError(f"part URL refresh failed: {fresh.status_code}")
+                put = session.put(fresh.json()["parts"][0]["url"], data=PartReader(stream, offset, length),
+                                  timeout=PART_TIMEOUT)
+            if put.status_code != 200:
+                raise UploadError(f"part {number} failed: {put.status_code}")
+            parts.append({"part_number": number, "etag": put.headers["ETag"]})
+
+        resp = post(upload_url, {"action": "complete_upload", "upload_id": upload_id, "parts": parts, **target})
+        if resp.status_code != 200:
+            raise UploadError(f"complete failed: {resp.status_code} - {resp.text}")
+        return resp.json()
+
+    except Exception:
+        try:
+            post(upload_url, {"action": "abort_upload", "upload_id": upload_id, **target})
+        except Exception as e:
+            print(f"Abort of upload {upload_id} failed: {e}")
+        raise
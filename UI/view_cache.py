@@ -0,0 +1,38 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Last listing seen per (browser session, path), kept in this UI process alongside its ETag.
+# Re-opening a folder sends If-None-Match; on 304 the page renders from here with no listing
+# transfer and no file query in the backend. The Flask session cookie only carries the
+# session's random "sid", since a listing would not fit in a cookie.
+
+CACHE_SIZE = int(os.environ.get("UI_VIEW_CACHE_SIZE", "512"))
+
+class ViewCache:
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (etag, data)
+        self.lock = threading.Lock()
+        self.revalidated = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, data):
+        if not etag or self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (etag, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def drop_session(self, sid):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == sid]:
+                del self.entries[key]
@@ -1,9 +1,11 @@
-from passlib.hash import pbkdf2_sha256
+import os
 import getpass
 import sys
 
-def hash_password(password):
-    return pbkdf2_sha256.hash(password)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+
+# Same scheme and work factor as register_user_lambda (PASSWORD_SCHEME, PASSWORD_*_ROUNDS)
+from passwords import hash_password
 
 if __name__ == "__main__":
     try:
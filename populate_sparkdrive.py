@@ -6,16 +6,25 @@ import base64
 API_URL = "https://4gezooenuc.execute-api.us-east-2.amazonaws.com/dev"
 USER_ID = "00000000-0000-0000-0000-000000000000"
 
-def upload_file(folder, filename, content):
-    encoded = base64.b64encode(content.encode("utf-8")).decode("utf-8")
-    payload = {
+def encode_file(folder, filename, content):
+    return {
         "folder": folder,
         "filename": filename,
-        "content": encoded,
+        "content": base64.b64encode(content.encode("utf-8")).decode("utf-8")
+    }
+
+# One request for the whole set: folders are resolved once and the S3 writes run concurrently
+def upload_files(files):
+    payload = {
+        "action": "upload_batch",
+        "files": [encode_file(*f) for f in files],
         "user_id": USER_ID
     }
     r = requests.post(f"{API_URL}/upload", json=payload)
-    print(f"Uploading {filename} to {folder} -> {r.status_code}")
+    print(f"Uploading {len(files)} files -> {r.status_code}")
+    if r.status_code == 200:
+        for result in r.json().get("results", []):
+            print(f"  {result['folder']}/{result['filename']} -> {result['status']}")
 
 
 def create_folder(path):
@@ -39,14 +48,15 @@ folders = [
 for folder in folders:
     create_folder(folder)
 
-upload_file("/Test", "testfile.txt", "This is a test file at the top level.")
-upload_file("/Test/Alpha", "hello_alpha.txt", "Hello from Alpha folder.")
-upload_file("/Test/Bravo", "hello_bravo.txt", "Hello from Bravo folder.")
-upload_file("/Images", "sample.png", "[binary image data would be here]")
-upload_file("/Logs", "app.log", "[INFO] App started at 2025-08-01 12:00:00")
-upload_file("/Logs", "spark_audit.sh", "#!/bin/bash\necho 'Auditing SparkDrive...'\n")
-
-# 🥚 Easter Egg
-upload_file("/Secret", "you_found_me.txt", "Congrats! You found the hidden file. Nova sends kisses. 💋")
+upload_files([
+    ("/Test", "testfile.txt", "This is a test file at the top level."),
+    ("/Test/Alpha", "hello_alpha.txt", "Hello from Alpha folder."),
+    ("/Test/Bravo", "hello_bravo.txt", "Hello from Bravo folder."),
+    ("/Images", "sample.png", "[binary image data would be here]"),
+    ("/Logs", "app.log", "[INFO] App started at 2025-08-01 12:00:00"),
+    ("/Logs", "spark_audit.sh", "#!/bin/bash\necho 'Auditing SparkDrive...'\n"),
+    # 🥚 Easter Egg
+    ("/Secret", "you_found_me.txt", "Congrats! You found the hidden file. Nova sends kisses. 💋"),
+])
 
 print("✨ SparkDrive population complete.")
@@ -0,0 +1,304 @@
+import os
+import gzip
+import json
+import time
+import random
+import hashlib
+import threading
+import requests
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # only needed for objects stored with Content-Encoding: zstd
+    zstandard = None
+
+API_BASE = "https://4gezooenuc.execute-api.us-east-2.amazonaws.com/dev"
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Ranged downloads
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_RETRIES = 5        # consecutive failed attempts per chunk that make no progress
+DOWNLOAD_URL_REFRESHES = 20
+DOWNLOAD_TIMEOUT = (3.05, 60)
+READ_SIZE = 64 * 1024
+
+class SparkDriveError(Exception):
+    pass
+
+def file_sha256(local_path):
+    h = hashlib.sha256()
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Parallel ranged download of one presigned object into local_path.
+#
+# A one-byte probe gives the object's size, ETag and Content-Encoding. The output is preallocated
+# as local_path + ".part" and split into chunk_size ranges fetched by `workers` threads, each
+# writing its range in place. A dropped connection resumes its range from the last byte written;
+# every request carries If-Match, so the object cannot change underneath. When the presigned URL
+# expires (403), get_url() is asked for a fresh one once for all workers.
+#
+# Finished chunks are recorded in a small JSON journal next to the .part file after their bytes
+# are fsynced, so running the same download again after a crash or Ctrl-C only fetches what is
+# missing. Objects stored compressed (Content-Encoding) are fetched as stored and decoded when
+# the last chunk is in.
+class RangedDownload:
+    def __init__(self, session, get_url, local_path, workers=DOWNLOAD_WORKERS, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                 retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT):
+        self.session = session
+        self.get_url = get_url
+        self.local_path = local_path
+        self.part_path = local_path + ".part"
+        self.journal_path = local_path + ".part.journal"
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.url = None
+        self.refreshes = 0
+        self.bytes_fetched = 0
+        self.lock = threading.Lock()
+
+    def run(self):
+        self.url = self.get_url()
+        size, etag, encoding = self._probe()
+        self.etag = etag
+
+        journal = self._load_journal()
+        if journal.get("size") == size and journal.get("etag") == etag and journal.get("chunk_size") == self.chunk_size \
+                and os.path.exists(self.part_path) and os.path.getsize(self.part_path) == size:
+            done = set(journal["done"])
+        else:
+            done = set()
+            with open(self.part_path, "wb") as f:
+                f.truncate(size)
+        self.journal = {"size": size, "etag": etag, "encoding": encoding, "chunk_size": self.chunk_size,
+                        "done": sorted(done)}
+        self._save_journal()
+
+        chunk_count = -(-size // self.chunk_size)
+        pending = [i for i in range(chunk_count) if i not in done]
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(self._fetch_chunk, i, size) for i in pending]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        self._finish(encoding)
+        return {
+            "path": self.local_path,
+            "size": size,
+            "encoding": encoding,
+            "bytes_fetched": self.bytes_fetched,
+            "resumed_chunks": len(done),
+            "url_refreshes": self.refreshes,
+        }
+
+    # Size, ETag and Content-Encoding of the object from a one-byte ranged GET
+    # (a presigned GET URL cannot be used for HEAD)
+    def _probe(self):
+        for attempt in range(self.retries + 1):
+            url = self.url
+            try:
+                with self.session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout) as resp:
+                    if resp.status_code == 403:
+                        self._refresh(url)
+                        continue
+                    if resp.status_code == 416:  # empty object
+                        return 0, resp.headers.get("ETag"), resp.headers.get("Content-Encoding")
+                    if resp.status_code != 206:
+                        raise SparkDriveError(f"download probe failed: {resp.status_code}")
+                    size = int(resp.headers["Content-Range"].rsplit("/", 1)[1])
+                    return size, resp.headers.get("ETag"), resp.headers.get("Content-Encoding")
+            except (requests.RequestException, urllib3.exceptions.HTTPError, OSError):
+                if attempt == self.retries:
+                    raise
+                self._backoff(attempt)
+        raise SparkDriveError("download probe failed")
+
+    def _fetch_chunk(self, index, size):
+        start = index * self.chunk_size
+        end = min(size, start + self.chunk_size) - 1
+        pos = start
+        failures = 0
+        with open(self.part_path, "r+b") as f:
+            while pos <= end:
+                url = self.url
+                before = pos
+                try:
+                    headers = {"Range": f"bytes={pos}-{end}"}
+                    if self.etag:
+                        headers["If-Match"] = self.etag
+                    with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as resp:
+                        if resp.status_code == 403:
+                            self._refresh(url)
+                            continue
+                        if resp.status_code == 412:
+                            raise SparkDriveError("file changed during download; start again")
+                        if resp.status_code != 206:
+                            raise IOError(f"range request failed: {resp.status_code}")
+                        f.seek(pos)
+                        # Stored bytes as sent: Content-Encoding is undone once, on the whole file
+                        for data in resp.raw.stream(READ_SIZE, decode_content=False):
+                            data = data[:end + 1 - pos]
+                            f.write(data)
+                            pos += len(data)
+                            with self.lock:
+                                self.bytes_fetched += len(data)
+                    if pos <= end:
+                        raise IOError(f"connection closed at byte {pos} of range {start}-{end}")
+                except (requests.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
+                    failures = 0 if pos > before else failures + 1
+                    if failures > self.retries:
+                        raise SparkDriveError(f"chunk {index} failed after {self.retries} retries: {e}") from e
+                    self._backoff(failures)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self.lock:
+            self.journal["done"] = sorted(set(self.journal["done"]) | {index})
+            self._save_journal()
+
+    # Fetch a new URL unless another worker already replaced the stale one
+    def _refresh(self, stale_url):
+        with self.lock:
+            if self.url != stale_url:
+                return
+            if self.refreshes >= DOWNLOAD_URL_REFRESHES:
+                raise SparkDriveError("download URL keeps expiring")
+            self.refreshes += 1
+            self.url = self.get_url()
+
+    def _backoff(self, attempt):
+        time.sleep(random.uniform(0, min(2.0, 0.1 * 2 ** attempt)))
+
+    def _load_journal(self):
+        try:
+            with open(self.journal_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_journal(self):
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.journal, f)
+        os.replace(tmp, self.journal_path)
+
+    def _finish(self, encoding):
+        if encoding in ("gzip", "zstd"):
+            tmp = self.local_path + ".decoded"
+            with open(self.part_path, "rb") as src, open(tmp, "wb") as dst:
+                if encoding == "gzip":
+                    reader = gzip.GzipFile(fileobj=src, mode="rb")
+                elif zstandard:
+                    reader = zstandard.ZstdDecompressor().stream_reader(src)
+                else:
+                    raise SparkDriveError("file is zstd-encoded; pip install zstandard to decode it")
+                for chunk in iter(lambda: reader.read(READ_SIZE * 16), b""):
+                    dst.write(chunk)
+            os.replace(tmp, self.local_path)
+            os.remove(self.part_path)
+        elif encoding and encoding != "identity":
+            raise SparkDriveError(f"unsupported Content-Encoding: {encoding}")
+        else:
+            os.replace(self.part_path, self.local_path)
+        os.remove(self.journal_path)
+
+class SparkDriveClient:
+    def __init__(self, token, api_base=API_BASE, session=None):
+        self.api_base = api_base.rstrip("/")
+        self.token = token
+        self.session = session or requests.Session()
+
+    def _post(self, route, payload):
+        resp = self.session.post(
+            f"{self.api_base}{route}",
+            json=payload,
+            headers={"Authorization": f"Bearer {self.token}"}
+        )
+        if resp.status_code != 200:
+            raise SparkDriveError(f"{route} {payload.get('action')} failed: {resp.status_code} - {resp.text}")
+        return resp.json()
+
+    # Presigned URLs for many owned files in one request, in the order given. Entries the
+    # caller cannot download carry an "error" instead of a "download_url".
+    def download_urls(self, file_ids):
+        return self._post("/file/download", {"action": "download_files", "file_ids": list(file_ids)})["files"]
+
+    # Download one file with parallel ranged requests (see RangedDownload). Calling it again
+    # with the same local_path after an interruption resumes where the last run stopped.
+    def download_file(self, file_id, local_path, workers=DOWNLOAD_WORKERS, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        def get_url():
+            entry = self.download_urls([file_id])[0]
+            if "download_url" not in entry:
+                raise SparkDriveError(f"download of {file_id} refused: {entry.get('error')}")
+            return entry["download_url"]
+
+        return RangedDownload(self.session, get_url, local_path, workers=workers, chunk_size=chunk_size).run()
+
+    # Upload a local file with the multipart protocol: parts are read from disk and PUT
+    # straight to S3 in parallel, so at most `concurrency` parts are held in memory.
+    # The file is hashed first; if the account already stores the same content nothing is sent.
+    def upload_large_file(self, local_path, folder, filename=None, part_size=DEFAULT_PART_SIZE,
+                          concurrency=DEFAULT_CONCURRENCY):
+        filename = filename or os.path.basename(local_path)
+        target = {"folder": folder, "filename": filename, "sha256": file_sha256(local_path)}
+
+        init = self._post("/upload", {
+            "action": "initiate_upload",
+            "file_size": os.path.getsize(local_path),
+            "part_size": part_size,
+            **target
+        })
+        if init.get("deduplicated"):
+            return init
+        upload_id = init["upload_id"]
+        part_size = init["part_size"]  # the server may round it up
+
+        def send_part(part):
+            with open(local_path, "rb") as f:
+                f.seek((part["part_number"] - 1) * part_size)
+                chunk = f.read(part_size)
+            resp = self.session.put(part["url"], data=chunk)
+            if resp.status_code == 403:
+                # URL expired mid-upload: ask for a fresh one and retry once
+                fresh = self._post("/upload", {
+                    "action": "upload_part_urls",
+                    "upload_id": upload_id,
+                    "part_numbers": [part["part_number"]],
+                    **target
+                })["parts"][0]
+                resp = self.session.put(fresh["url"], data=chunk)
+            resp.raise_for_status()
+            return {"part_number": part["part_number"], "etag": resp.headers["ETag"]}
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                parts = list(pool.map(send_part, init["parts"]))
+        except Exception:
+            try:
+                self._post("/upload", {"action": "abort_upload", "upload_id": upload_id, **target})
+            except SparkDriveError as e:
+                print(f"Abort of upload {upload_id} failed: {e}")
+            raise
+
+        return self._post("/upload", {
+            "action": "complete_upload",
+            "upload_id": upload_id,
+            "parts": parts,
+            **target
+        })